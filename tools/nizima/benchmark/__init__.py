@@ -0,0 +1,13 @@
+"""
+Nizima下载器基准测试
+
+用仓库自带的示例模型生成合成作品，在本地替身服务器上离线测量下载器性能
+"""
+
+from .fixtures import build_fixtures, build_preview_archive, FixtureStorage
+
+__all__ = [
+    "build_fixtures",
+    "build_preview_archive",
+    "FixtureStorage",
+]
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+端到端基准测试
+
+用示例模型生成合成作品，由子进程中的替身服务器提供详情API和存储路径，
+对 fetch_multiple_items 计时：
+
+    fetch_nizima.py benchmark --items 40 --size-mb 0 8 --concurrent 3 --out bench.json
+    fetch_nizima.py benchmark --items 40 --compare bench.json
+
+报告作品数/秒、MB/秒、峰值RSS、作品耗时分位数和各任务类型（阶段）的耗时，
+结果写入JSON（包含提交哈希），--compare 与之前的结果对比并在退步超过阈值时返回非零。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 添加父目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import config
+from core.events import bus
+from core.log import add_logging_arguments, setup_logging
+from core.tracing import Tracer
+from standin import StandinServer, SyntheticCatalog
+
+from benchmark.fixtures import build_fixtures, FixtureStorage
+from benchmark.stats import git_revision, percentile
+
+log = logging.getLogger("nizima.benchmark")
+
+# 合成作品的起始ID
+BASE_ID = 900000
+
+# 峰值内存的采样间隔（秒）
+RSS_SAMPLE_INTERVAL = 0.02
+
+# 对比时检查的汇总指标: 名称 -> 数值越大越好
+COMPARED = {
+    "items_per_s": True,
+    "mb_per_s": True,
+    "wall_s": False,
+    "peak_rss_mb": False,
+}
+
+
+def _serve(conn, fixtures_dir: str, preview_images: int, latency: float):
+    """替身服务器子进程入口，启动后把基础URL发回父进程"""
+
+    async def run():
+        server = StandinServer(
+            SyntheticCatalog(valid_ratio=1.0, preview_images=preview_images),
+            latency=latency,
+            storage=FixtureStorage(Path(fixtures_dir), BASE_ID),
+        )
+        conn.send(await server.start())
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def _current_rss() -> Optional[int]:
+    """当前进程的常驻内存（字节），不支持时返回None"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+async def _sample_rss(peak: List[int]):
+    """定期采样常驻内存，peak[0] 保存观察到的最大值"""
+    while True:
+        rss = _current_rss()
+        if rss is not None and rss > peak[0]:
+            peak[0] = rss
+        await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+
+def stage_times(tracer: Tracer) -> Dict[str, Dict[str, float]]:
+    """按任务类型汇总执行和排队时间
+
+    Args:
+        tracer: 记录了本次运行的追踪器
+
+    Returns:
+        Dict[str, Dict[str, float]]: 任务类型 -> 统计
+    """
+    groups: Dict[str, List] = {}
+    for span in tracer.spans:
+        if span.status != "done" or not span.task_class:
+            continue
+        groups.setdefault(span.task_class, []).append(span)
+
+    stages = {}
+    for task_class, spans in sorted(groups.items()):
+        durations = [s.end - s.start for s in spans]
+        stages[task_class] = {
+            "count": len(spans),
+            "total_s": round(sum(durations), 4),
+            "p50_ms": round(percentile(durations, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(durations, 0.95) * 1000, 2),
+            "queued_s": round(sum(s.start - s.queued for s in spans), 4),
+        }
+    return stages
+
+
+async def run_once(item_ids: List[str], concurrent: int) -> Dict[str, Any]:
+    """执行一次批量下载并收集指标
+
+    Args:
+        item_ids: 合成作品ID
+        concurrent: 最大并发作品数
+
+    Returns:
+        Dict[str, Any]: 本次运行的指标
+    """
+    from fetch_nizima import fetch_multiple_items
+
+    tracer = Tracer()
+    detach = tracer.attach(bus)
+    peak = [_current_rss() or 0]
+    sampler = asyncio.create_task(_sample_rss(peak))
+    output_dir = tempfile.mkdtemp(prefix="nizima-bench-")
+
+    start = time.perf_counter()
+    try:
+        await fetch_multiple_items(item_ids, output_dir, concurrent)
+    finally:
+        wall = time.perf_counter() - start
+        sampler.cancel()
+        detach()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    downloaded = sum(
+        s.bytes or 0
+        for s in tracer.spans
+        if s.status == "done" and s.task_class == "DownloadTask"
+    )
+    item_times = [
+        end - begin for begin, end, _ in tracer.items.values() if end is not None
+    ]
+    ok = sum(1 for _, _, success in tracer.items.values() if success)
+    return {
+        "wall_s": round(wall, 4),
+        "items_ok": ok,
+        "items_failed": len(item_ids) - ok,
+        "bytes": downloaded,
+        "items_per_s": round(ok / wall, 3),
+        "mb_per_s": round(downloaded / wall / (1024 * 1024), 3),
+        "peak_rss_mb": round(peak[0] / (1024 * 1024), 1),
+        "item_p50_s": round(percentile(item_times, 0.5), 4),
+        "item_p95_s": round(percentile(item_times, 0.95), 4),
+        "stages": stage_times(tracer),
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, float]:
+    """各次运行的中位数"""
+    return {
+        key: round(statistics.median(run[key] for run in runs), 4)
+        for key in ("wall_s", "items_per_s", "mb_per_s", "peak_rss_mb", "item_p95_s")
+    }
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> bool:
+    """输出与基线结果的对比
+
+    Args:
+        current: 本次结果
+        baseline: 基线结果
+        threshold: 允许的退步比例
+
+    Returns:
+        bool: 是否有指标退步超过阈值
+    """
+    regressed = False
+    log.info(
+        "📐 对比基线 %s", (baseline.get("git") or {}).get("commit") or "(未知提交)"
+    )
+    if baseline.get("params") != current["params"]:
+        log.warning(
+            "⚠️ 基线的测试参数不同，对比结果仅供参考: %s", baseline.get("params")
+        )
+    for key, higher_is_better in COMPARED.items():
+        old = baseline["summary"].get(key)
+        new = current["summary"].get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        if worse > threshold:
+            regressed = True
+            log.warning(
+                "⚠️ %-12s %10.3f -> %10.3f (%+.1f%%)", key, old, new, change * 100
+            )
+        else:
+            log.info("   %-12s %10.3f -> %10.3f (%+.1f%%)", key, old, new, change * 100)
+    return regressed
+
+
+async def main(argv: List[str] = None):
+    """基准测试子命令入口"""
+    parser = argparse.ArgumentParser(
+        prog="fetch_nizima.py benchmark", description="离线端到端基准测试"
+    )
+    parser.add_argument("--items", type=int, default=20, help="合成作品数量")
+    parser.add_argument(
+        "--size-mb",
+        type=float,
+        nargs="+",
+        default=[0],
+        help="Preview归档目标大小（MB），可指定多个，0表示示例模型原始大小",
+    )
+    parser.add_argument(
+        "--models", nargs="+", help="使用的示例模型（默认全部，如 Hiyori Mark）"
+    )
+    parser.add_argument(
+        "--preview-images", type=int, default=2, help="每个作品的预览图数量"
+    )
+    parser.add_argument(
+        "--concurrent", "-c", type=int, default=3, help="最大并发作品数"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="重复运行次数")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="替身服务器每个请求的延迟（秒）"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="夹具随机种子")
+    parser.add_argument(
+        "--fixtures-dir",
+        default=str(Path(tempfile.gettempdir()) / "nizima-bench-fixtures"),
+        help="夹具缓存目录",
+    )
+    parser.add_argument("--out", help="把结果写入该JSON文件")
+    parser.add_argument("--compare", help="与该JSON结果对比")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="对比时允许的退步比例"
+    )
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    shutdown_logging = setup_logging(args.verbose, args.quiet, args.log_json)
+    if not args.verbose:
+        # 逐个作品的下载日志会干扰计时输出
+        for name in ("nizima.fetcher", "nizima.tasks", "nizima.scheduler"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    variants = build_fixtures(
+        Path(args.fixtures_dir), args.models, args.size_mb, args.seed
+    )
+    log.info(
+        "🧪 %d 个变体: %s",
+        len(variants),
+        ", ".join(f"{v['model']}({v['size'] / 1048576:.1f}MB)" for v in variants),
+    )
+
+    # 替身服务器在子进程中运行，不与被测的事件循环争用CPU
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe()
+    server = context.Process(
+        target=_serve,
+        args=(child_conn, args.fixtures_dir, args.preview_images, args.latency),
+        daemon=True,
+    )
+    server.start()
+    runs = []
+    try:
+        base_url = parent_conn.recv()
+        config.API_BASE = base_url
+        config.STORAGE_BASE = f"{base_url}/storage"
+        item_ids = [str(BASE_ID + i) for i in range(args.items)]
+
+        for index in range(args.repeat):
+            run = await run_once(item_ids, args.concurrent)
+            runs.append(run)
+            log.info(
+                "⏱️ 第 %d/%d 次: %.2f 秒, %.2f 作品/秒, %.2f MB/秒, 峰值RSS %.1f MB%s",
+                index + 1,
+                args.repeat,
+                run["wall_s"],
+                run["items_per_s"],
+                run["mb_per_s"],
+                run["peak_rss_mb"],
+                f", 失败 {run['items_failed']}" if run["items_failed"] else "",
+            )
+    finally:
+        server.terminate()
+        server.join()
+
+    result = {
+        "benchmark": "e2e",
+        "git": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "items": args.items,
+            "size_mb": args.size_mb,
+            "models": [v["model"] for v in variants],
+            "preview_images": args.preview_images,
+            "concurrent": args.concurrent,
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "seed": args.seed,
+        },
+        "summary": summarize(runs),
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "runs": runs,
+    }
+
+    summary = result["summary"]
+    log.info("=" * 80)
+    log.info(
+        "📊 中位数: %.2f 作品/秒, %.2f MB/秒, 峰值RSS %.1f MB, 作品p95 %.2f 秒",
+        summary["items_per_s"],
+        summary["mb_per_s"],
+        summary["peak_rss_mb"],
+        summary["item_p95_s"],
+    )
+    log.info("🧩 各阶段（最后一次运行）:")
+    for task_class, stage in runs[-1]["stages"].items():
+        log.info(
+            "  %-20s %5d 次, 合计 %8.3f 秒, p50 %8.2f ms, p95 %8.2f ms, 排队 %8.3f 秒",
+            task_class,
+            stage["count"],
+            stage["total_s"],
+            stage["p50_ms"],
+            stage["p95_ms"],
+            stage["queued_s"],
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        log.info("💾 结果已写入: %s", args.out)
+
+    regressed = False
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressed = compare(result, json.load(f), args.threshold)
+
+    shutdown_logging()
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,296 @@
+"""
+基准测试夹具生成
+
+用 live2d_sdk 自带的示例模型合成与线上格式一致的Preview文件：
+模型目录 -> 传统PKWARE加密（ZipCrypto）的ZIP -> XOR加密的 .lee 文件。
+可以用随机填充文件把每个归档放大到指定大小。
+
+标准库 zipfile 只能读取、不能写入加密ZIP，这里按 APPNOTE 6.1 手工写出
+本地文件头、中央目录和目录结束记录。ZipCrypto 逐字节更新密钥，生成较慢，
+生成结果按 (模型, 大小, 种子) 缓存在夹具目录中。
+"""
+
+import json
+import logging
+import random
+import struct
+import sys
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 添加父目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tasks import DecryptTask, ExtractTask
+
+log = logging.getLogger("nizima.benchmark")
+
+# 仓库自带的示例模型
+SAMPLES_ROOT = Path(__file__).resolve().parents[3] / "live2d_sdk"
+
+MANIFEST_NAME = "manifest.json"
+
+# ZipCrypto 的CRC32查找表
+_CRC_TABLE = []
+for _n in range(256):
+    _c = _n
+    for _ in range(8):
+        _c = (_c >> 1) ^ 0xEDB88320 if _c & 1 else _c >> 1
+    _CRC_TABLE.append(_c)
+del _n, _c
+
+
+def find_sample_models(root: Path = SAMPLES_ROOT) -> Dict[str, Path]:
+    """查找示例模型目录
+
+    Args:
+        root: 搜索根目录
+
+    Returns:
+        Dict[str, Path]: 模型名 -> 模型目录（包含 *.model3.json 的目录）
+    """
+    models = {}
+    for model_json in sorted(root.rglob("*.model3.json")):
+        models.setdefault(model_json.name[: -len(".model3.json")], model_json.parent)
+    return models
+
+
+def zipcrypto_encrypt(
+    data: bytes, password: bytes, check_byte: int, seed: int
+) -> bytes:
+    """使用传统PKWARE加密算法加密一个成员的数据
+
+    Args:
+        data: 压缩后的成员数据
+        password: ZIP密码
+        check_byte: 加密头最后一个字节（CRC32的最高字节），用于解压时校验密码
+        seed: 加密头随机字节的种子
+
+    Returns:
+        bytes: 12字节加密头 + 加密后的数据
+    """
+    table = _CRC_TABLE
+    key0, key1, key2 = 0x12345678, 0x23456789, 0x34567890
+
+    def update(key0, key1, key2, byte):
+        key0 = (key0 >> 8) ^ table[(key0 ^ byte) & 0xFF]
+        key1 = ((key1 + (key0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+        key2 = (key2 >> 8) ^ table[(key2 ^ (key1 >> 24)) & 0xFF]
+        return key0, key1, key2
+
+    for byte in password:
+        key0, key1, key2 = update(key0, key1, key2, byte)
+
+    header = random.Random(seed).randbytes(11) + bytes([check_byte])
+    out = bytearray(len(header) + len(data))
+    i = 0
+    # 热循环内联密钥更新
+    for chunk in (header, data):
+        for byte in chunk:
+            temp = (key2 | 2) & 0xFFFF
+            out[i] = byte ^ (((temp * (temp ^ 1)) >> 8) & 0xFF)
+            i += 1
+            key0 = (key0 >> 8) ^ table[(key0 ^ byte) & 0xFF]
+            key1 = ((key1 + (key0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+            key2 = (key2 >> 8) ^ table[(key2 ^ (key1 >> 24)) & 0xFF]
+    return bytes(out)
+
+
+def build_encrypted_zip(
+    members: Iterable[Tuple[str, bytes]], password: Optional[bytes], seed: int = 0
+) -> bytes:
+    """生成ZIP归档
+
+    Args:
+        members: (归档内路径, 内容) 列表，内容使用deflate压缩
+        password: ZIP密码，为空时不加密
+        seed: 加密头随机字节的种子
+
+    Returns:
+        bytes: ZIP文件内容
+    """
+    body = bytearray()
+    central = bytearray()
+    count = 0
+    # 固定时间戳 1980-01-01 00:00，保证同样输入生成同样字节
+    dos_time, dos_date = 0, (0 << 9) | (1 << 5) | 1
+
+    for name, content in members:
+        name_bytes = name.encode("utf-8")
+        crc = zlib.crc32(content)
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        packed = compressor.compress(content) + compressor.flush()
+        method = 8
+        if len(packed) >= len(content):
+            packed, method = content, 0
+        flags = 0x800 if not name.isascii() else 0
+        if password is not None:
+            packed = zipcrypto_encrypt(packed, password, crc >> 24, seed + count)
+            flags |= 0x1
+
+        offset = len(body)
+        fields = (20, flags, method, dos_time, dos_date, crc, len(packed), len(content))
+        body += struct.pack("<I5HIII2H", 0x04034B50, *fields, len(name_bytes), 0)
+        body += name_bytes
+        body += packed
+        central += struct.pack(
+            "<I6HIII5HII",
+            0x02014B50,
+            20,
+            *fields,
+            len(name_bytes),
+            0,
+            0,
+            0,
+            0,
+            0,
+            offset,
+        )
+        central += name_bytes
+        count += 1
+
+    end = struct.pack(
+        "<I4HIIH", 0x06054B50, 0, 0, count, count, len(central), len(body), 0
+    )
+    return bytes(body + central + end)
+
+
+def xor_encrypt(data: bytes, key: str = DecryptTask.XOR_KEY) -> bytes:
+    """XOR加密（与 DecryptTask 的解密互逆）"""
+    key_bytes = key.encode("latin-1")
+    repeated = (key_bytes * (len(data) // len(key_bytes) + 1))[: len(data)]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(repeated, "big")).to_bytes(
+        len(data), "big"
+    )
+
+
+def model_members(model_dir: Path) -> List[Tuple[str, bytes]]:
+    """读取模型目录下的全部文件，归档内路径以模型名为根目录"""
+    return [
+        (
+            f"{model_dir.name}/{path.relative_to(model_dir).as_posix()}",
+            path.read_bytes(),
+        )
+        for path in sorted(model_dir.rglob("*"))
+        if path.is_file()
+    ]
+
+
+def build_preview_archive(model_dir: Path, size: int = 0, seed: int = 0) -> bytes:
+    """生成一个Preview文件（.lee）
+
+    Args:
+        model_dir: 示例模型目录
+        size: 目标大小（字节），模型本身更小时用不可压缩的随机填充文件补足
+        seed: 随机种子
+
+    Returns:
+        bytes: XOR加密后的归档内容
+    """
+    members = model_members(model_dir)
+    natural = sum(len(content) for _, content in members)
+    if size > natural:
+        filler = random.Random(seed).randbytes(size - natural)
+        members.append((f"{model_dir.name}/padding.bin", filler))
+    archive = build_encrypted_zip(members, ExtractTask.ZIP_PASSWORD.encode(), seed)
+    return xor_encrypt(archive)
+
+
+def pick_image(model_dir: Path) -> Path:
+    """选择模型的第一张纹理作为缩略图和预览图"""
+    textures = sorted(model_dir.rglob("*.png"))
+    if not textures:
+        raise FileNotFoundError(f"模型目录中没有PNG纹理: {model_dir}")
+    return textures[0]
+
+
+def build_fixtures(
+    fixtures_dir: Path,
+    models: Optional[List[str]] = None,
+    sizes_mb: Iterable[float] = (0,),
+    seed: int = 0,
+) -> List[Dict]:
+    """生成（或复用已缓存的）夹具
+
+    每个 (模型, 大小) 组合生成一个变体，合成作品按ID轮流使用这些变体。
+
+    Args:
+        fixtures_dir: 夹具目录
+        models: 使用的示例模型名，为空时使用全部
+        sizes_mb: 目标归档大小列表（MB），0表示不填充
+        seed: 随机种子
+
+    Returns:
+        List[Dict]: 变体列表，每项包含 name / model / archive / image / size
+    """
+    available = find_sample_models()
+    if not available:
+        raise FileNotFoundError(f"未找到示例模型: {SAMPLES_ROOT}")
+    names = models or list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(
+            f"未知的示例模型: {', '.join(unknown)}（可用: {', '.join(available)}）"
+        )
+
+    fixtures_dir = Path(fixtures_dir)
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    variants = []
+    for size_mb in sizes_mb:
+        for name in names:
+            model_dir = available[name]
+            size = int(size_mb * 1024 * 1024)
+            variant = f"{name}_{size}_{seed}"
+            archive = fixtures_dir / f"{variant}.lee"
+            if not archive.exists():
+                log.info("🧱 生成夹具: %s", variant)
+                tmp = archive.with_name(archive.name + ".part")
+                tmp.write_bytes(build_preview_archive(model_dir, size, seed))
+                tmp.replace(archive)
+            variants.append(
+                {
+                    "name": variant,
+                    "model": name,
+                    "archive": archive.name,
+                    "image": str(pick_image(model_dir)),
+                    "size": archive.stat().st_size,
+                }
+            )
+
+    with open(fixtures_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(variants, f, ensure_ascii=False, indent=2)
+    return variants
+
+
+class FixtureStorage:
+    """替身服务器的存储路径解析
+
+    第 n 个合成作品（item_id - base_id）使用第 n % 变体数 个变体：
+    .lee 文件返回变体归档，缩略图和预览图返回模型纹理。
+    只保存路径，可以传给子进程中的替身服务器。
+    """
+
+    def __init__(self, fixtures_dir: Path, base_id: int):
+        """初始化解析器
+
+        Args:
+            fixtures_dir: 由 build_fixtures 生成的夹具目录
+            base_id: 第一个合成作品的ID
+        """
+        self.fixtures_dir = Path(fixtures_dir)
+        self.base_id = base_id
+        with open(self.fixtures_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            self.variants = json.load(f)
+
+    def variant(self, item_id: int) -> Dict:
+        """作品使用的变体"""
+        return self.variants[(item_id - self.base_id) % len(self.variants)]
+
+    def __call__(self, item_id: int, path: str) -> Optional[Path]:
+        variant = self.variant(item_id)
+        if path.endswith(".lee"):
+            return self.fixtures_dir / variant["archive"]
+        if path.startswith("images/") or path.startswith("thumb_"):
+            return Path(variant["image"])
+        return None
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+阶段微基准测试
+
+单独测量各个组件，端到端结果退步时可以定位到具体阶段：
+
+    fetch_nizima.py bench                       # 全部用例
+    fetch_nizima.py bench --filter graph --repeat 9 --out micro.json
+    fetch_nizima.py bench --compare micro.json
+
+用例:
+- decrypt: DecryptTask 按文件大小的XOR解密吞吐
+- extract: ExtractTask 解压有密码 / 无密码的示例模型归档
+- graph: TaskGraph 在 1k/10k/100k 节点上逐波获取就绪任务直到全部完成
+- dispatch: TaskScheduler 每个空任务的调度开销（无依赖 / 链式依赖）
+- item: 与真实作品结构相同的任务图（模拟耗时）在就绪顺序 / 关键路径优先下的总耗时
+- finalize: RenameDirectoryTask 移动包含大量文件的目录（目标目录已存在时先删除）
+
+每个用例先预热，再重复计时，报告中位数和四分位距（IQR）；
+准备工作（生成输入、创建目录树）不计入计时。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 添加父目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.artifacts import Artifact
+from core.graph import TaskGraph
+from core.log import add_logging_arguments, setup_logging
+from core.scheduler import TaskScheduler
+from tasks import DecryptTask, ExtractTask, RenameDirectoryTask
+from tasks.base import Task
+
+from benchmark.fixtures import (
+    build_encrypted_zip,
+    find_sample_models,
+    model_members,
+    xor_encrypt,
+)
+from benchmark.stats import git_revision, summarize_samples
+
+log = logging.getLogger("nizima.benchmark")
+
+# 任务图用例的层数，每层节点依赖上一层的1~2个节点
+GRAPH_LAYERS = 8
+
+
+class Benchmark:
+    """微基准测试用例
+
+    prepare() 在全部计时之前调用一次；每次计时前调用 setup()，
+    只有 run() 计入时间，之后调用 teardown()
+    """
+
+    group = ""
+
+    def __init__(self, **params):
+        self.params = params
+        self.bytes: Optional[int] = None  # 每次运行处理的字节数，用于计算吞吐
+        self.ops: Optional[int] = None  # 每次运行的操作数，用于计算单次开销
+
+    @property
+    def name(self) -> str:
+        """用例名，如 decrypt[size_mb=8]"""
+        args = ",".join(f"{k}={v}" for k, v in self.params.items())
+        return f"{self.group}[{args}]"
+
+    def prepare(self, workdir: Path):
+        """一次性准备"""
+
+    def setup(self):
+        """每次计时前的准备"""
+
+    async def run(self):
+        """被计时的操作"""
+        raise NotImplementedError
+
+    def teardown(self):
+        """每次计时后的清理"""
+
+
+class DecryptBench(Benchmark):
+    """DecryptTask 的XOR解密吞吐"""
+
+    group = "decrypt"
+
+    def prepare(self, workdir: Path):
+        size = int(self.params["size_mb"] * 1024 * 1024)
+        # 不加密、不压缩的ZIP，解密后能通过ZIP魔数检查
+        payload = random.Random(0).randbytes(size)
+        archive = build_encrypted_zip([("payload.bin", payload)], None)
+        self.input_file = workdir / "input.lee"
+        self.input_file.write_bytes(xor_encrypt(archive))
+        self.output_file = workdir / "output.zip"
+        self.bytes = len(archive)
+
+    async def run(self):
+        task = DecryptTask("decrypt_bench", self.input_file, self.output_file)
+        await task.execute()
+
+    def teardown(self):
+        self.output_file.unlink(missing_ok=True)
+
+
+class ExtractBench(Benchmark):
+    """ExtractTask 解压示例模型归档"""
+
+    group = "extract"
+
+    def prepare(self, workdir: Path):
+        model_dir = find_sample_models()[self.params["model"]]
+        members = model_members(model_dir)
+        password = (
+            ExtractTask.ZIP_PASSWORD.encode() if self.params["password"] else None
+        )
+        self.input_file = workdir / "input.zip"
+        self.input_file.write_bytes(build_encrypted_zip(members, password))
+        self.output_dir = workdir / "extracted"
+        self.bytes = sum(len(content) for _, content in members)
+
+    async def run(self):
+        task = ExtractTask("extract_bench", self.input_file, self.output_dir)
+        await task.execute()
+
+    def teardown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+
+class NoopTask(Task):
+    """什么都不做的任务，用于测量调度开销"""
+
+    def is_completed(self) -> bool:
+        return False
+
+    async def execute(self) -> None:
+        self.mark_completed()
+
+
+def _layered_graph(nodes: int, seed: int = 0) -> TaskGraph:
+    """生成分层的任务图，每层节点依赖上一层的1~2个节点"""
+    rng = random.Random(seed)
+    width = max(nodes // GRAPH_LAYERS, 1)
+    graph = TaskGraph("bench")
+    previous: List[str] = []
+    for index in range(nodes):
+        if index % width == 0 and index:
+            previous = [f"t{i}" for i in range(index - width, index)]
+        deps = rng.sample(previous, min(len(previous), rng.randint(1, 2)))
+        graph.add_task(NoopTask(f"t{index}", deps))
+    return graph
+
+
+class GraphBench(Benchmark):
+    """TaskGraph 就绪集合维护
+
+    与调度器的循环相同：取就绪任务、全部标记完成，直到整张图完成
+    """
+
+    group = "graph"
+
+    def setup(self):
+        self.graph = _layered_graph(self.params["nodes"])
+        self.ops = self.params["nodes"]
+
+    async def run(self):
+        graph = self.graph
+        graph.validate_dependencies()
+        while not graph.is_all_completed():
+            for task_id in graph.get_ready_tasks():
+                graph.tasks[task_id].mark_completed()
+
+
+class DispatchBench(Benchmark):
+    """TaskScheduler 执行空任务图的单任务开销"""
+
+    group = "dispatch"
+
+    def setup(self):
+        tasks = self.params["tasks"]
+        self.graph = TaskGraph("bench")
+        for index in range(tasks):
+            deps = (
+                [f"t{index - 1}"] if self.params["shape"] == "chain" and index else []
+            )
+            self.graph.add_task(NoopTask(f"t{index}", deps))
+        self.ops = tasks
+
+    async def run(self):
+        if not await TaskScheduler(max_concurrent=5).execute_graph(self.graph):
+            raise RuntimeError("调度器未能完成空任务图")
+
+
+class SleepTask(Task):
+    """等待固定时长的任务，模拟下载和解密等阶段的耗时"""
+
+    def __init__(
+        self,
+        task_id: str,
+        seconds: float,
+        deps_on: List[str] = None,
+        expected_size: Optional[int] = None,
+    ):
+        super().__init__(task_id, deps_on)
+        self.seconds = seconds
+        self.expected_size = expected_size
+
+    def is_completed(self) -> bool:
+        return False
+
+    async def execute(self) -> None:
+        await asyncio.sleep(self.seconds)
+        self.mark_completed()
+
+
+def _item_graph(images: int, scale: float = 0.05) -> TaskGraph:
+    """与 TaskFactory 结构相同的作品任务图
+
+    预览归档（4MB）下载后还要解密、解压，图片（200KB）下载后只需处理；
+    耗时以 scale 秒为单位
+    """
+    item = "1"
+    graph = TaskGraph(item)
+    graph.add_task(SleepTask(f"save_detail_{item}", 0))
+    graph.add_task(
+        SleepTask(f"download_preview_{item}", 3 * scale, expected_size=4 << 20)
+    )
+    graph.add_task(
+        SleepTask(f"decrypt_preview_{item}", 2 * scale, [f"download_preview_{item}"])
+    )
+    graph.add_task(
+        SleepTask(f"extract_preview_{item}", 2 * scale, [f"decrypt_preview_{item}"])
+    )
+    for index in range(images):
+        download = f"download_preview_img_{index}_{item}"
+        graph.add_task(SleepTask(download, scale, expected_size=200 << 10))
+        graph.add_task(
+            SleepTask(f"process_preview_img_{index}_{item}", scale / 5, [download])
+        )
+    graph.add_task(
+        SleepTask(f"rename_dir_{item}", scale / 5, [f"extract_preview_{item}"])
+    )
+    graph.add_task(
+        SleepTask(
+            f"save_version_{item}", 0, [f"save_detail_{item}", f"rename_dir_{item}"]
+        )
+    )
+    return graph
+
+
+class ItemBench(Benchmark):
+    """单个作品任务图的总耗时（5个并发名额）
+
+    prioritize=False 时按任务就绪的先后顺序执行，预览归档下载完成后
+    解密要排在已就绪的图片任务后面；按关键路径排序时解密立即开始
+    """
+
+    group = "item"
+
+    def setup(self):
+        self.graph = _item_graph(self.params["images"])
+
+    async def run(self):
+        scheduler = TaskScheduler(
+            max_concurrent=5, prioritize=self.params["prioritize"]
+        )
+        if not await scheduler.execute_graph(self.graph):
+            raise RuntimeError("调度器未能完成作品任务图")
+
+
+class FinalizeBench(Benchmark):
+    """RenameDirectoryTask 移动暂存目录到最终位置"""
+
+    group = "finalize"
+
+    def prepare(self, workdir: Path):
+        self.workdir = workdir
+        self.ops = self.params["files"]
+
+    def _make_tree(self, root: Path):
+        """生成包含指定数量文件的目录树，每个子目录100个文件"""
+        for index in range(self.params["files"]):
+            sub = root / f"d{index // 100}"
+            if index % 100 == 0:
+                sub.mkdir(parents=True, exist_ok=True)
+            (sub / f"f{index}.json").write_bytes(b"{}")
+
+    def setup(self):
+        self.temp_dir = self.workdir / "staging" / "1"
+        self._make_tree(self.temp_dir)
+        self.output_dir = self.workdir / "output"
+        if self.params["replace"]:
+            self._make_tree(self.output_dir / "1_Bench")
+
+    async def run(self):
+        task = RenameDirectoryTask(
+            "rename_bench", self.temp_dir, self.output_dir, "1", "extract_bench"
+        )
+        task.inputs = {"extract_bench": Artifact(model_name="Bench")}
+        await task.execute()
+
+    def teardown(self):
+        shutil.rmtree(self.workdir / "staging", ignore_errors=True)
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+
+def default_benchmarks() -> List[Benchmark]:
+    """默认的用例参数组合"""
+    return [
+        *(DecryptBench(size_mb=size) for size in (1, 8)),
+        *(
+            ExtractBench(model=model, password=password)
+            for model in ("Mark", "Hiyori")
+            for password in (True, False)
+        ),
+        *(GraphBench(nodes=nodes) for nodes in (1_000, 10_000, 100_000)),
+        DispatchBench(tasks=1_000, shape="flat"),
+        DispatchBench(tasks=10_000, shape="flat"),
+        DispatchBench(tasks=1_000, shape="chain"),
+        *(ItemBench(images=20, prioritize=prioritize) for prioritize in (False, True)),
+        *(
+            FinalizeBench(files=files, replace=replace)
+            for files in (100, 10_000)
+            for replace in (False, True)
+        ),
+    ]
+
+
+async def measure(bench: Benchmark, warmup: int, repeat: int) -> Dict[str, Any]:
+    """预热后重复计时一个用例
+
+    Args:
+        bench: 用例
+        warmup: 预热次数
+        repeat: 计时次数
+
+    Returns:
+        Dict[str, Any]: 用例参数和计时统计（秒）
+    """
+    samples = []
+    with tempfile.TemporaryDirectory(prefix="nizima-bench-") as tmp:
+        bench.prepare(Path(tmp))
+        for index in range(warmup + repeat):
+            bench.setup()
+            start = time.perf_counter()
+            await bench.run()
+            elapsed = time.perf_counter() - start
+            bench.teardown()
+            if index >= warmup:
+                samples.append(elapsed)
+
+    stats = summarize_samples(samples)
+    result: Dict[str, Any] = {"group": bench.group, "params": bench.params, **stats}
+    if bench.bytes:
+        result["bytes"] = bench.bytes
+        result["mb_per_s"] = bench.bytes / stats["median"] / (1024 * 1024)
+    if bench.ops:
+        result["ops"] = bench.ops
+        result["us_per_op"] = stats["median"] / bench.ops * 1e6
+    return result
+
+
+def _format(result: Dict[str, Any]) -> str:
+    """一行计时结果"""
+    text = (
+        f"中位数 {result['median'] * 1000:10.3f} ms  "
+        f"IQR {result['iqr'] * 1000:8.3f} ms ({result['n']} 次)"
+    )
+    if "mb_per_s" in result:
+        text += f"  {result['mb_per_s']:8.2f} MB/s"
+    if "us_per_op" in result:
+        text += f"  {result['us_per_op']:8.2f} µs/个"
+    return text
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], threshold: float
+) -> bool:
+    """与基线结果对比
+
+    中位数变慢超过阈值、且本次的下四分位数高于基线的上四分位数时才算退步，
+    避免把噪声当成退步
+
+    Args:
+        results: 本次结果（用例名 -> 统计）
+        baseline: 基线结果文件内容
+        threshold: 允许的变慢比例
+
+    Returns:
+        bool: 是否有用例退步
+    """
+    regressed = False
+    log.info(
+        "📐 对比基线 %s", (baseline.get("git") or {}).get("commit") or "(未知提交)"
+    )
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        change = (result["median"] - old["median"]) / old["median"]
+        if change > threshold and result["q1"] > old["q3"]:
+            regressed = True
+            log.warning("⚠️ %-40s %+.1f%%", name, change * 100)
+        else:
+            log.info("   %-40s %+.1f%%", name, change * 100)
+    return regressed
+
+
+async def main(argv: List[str] = None):
+    """微基准测试子命令入口"""
+    parser = argparse.ArgumentParser(
+        prog="fetch_nizima.py bench", description="阶段微基准测试"
+    )
+    parser.add_argument(
+        "--filter", "-k", action="append", help="只运行名称包含该字符串的用例"
+    )
+    parser.add_argument("--warmup", type=int, default=1, help="预热次数")
+    parser.add_argument("--repeat", type=int, default=5, help="计时次数")
+    parser.add_argument("--list", action="store_true", help="只列出用例")
+    parser.add_argument("--out", help="把结果写入该JSON文件")
+    parser.add_argument("--compare", help="与该JSON结果对比")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="对比时允许的变慢比例"
+    )
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    shutdown_logging = setup_logging(args.verbose, args.quiet, args.log_json)
+    if not args.verbose:
+        for name in ("nizima.tasks", "nizima.scheduler"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    benchmarks = [
+        bench
+        for bench in default_benchmarks()
+        if not args.filter or any(f in bench.name for f in args.filter)
+    ]
+    if args.list:
+        for bench in benchmarks:
+            log.info("%s", bench.name)
+        shutdown_logging()
+        return
+
+    results = {}
+    for bench in benchmarks:
+        result = await measure(bench, args.warmup, args.repeat)
+        results[bench.name] = result
+        log.info("⏱️ %-40s %s", bench.name, _format(result))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "benchmark": "micro",
+                    "git": git_revision(),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "warmup": args.warmup,
+                    "repeat": args.repeat,
+                    "results": results,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        log.info("💾 结果已写入: %s", args.out)
+
+    regressed = False
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressed = compare(results, json.load(f), args.threshold)
+
+    shutdown_logging()
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,655 @@
+#!/usr/bin/env python3
+"""
+离散事件模拟器
+
+把记录下来的任务时间线（--trace 写出的 Chrome trace-event JSON）在虚拟时钟上重放，
+用来离线调整并发参数：
+
+    fetch_nizima.py simulate trace.json --concurrent 1,2,4,8 --cpu-lanes 0,2
+    fetch_nizima.py simulate trace.json --scale 20 --bandwidth 5 --rate-limit 0,2 --out sim.json
+    fetch_nizima.py simulate trace.json --task-order priority,fifo
+
+重放走的是生产代码：作品由 ingest.run_workers 分发，每个作品构建一个 TaskGraph
+交给 TaskScheduler 执行，只有任务本身换成按记录耗时占用模拟资源的 SimTask：
+- network: 按主机的连接数上限、请求速率上限、每次请求的延迟，
+  以及同一主机上并发传输平分的带宽（处理器共享）
+- cpu: cpu_lanes 个并行车道；0 表示在事件循环上直接执行（当前的实现），
+  执行期间整个事件循环停顿，所有传输也随之停止
+- disk: 按记录的耗时
+
+事件循环的时钟是虚拟的：没有就绪回调时直接跳到下一个定时器，
+几分钟的下载在几十毫秒内模拟完成。内存峰值按各任务类型的经验系数估算
+（解密把整个文件读入内存并生成同样大小的副本）。
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import selectors
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# 添加父目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.graph import TaskGraph
+from core.log import add_logging_arguments, setup_logging
+from core.priority import SizeHints
+from core.scheduler import TaskScheduler
+from core.session import CONNECTION_LIMIT, CONNECTION_LIMIT_PER_HOST
+from ingest import ordered_ids, ORDERS, run_workers
+from tasks.base import Task
+from tasks.download import CHUNK_SIZE
+
+from benchmark.stats import percentile
+
+log = logging.getLogger("nizima.simulate")
+
+# 任务执行期间占用的内存：输入字节数 × 系数 + 固定开销
+MEMORY_FACTORS = {"DecryptTask": 2.0}
+MEMORY_FIXED = {"DownloadTask": CHUNK_SIZE}
+
+# 作品级步骤（获取详情）所在的主机
+API_HOST = "api"
+# 没有记录主机的网络任务所在的主机
+DEFAULT_HOST = "storage"
+
+TASK_ORDERS = ("priority", "fifo")
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """不等待的选择器：等待多久，虚拟时钟就前进多久"""
+
+    def __init__(self):
+        super().__init__()
+        self.now = 0.0
+
+    def select(self, timeout=None):
+        if timeout is None:
+            raise RuntimeError("模拟中没有待执行的事件，任务在互相等待")
+        self.now += timeout
+        return super().select(0)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """虚拟时钟事件循环
+
+    loop.time() 返回虚拟时间，asyncio.sleep / wait_for 等定时器都以它为准。
+    只能运行不做真实I/O的协程。
+    """
+
+    def __init__(self):
+        super().__init__(_VirtualSelector())
+
+    def time(self) -> float:
+        return self._selector.now
+
+    def advance(self, seconds: float):
+        """在当前回调中直接推进时钟，模拟阻塞事件循环的同步计算"""
+        self._selector.now += seconds
+
+
+class TaskRecord:
+    """从时间线中读取的一个任务"""
+
+    __slots__ = (
+        "task_id",
+        "task_class",
+        "resource",
+        "host",
+        "deps",
+        "bytes",
+        "start",
+        "duration",
+        "input_bytes",
+    )
+
+    def __init__(
+        self, task_id: str, args: Dict[str, Any], start: float, duration: float
+    ):
+        self.task_id = task_id
+        self.task_class = args.get("task_class", "")
+        self.resource = ""
+        self.host: Optional[str] = args.get("host")
+        self.deps: List[str] = list(args.get("deps", []))
+        self.bytes: Optional[int] = args.get("bytes")
+        self.start = start
+        self.duration = duration
+        self.input_bytes = 0  # 依赖任务产生的字节数，用于估算内存
+
+
+class ItemRecord:
+    """从时间线中读取的一个作品"""
+
+    def __init__(self, item_id: str):
+        self.item_id = item_id
+        self.start = 0.0
+        self.end = 0.0
+        self.prelude = 0.0  # 开始到第一个任务排队（获取详情、构建任务图）
+        self.finalize = 0.0  # 最后一个任务结束到作品完成（移动输出目录）
+        self.tasks: List[TaskRecord] = []
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(t.bytes or 0 for t in self.tasks)
+
+
+def load_trace(path: Path) -> List[ItemRecord]:
+    """读取 --trace 写出的时间线
+
+    Args:
+        path: trace-event JSON 文件
+
+    Returns:
+        List[ItemRecord]: 按开始时间排序的作品，只包含完成的作品
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        events = json.load(f)["traceEvents"]
+
+    names: Dict[int, str] = {}
+    items: Dict[int, ItemRecord] = {}
+    queued: Dict[int, float] = {}  # 第一个任务排队的时间
+    last_end: Dict[int, float] = {}  # 最后一个任务结束的时间
+    for event in events:
+        pid = event.get("pid")
+        if event.get("ph") == "M" and event.get("name") == "process_name":
+            names[pid] = event["args"]["name"].removeprefix("item ")
+            continue
+        if event.get("ph") != "X":
+            continue
+        item = items.setdefault(pid, ItemRecord(""))
+        start = event["ts"] / 1e6
+        end = start + event["dur"] / 1e6
+        cat = event.get("cat")
+        if cat == "item":
+            item.start, item.end = start, end
+        elif cat == "queue":
+            queued[pid] = min(queued.get(pid, start), start)
+        else:
+            record = TaskRecord(
+                event["name"], event.get("args", {}), start, end - start
+            )
+            record.resource = cat
+            item.tasks.append(record)
+            queued[pid] = min(queued.get(pid, start), start)
+            last_end[pid] = max(last_end.get(pid, end), end)
+
+    result = []
+    for pid, item in items.items():
+        if not item.tasks or not item.end:
+            continue
+        item.item_id = names.get(pid, str(pid))
+        item.prelude = max(0.0, queued[pid] - item.start)
+        item.finalize = max(0.0, item.end - last_end[pid])
+        task_ids = {t.task_id for t in item.tasks}
+        produced = {t.task_id: t.bytes or 0 for t in item.tasks}
+        for task in item.tasks:
+            task.deps = [d for d in task.deps if d in task_ids]
+            task.input_bytes = sum(produced[d] for d in task.deps)
+        # 依赖链上的大小向下传递：解压的输入是解密的输出，大小与下载相同
+        for task in _topological(item.tasks):
+            if task.bytes is None and task.resource != "network":
+                produced[task.task_id] = task.input_bytes
+                for other in item.tasks:
+                    if task.task_id in other.deps:
+                        other.input_bytes = sum(produced[d] for d in other.deps)
+        result.append(item)
+    return sorted(result, key=lambda i: i.start)
+
+
+def _topological(tasks: List[TaskRecord]) -> List[TaskRecord]:
+    """按依赖顺序排列任务"""
+    done: set = set()
+    ordered = []
+    pending = list(tasks)
+    while pending:
+        rest = [t for t in pending if not all(d in done for d in t.deps)]
+        for task in pending:
+            if task not in rest:
+                ordered.append(task)
+                done.add(task.task_id)
+        if len(rest) == len(pending):
+            ordered.extend(rest)  # 环或缺失的依赖，保持原顺序
+            break
+        pending = rest
+    return ordered
+
+
+def _merge(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """合并重叠的区间"""
+    merged: List[Tuple[float, float]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _overlap(a: List[Tuple[float, float]], b: List[Tuple[float, float]]) -> float:
+    """两组已合并区间的重叠总长度"""
+    total = 0.0
+    i = j = 0
+    while i < len(a) and j < len(b):
+        total += max(0.0, min(a[i][1], b[j][1]) - max(a[i][0], b[j][0]))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return total
+
+
+def estimate_network(items: List[ItemRecord]) -> Tuple[float, float]:
+    """从时间线估算带宽和请求延迟
+
+    延迟取各作品获取详情耗时的中位数（小响应，几乎全是往返时间）。
+    带宽取网络任务字节数除以传输时间：扣除延迟后各任务区间的并集，
+    再去掉CPU任务阻塞事件循环的时间（这段时间里传输并没有推进）。
+
+    Returns:
+        Tuple[float, float]: (带宽 MB/秒, 延迟秒数)
+    """
+    latency = statistics.median(i.prelude for i in items) if items else 0.0
+    network = []
+    cpu = []
+    total = 0
+    for item in items:
+        for task in item.tasks:
+            end = task.start + task.duration
+            if task.resource == "network" and task.bytes:
+                total += task.bytes
+                network.append((min(task.start + latency, end), end))
+            elif task.resource == "cpu":
+                cpu.append((task.start, end))
+    network = _merge(network)
+    busy = sum(end - start for start, end in network) - _overlap(network, _merge(cpu))
+    bandwidth = total / busy / (1024 * 1024) if busy > 0 else 0.0
+    return bandwidth, latency
+
+
+class _Link:
+    """主机带宽：同时进行的传输平分带宽"""
+
+    def __init__(self, loop: VirtualClockLoop, bandwidth: float):
+        self.loop = loop
+        self.bandwidth = bandwidth  # 字节/秒，0表示不限
+        self.flows: Dict[asyncio.Future, float] = {}  # 传输 -> 剩余字节
+        self._updated = loop.time()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def transfer(self, size: int):
+        """传输指定字节数"""
+        if not self.bandwidth or size <= 0:
+            return
+        self.settle()
+        future = self.loop.create_future()
+        self.flows[future] = float(size)
+        self.reschedule()
+        await future
+
+    def settle(self):
+        """按上次更新以来的时间扣减剩余字节"""
+        now = self.loop.time()
+        if self.flows:
+            sent = (now - self._updated) * self.bandwidth / len(self.flows)
+            for future in self.flows:
+                self.flows[future] -= sent
+        self._updated = now
+
+    def skip(self):
+        """上次更新以来的时间不计入传输（事件循环被阻塞）"""
+        self._updated = self.loop.time()
+        self.reschedule()
+
+    def reschedule(self):
+        """完成已传完的传输，为下一个完成时刻设置定时器"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        for future, remaining in list(self.flows.items()):
+            if remaining <= 1e-6:
+                del self.flows[future]
+                if not future.done():
+                    future.set_result(None)
+        if self.flows:
+            delay = min(self.flows.values()) * len(self.flows) / self.bandwidth
+            self._timer = self.loop.call_later(delay, self._tick)
+
+    def _tick(self):
+        self._timer = None
+        self.settle()
+        self.reschedule()
+
+
+class _Host:
+    """模拟的主机：连接数上限、请求速率上限和带宽"""
+
+    def __init__(self, loop: VirtualClockLoop, config: Dict[str, Any]):
+        self.loop = loop
+        self.latency = config["latency"]
+        self.interval = 1 / config["rate_limit"] if config["rate_limit"] else 0.0
+        self.connections = asyncio.Semaphore(config["connections"])
+        self.link = _Link(loop, config["bandwidth"] * 1024 * 1024)
+        self._next_slot = 0.0
+
+    async def request(self, size: int):
+        """一次请求：等待速率名额和连接，经过延迟后传输响应体"""
+        if self.interval:
+            now = self.loop.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            await asyncio.sleep(slot - now)
+        async with self.connections:
+            await asyncio.sleep(self.latency)
+            await self.link.transfer(size)
+
+
+class World:
+    """一次模拟中的全部资源"""
+
+    def __init__(self, loop: VirtualClockLoop, config: Dict[str, Any]):
+        self.loop = loop
+        self.config = config
+        self.hosts: Dict[str, _Host] = {}
+        self.connections = asyncio.Semaphore(CONNECTION_LIMIT)
+        lanes = config["cpu_lanes"]
+        self.cpu = asyncio.Semaphore(lanes) if lanes else None
+        self.memory = 0
+        self.peak_memory = 0
+        self.cpu_busy = 0.0
+
+    def host(self, name: str) -> _Host:
+        if name not in self.hosts:
+            self.hosts[name] = _Host(self.loop, self.config)
+        return self.hosts[name]
+
+    async def request(self, host: str, size: int):
+        """通过连接池向主机发起一次请求"""
+        async with self.connections:
+            await self.host(host).request(size)
+
+    async def compute(self, seconds: float):
+        """执行一段CPU计算"""
+        self.cpu_busy += seconds
+        if self.cpu is None:
+            # 在事件循环上同步执行：时钟直接前进，期间传输不推进
+            for host in self.hosts.values():
+                host.link.settle()
+            self.loop.advance(seconds)
+            for host in self.hosts.values():
+                host.link.skip()
+            return
+        async with self.cpu:
+            await asyncio.sleep(seconds)
+
+    def allocate(self, size: int):
+        self.memory += size
+        self.peak_memory = max(self.peak_memory, self.memory)
+
+    def free(self, size: int):
+        self.memory -= size
+
+
+class SimTask(Task):
+    """按记录的耗时和大小占用模拟资源的任务"""
+
+    def __init__(self, world: World, record: TaskRecord):
+        super().__init__(record.task_id, list(record.deps))
+        self.world = world
+        self.record = record
+        self.resource_class = record.resource
+
+    def is_completed(self) -> bool:
+        return False
+
+    async def execute(self) -> None:
+        record = self.record
+        memory = int(
+            record.input_bytes * MEMORY_FACTORS.get(record.task_class, 0.0)
+        ) + MEMORY_FIXED.get(record.task_class, 0)
+        self.world.allocate(memory)
+        try:
+            if record.resource == "network" and record.bytes is not None:
+                await self.world.request(record.host or DEFAULT_HOST, record.bytes)
+            elif record.resource == "cpu":
+                await self.world.compute(record.duration)
+            else:
+                await asyncio.sleep(record.duration)
+        finally:
+            self.world.free(memory)
+        self.mark_completed()
+
+
+async def _simulate(items: List[ItemRecord], config: Dict[str, Any]) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    world = World(loop, config)
+    # 与生产相同，下载任务的预期大小来自之前运行中同类任务的平均大小
+    hints = SizeHints()
+    for item in items:
+        for record in item.tasks:
+            if record.resource == "network" and record.bytes:
+                hints.observe(record.task_id, item.item_id, record.bytes)
+    by_id = {item.item_id: item for item in items}
+    finished: Dict[str, float] = {}
+
+    async def handle(item_id: str) -> bool:
+        item = by_id[item_id]
+        await world.request(API_HOST, 0)
+        await asyncio.sleep(max(0.0, item.prelude - config["latency"]))
+        graph = TaskGraph(item_id)
+        for record in item.tasks:
+            graph.add_task(SimTask(world, record))
+        scheduler = TaskScheduler(
+            max_concurrent=config["task_concurrent"],
+            size_hints=hints,
+            prioritize=config["task_order"] == "priority",
+        )
+        success = await scheduler.execute_graph(graph)
+        await asyncio.sleep(item.finalize)
+        finished[item_id] = loop.time()
+        return success
+
+    async def estimate(batch: List[str]) -> Dict[str, Optional[int]]:
+        # 与生产使用同一排序，估算值取记录中的实际字节数
+        return {item_id: by_id[item_id].total_bytes for item_id in batch}
+
+    successful, failed = await run_workers(
+        ordered_ids(list(by_id), config["order"], estimate),
+        handle,
+        config["concurrent"],
+    )
+    completion = list(finished.values())
+    return {
+        "makespan_s": round(loop.time(), 3),
+        "items": successful,
+        "failed": len(failed),
+        "items_per_s": round(successful / loop.time(), 3) if loop.time() else 0.0,
+        "item_done_mean_s": round(statistics.fmean(completion), 3),
+        "item_done_p95_s": round(percentile(completion, 0.95), 3),
+        "peak_memory_bytes": world.peak_memory,
+        "cpu_busy_s": round(world.cpu_busy, 3),
+    }
+
+
+def simulate(items: List[ItemRecord], config: Dict[str, Any]) -> Dict[str, Any]:
+    """在新的虚拟时钟事件循环上模拟一次运行
+
+    Args:
+        items: 作品记录
+        config: concurrent / task_concurrent / cpu_lanes / order / task_order /
+            bandwidth（MB/秒，0不限）/ latency / rate_limit（请求/秒，0不限）/ connections
+
+    Returns:
+        Dict[str, Any]: 预测的总耗时、作品完成时间、内存峰值等
+    """
+    loop = VirtualClockLoop()
+    try:
+        return loop.run_until_complete(_simulate(items, config))
+    finally:
+        loop.close()
+
+
+def scale_items(items: List[ItemRecord], factor: int) -> List[ItemRecord]:
+    """把记录的作品复制 factor 份（作品ID加 #n 后缀），模拟更大的批量"""
+    if factor <= 1:
+        return items
+    scaled = []
+    for index in range(factor):
+        for item in items:
+            copy = ItemRecord(f"{item.item_id}#{index}")
+            copy.start = item.start
+            copy.end = item.end
+            copy.prelude = item.prelude
+            copy.finalize = item.finalize
+            copy.tasks = item.tasks
+            scaled.append(copy)
+    return scaled
+
+
+def _values(text: str, kind=float) -> List:
+    return [kind(value) for value in text.split(",") if value]
+
+
+def _format_bytes(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f}MB"
+
+
+async def main(argv: List[str] = None):
+    """模拟器子命令入口"""
+    parser = argparse.ArgumentParser(
+        prog="fetch_nizima.py simulate",
+        description="在虚拟时钟上重放任务时间线，比较不同并发设置",
+    )
+    parser.add_argument("traces", nargs="+", help="--trace 写出的时间线文件")
+    parser.add_argument(
+        "--concurrent", default="3", help="作品并发数，逗号分隔多个取值"
+    )
+    parser.add_argument(
+        "--task-concurrent", default="5", help="单个作品内的任务并发数，逗号分隔"
+    )
+    parser.add_argument(
+        "--cpu-lanes",
+        default="0",
+        help="CPU任务的并行车道数，0表示在事件循环上执行（当前实现），逗号分隔",
+    )
+    parser.add_argument(
+        "--order", default="fifo", help=f"作品顺序（{'/'.join(ORDERS)}），逗号分隔"
+    )
+    parser.add_argument(
+        "--task-order",
+        default="priority",
+        help=f"作品内就绪任务的顺序（{'/'.join(TASK_ORDERS)}），逗号分隔",
+    )
+    parser.add_argument(
+        "--bandwidth", help="每个主机的带宽（MB/秒，0不限），默认从时间线估算"
+    )
+    parser.add_argument("--latency", help="每次请求的延迟（秒），默认从时间线估算")
+    parser.add_argument(
+        "--rate-limit", default="0", help="每个主机的请求速率上限（请求/秒，0不限）"
+    )
+    parser.add_argument(
+        "--connections",
+        default=str(CONNECTION_LIMIT_PER_HOST),
+        help="每个主机的连接数上限",
+    )
+    parser.add_argument(
+        "--scale", type=int, default=1, help="把记录的作品复制多份，模拟更大的批量"
+    )
+    parser.add_argument("--out", help="把全部结果写入该JSON文件")
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    shutdown_logging = setup_logging(args.verbose, args.quiet, args.log_json)
+    if not args.verbose:
+        logging.getLogger("nizima.scheduler").setLevel(logging.WARNING)
+
+    items: List[ItemRecord] = []
+    for path in args.traces:
+        items.extend(load_trace(Path(path)))
+    if not items:
+        log.error("❌ 时间线中没有完成的作品")
+        shutdown_logging()
+        sys.exit(1)
+
+    bandwidth, latency = estimate_network(items)
+    recorded = max(i.end for i in items) - min(i.start for i in items)
+    log.info(
+        "📼 %d 个作品，%d 个任务，记录的总耗时 %.2f 秒",
+        len(items),
+        sum(len(i.tasks) for i in items),
+        recorded,
+    )
+    log.info("📶 估算带宽 %.2f MB/秒，请求延迟 %.0f ms", bandwidth, latency * 1000)
+    for order in _values(args.order, str):
+        if order not in ORDERS:
+            parser.error(f"未知的作品顺序: {order}")
+    for order in _values(args.task_order, str):
+        if order not in TASK_ORDERS:
+            parser.error(f"未知的任务顺序: {order}")
+
+    items = scale_items(items, args.scale)
+    sweep = {
+        "concurrent": _values(args.concurrent, int),
+        "task_concurrent": _values(args.task_concurrent, int),
+        "cpu_lanes": _values(args.cpu_lanes, int),
+        "order": _values(args.order, str),
+        "task_order": _values(args.task_order, str),
+        "bandwidth": _values(args.bandwidth) if args.bandwidth else [bandwidth],
+        "latency": _values(args.latency) if args.latency else [latency],
+        "rate_limit": _values(args.rate_limit),
+        "connections": _values(args.connections, int),
+    }
+    configs = [
+        dict(zip(sweep, values)) for values in itertools.product(*sweep.values())
+    ]
+
+    started = time.perf_counter()
+    results = []
+    for config in configs:
+        # 子命令运行在事件循环中，模拟需要在另一个线程里使用自己的事件循环
+        prediction = await asyncio.to_thread(simulate, items, config)
+        results.append({"config": config, **prediction})
+    log.info(
+        "⚡ %d 种配置模拟完成，用时 %.2f 秒",
+        len(configs),
+        time.perf_counter() - started,
+    )
+
+    varying = [key for key, values in sweep.items() if len(values) > 1]
+    results.sort(key=lambda r: r["makespan_s"])
+    for rank, result in enumerate(results):
+        label = ", ".join(f"{key}={result['config'][key]}" for key in varying)
+        log.info(
+            "%s %-40s 总耗时 %8.2f 秒, 作品完成 均值 %.2f / p95 %.2f 秒, 内存峰值 %s",
+            "🏆" if rank == 0 else "  ",
+            label or "(默认配置)",
+            result["makespan_s"],
+            result["item_done_mean_s"],
+            result["item_done_p95_s"],
+            _format_bytes(result["peak_memory_bytes"]),
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "traces": args.traces,
+                    "items": len(items),
+                    "recorded_makespan_s": round(recorded, 3),
+                    "estimated": {"bandwidth": bandwidth, "latency": latency},
+                    "results": results,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        log.info("💾 结果已写入: %s", args.out)
+    shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+基准测试统计和结果记录
+
+分位数、样本汇总，以及写入结果文件的提交信息
+"""
+
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+def percentile(values: List[float], q: float) -> float:
+    """线性插值的分位数
+
+    Args:
+        values: 样本
+        q: 分位（0~1）
+
+    Returns:
+        float: 分位数，样本为空时返回0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def summarize_samples(samples: List[float]) -> Dict[str, float]:
+    """汇总计时样本（秒）
+
+    Returns:
+        Dict[str, float]: median / q1 / q3 / iqr / min / max / mean / n
+    """
+    q1 = percentile(samples, 0.25)
+    q3 = percentile(samples, 0.75)
+    return {
+        "median": statistics.median(samples),
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "min": min(samples),
+        "max": max(samples),
+        "mean": statistics.fmean(samples),
+        "n": len(samples),
+    }
+
+
+def git_revision() -> Dict[str, Any]:
+    """当前提交哈希及下载器目录是否有未提交修改"""
+    cwd = Path(__file__).parent.parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, text=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--", "."],
+                cwd=cwd,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+        )
+    except OSError:
+        return {"commit": None, "dirty": None}
+    return {"commit": commit or None, "dirty": dirty}
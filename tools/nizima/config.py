@@ -0,0 +1,15 @@
+"""
+服务地址配置
+
+默认指向线上服务，可通过环境变量或直接修改模块属性指向本地替身服务器
+"""
+
+import os
+
+# 作品详情与下载API
+API_BASE = os.environ.get("NIZIMA_API_BASE", "https://nizima.com")
+
+# 预览模型和图片所在的存储桶
+STORAGE_BASE = os.environ.get(
+    "NIZIMA_STORAGE_BASE", "https://storage.googleapis.com/market_view_useritems"
+)
@@ -0,0 +1,618 @@
+"""
+ZIP归档结构检查
+
+预览模型归档使用按位置的XOR加密（第 i 个字节与 key[i % len(key)] 异或），
+任意一段字节只要知道它在文件中的偏移就能单独解密，不必解密整个文件。
+这里利用这一点只读取文件末尾：
+- check_archive: 检查下载完成的文件的中央目录结束记录（EOCD），
+  下载被截断时末尾的记录缺失或指向文件之外，在解密、解压之前就能发现
+- RemoteArchive: 用 Range 请求只下载远程归档的末尾和中央目录，就地解密后交给
+  zipfile 解析，不下载整个文件就能得到成员列表、大小和模型名称；
+  还可以只下载并解压选中的成员（按通配符或 model3.json 中的引用角色选择），
+  相邻的字节范围合并为一个请求
+"""
+
+import fnmatch
+import io
+import json
+import logging
+import posixpath
+import re
+import struct
+import sys
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import aiohttp
+
+# 添加父目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tasks.decrypt import DecryptTask
+
+log = logging.getLogger("nizima.archive")
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+# XOR密钥（与 DecryptTask 相同）
+XOR_KEY = DecryptTask.XOR_KEY.encode("ascii")
+
+# 中央目录结束记录
+EOCD_SIGNATURE = b"PK\x05\x06"
+EOCD_SIZE = 22
+EOCD_FORMAT = "<4sHHHHIIH"
+
+# ZIP64 中央目录结束记录定位器（位于 EOCD 之前）
+ZIP64_LOCATOR_SIGNATURE = b"PK\x06\x07"
+ZIP64_LOCATOR_SIZE = 20
+
+# 中央目录文件头
+CENTRAL_SIGNATURE = b"PK\x01\x02"
+
+# EOCD 之后最多有 65535 字节的注释，末尾读取这么多就一定包含 EOCD
+TAIL_SIZE = EOCD_SIZE + 0xFFFF
+
+# 合并成员字节范围时允许的最大间隔：间隔内的数据一并下载，换取更少的请求
+COALESCE_GAP = 64 * 1024
+
+# 目录浏览只需要的成员：模型定义、显示信息和每个模型的第一张贴图
+CATALOGUE_SELECTION = ("*.model3.json", "*.cdi3.json", "role:Textures[0]")
+
+# 引用角色选择器，如 role:Moc、role:Textures[0]、role:Motions[Idle]
+ROLE_PATTERN = re.compile(r"role:(\w+)(?:\[([^\]]+)\])?$")
+
+
+class ArchiveError(Exception):
+    """归档结构无效（截断、不是ZIP等）"""
+
+
+def xor_at(data: Buffer, offset: int = 0) -> bytes:
+    """按位置XOR解密（加密）一段数据
+
+    Args:
+        data: 数据
+        offset: 数据在文件中的起始偏移
+
+    Returns:
+        bytes: 解密后的数据
+    """
+    size = len(data)
+    if not size:
+        return b""
+    start = offset % len(XOR_KEY)
+    repeats = (start + size) // len(XOR_KEY) + 1
+    stream = (XOR_KEY * repeats)[start : start + size]
+    value = int.from_bytes(data, "little") ^ int.from_bytes(stream, "little")
+    return value.to_bytes(size, "little")
+
+
+def is_encrypted(head: Buffer) -> bool:
+    """根据开头4个字节判断文件是否经过XOR加密
+
+    Args:
+        head: 文件开头（至少4字节）
+
+    Returns:
+        bool: 加密的ZIP返回True，未加密的ZIP返回False
+
+    Raises:
+        ArchiveError: 两种情况都不是ZIP
+    """
+    head = bytes(head[:4])
+    if head in DecryptTask.ZIP_MAGIC:
+        return False
+    if xor_at(head) in DecryptTask.ZIP_MAGIC:
+        return True
+    raise ArchiveError(f"不是ZIP文件（开头为 {head!r}）")
+
+
+@dataclass
+class EndRecord:
+    """中央目录结束记录"""
+
+    position: int  # EOCD 在文件中的偏移
+    entries: int  # 中央目录中的条目数
+    cd_offset: int  # 中央目录的偏移
+    cd_size: int  # 中央目录的字节数
+    zip64: bool = False  # 是否使用ZIP64（条目数、偏移和大小以ZIP64记录为准）
+
+
+def find_end_record(tail: Buffer, tail_offset: int, file_size: int) -> EndRecord:
+    """在文件末尾的数据中查找并检查中央目录结束记录
+
+    Args:
+        tail: 文件末尾的数据（已解密）
+        tail_offset: tail 在文件中的起始偏移
+        file_size: 文件大小
+
+    Returns:
+        EndRecord: 结束记录
+
+    Raises:
+        ArchiveError: 找不到有效的结束记录
+    """
+    tail = bytes(tail)
+    index = tail.rfind(EOCD_SIGNATURE)
+    while index >= 0:
+        if index + EOCD_SIZE <= len(tail):
+            fields = struct.unpack_from(EOCD_FORMAT, tail, index)
+            _, disk, cd_disk, _, entries, cd_size, cd_offset, comment = fields
+            position = tail_offset + index
+            # 注释长度必须与文件末尾对齐，排除恰好出现在数据中的签名
+            if position + EOCD_SIZE + comment == file_size:
+                zip64 = 0xFFFFFFFF in (cd_size, cd_offset) or entries == 0xFFFF
+                if zip64:
+                    locator = index - ZIP64_LOCATOR_SIZE
+                    if locator < 0 or (
+                        tail[locator : locator + 4] != ZIP64_LOCATOR_SIGNATURE
+                    ):
+                        raise ArchiveError("缺少ZIP64结束记录定位器")
+                elif disk or cd_disk:
+                    raise ArchiveError("不支持分卷ZIP")
+                elif cd_offset + cd_size > position:
+                    raise ArchiveError(
+                        f"中央目录超出文件范围（偏移 {cd_offset} + {cd_size} > {position}）"
+                    )
+                return EndRecord(position, entries, cd_offset, cd_size, zip64)
+        index = tail.rfind(EOCD_SIGNATURE, 0, index)
+    raise ArchiveError("找不到中央目录结束记录，文件可能被截断")
+
+
+def check_archive(path: Path) -> EndRecord:
+    """只读取文件开头和末尾，检查下载的ZIP（可能经过XOR加密）是否完整
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        EndRecord: 结束记录
+
+    Raises:
+        ArchiveError: 不是ZIP或结构无效
+    """
+    with open(path, "rb") as f:
+        file_size = f.seek(0, 2)
+        if file_size < EOCD_SIZE:
+            raise ArchiveError(f"文件过小（{file_size} 字节）")
+        f.seek(0)
+        encrypted = is_encrypted(f.read(4))
+
+        def read_at(offset: int, size: int) -> bytes:
+            f.seek(offset)
+            data = f.read(size)
+            return xor_at(data, offset) if encrypted else data
+
+        tail_offset = max(0, file_size - TAIL_SIZE)
+        record = find_end_record(
+            read_at(tail_offset, file_size - tail_offset), tail_offset, file_size
+        )
+        if not record.zip64 and record.entries:
+            if read_at(record.cd_offset, 4) != CENTRAL_SIGNATURE:
+                raise ArchiveError(f"偏移 {record.cd_offset} 处不是中央目录")
+    return record
+
+
+class MissingRange(Exception):
+    """读取了 SparseFile 中尚未获取的字节范围"""
+
+    def __init__(self, start: int, end: int):
+        """初始化
+
+        Args:
+            start: 起始偏移
+            end: 结束偏移（不含）
+        """
+        super().__init__(f"字节范围 {start}-{end} 尚未获取")
+        self.start = start
+        self.end = end
+
+
+class SparseFile(io.RawIOBase):
+    """只有部分字节范围已知的只读文件对象
+
+    大小与远程文件相同，已获取的范围保存在内存中；交给 zipfile 时，
+    读取未获取的范围抛出 MissingRange，由调用方获取后重试
+    """
+
+    def __init__(self, size: int):
+        """初始化
+
+        Args:
+            size: 文件大小
+        """
+        super().__init__()
+        self.size = size
+        self._segments: List[Tuple[int, bytes]] = []  # 按偏移排序，互不相邻
+        self._pos = 0
+
+    @property
+    def known(self) -> int:
+        """已获取的字节数"""
+        return sum(len(data) for _, data in self._segments)
+
+    def add(self, offset: int, data: Buffer):
+        """添加已获取（已解密）的字节范围，与相邻或重叠的范围合并
+
+        Args:
+            offset: 起始偏移
+            data: 数据
+        """
+        start, end, merged = offset, offset + len(data), bytes(data)
+        kept = []
+        for seg_start, seg_data in self._segments:
+            seg_end = seg_start + len(seg_data)
+            if seg_end < start or seg_start > end:
+                kept.append((seg_start, seg_data))
+                continue
+            if seg_start < start:
+                merged = seg_data[: start - seg_start] + merged
+                start = seg_start
+            if seg_end > end:
+                merged = merged + seg_data[end - seg_start :]
+                end = seg_end
+        kept.append((start, merged))
+        kept.sort(key=lambda seg: seg[0])
+        self._segments = kept
+
+    def missing(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """[start, end) 中尚未获取的范围"""
+        gaps = []
+        for seg_start, seg_data in self._segments:
+            seg_end = seg_start + len(seg_data)
+            if seg_end <= start:
+                continue
+            if seg_start >= end:
+                break
+            if seg_start > start:
+                gaps.append((start, seg_start))
+            start = max(start, seg_end)
+        if start < end:
+            gaps.append((start, end))
+        return gaps
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise OSError("偏移不能为负")
+        self._pos = offset
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        start = self._pos
+        end = self.size if size is None or size < 0 else min(self.size, start + size)
+        if start >= end:
+            return b""
+        for seg_start, seg_data in self._segments:
+            if seg_start <= start and end <= seg_start + len(seg_data):
+                self._pos = end
+                return seg_data[start - seg_start : end - seg_start]
+        raise MissingRange(start, end)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def coalesce(
+    ranges: List[Tuple[int, int]], gap: int = COALESCE_GAP
+) -> List[Tuple[int, int]]:
+    """合并重叠或间隔不超过 gap 的字节范围
+
+    Args:
+        ranges: [(start, end)]，end 不含
+        gap: 允许的最大间隔
+
+    Returns:
+        List[Tuple[int, int]]: 按偏移排序的合并结果
+    """
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start - merged[-1][1] <= gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def role_references(model3: Dict[str, Any], role: str, key: Optional[str]) -> List[str]:
+    """model3.json 中某个引用角色的文件（相对于 model3.json 所在目录）
+
+    Args:
+        model3: model3.json 的内容
+        role: FileReferences 中的键，如 Moc、Textures、Physics、DisplayInfo、
+            Expressions、Motions
+        key: 列表角色的序号（Textures[0]）或动作的分组名（Motions[Idle]），
+            为空时选择全部
+
+    Returns:
+        List[str]: 引用的相对路径
+    """
+    value = model3.get("FileReferences", {}).get(role)
+    if value is None:
+        return []
+    if isinstance(value, dict):  # Motions: {分组: [{"File", "Sound"}]}
+        groups = [value.get(key, [])] if key is not None else list(value.values())
+        entries = [entry for group in groups for entry in group]
+    elif isinstance(value, list):  # Textures: [路径]，Expressions: [{"Name", "File"}]
+        entries = value
+        if key is not None:
+            index = int(key) if key.lstrip("-").isdigit() else None
+            entries = entries[index : index + 1 or None] if index is not None else []
+    else:
+        entries = [value]
+
+    paths = []
+    for entry in entries:
+        if isinstance(entry, str):
+            paths.append(entry)
+        elif isinstance(entry, dict):
+            paths.extend(entry[k] for k in ("File", "Sound") if entry.get(k))
+    return paths
+
+
+def _content_range_total(response: aiohttp.ClientResponse) -> Optional[int]:
+    """解析 Content-Range 头（bytes start-end/total）中的文件大小"""
+    _, _, total = response.headers.get("Content-Range", "").rpartition("/")
+    return int(total) if total.isdigit() else None
+
+
+class RemoteArchive:
+    """通过 Range 请求读取的远程ZIP归档（可能经过XOR加密）
+
+    用法:
+        archive = await RemoteArchive(url, session).open()
+        archive.model_name, archive.members
+    """
+
+    # 打开时获取缺失范围的最大次数（ZIP64需要额外读取结束记录）
+    MAX_FETCHES = 8
+
+    def __init__(self, url: str, session: aiohttp.ClientSession):
+        """初始化
+
+        Args:
+            url: 归档URL
+            session: HTTP会话
+        """
+        self.url = url
+        self.session = session
+        self.size = 0
+        self.encrypted = False
+        self.requests = 0  # 发出的 Range 请求数
+        self.bytes_fetched = 0  # 下载的字节数
+        self.sparse: Optional[SparseFile] = None
+        self.zip: Optional[zipfile.ZipFile] = None
+        self._boundaries: Optional[List[int]] = None  # 成员和中央目录的起始偏移
+
+    async def _get(self, range_spec: str) -> Tuple[int, bytes, aiohttp.ClientResponse]:
+        """发出 Range 请求
+
+        Returns:
+            Tuple: (数据在文件中的偏移, 数据, 响应)；服务器不支持 Range 时为整个文件
+        """
+        self.requests += 1
+        async with self.session.get(
+            self.url, headers={"Range": f"bytes={range_spec}"}
+        ) as response:
+            response.raise_for_status()
+            data = await response.read()
+        self.bytes_fetched += len(data)
+        if response.status != 206:
+            return 0, data, response
+        total = _content_range_total(response)
+        start = int(response.headers["Content-Range"].split()[1].split("-")[0])
+        if total is not None:
+            self.size = total
+        return start, data, response
+
+    async def fetch(self, start: int, end: int):
+        """获取 [start, end) 范围（只请求尚未获取的部分）并解密
+
+        Args:
+            start: 起始偏移
+            end: 结束偏移（不含）
+        """
+        for gap_start, gap_end in self.sparse.missing(start, end):
+            offset, data, _ = await self._get(f"{gap_start}-{gap_end - 1}")
+            self.sparse.add(offset, xor_at(data, offset) if self.encrypted else data)
+
+    async def open(self) -> "RemoteArchive":
+        """获取末尾和中央目录并解析
+
+        Returns:
+            RemoteArchive: self
+
+        Raises:
+            ArchiveError: 不是ZIP或结构无效
+        """
+        offset, tail, response = await self._get(f"-{TAIL_SIZE}")
+        if response.status != 206:
+            self.size = len(tail)  # 服务器不支持 Range，已下载整个文件
+        if not self.size:
+            raise ArchiveError("无法确定文件大小")
+
+        try:
+            record = find_end_record(tail, offset, self.size)
+        except ArchiveError:
+            tail = xor_at(tail, offset)
+            record = find_end_record(tail, offset, self.size)
+            self.encrypted = True
+        self.sparse = SparseFile(self.size)
+        self.sparse.add(offset, tail)
+        if not record.zip64:
+            await self.fetch(record.cd_offset, record.position)
+
+        for _ in range(self.MAX_FETCHES):
+            try:
+                self.zip = zipfile.ZipFile(self.sparse)
+                break
+            except MissingRange as e:
+                await self.fetch(e.start, e.end)
+            except zipfile.BadZipFile as e:
+                raise ArchiveError(f"中央目录无效: {e}") from e
+        else:
+            raise ArchiveError("读取中央目录需要的范围过多")
+
+        log.debug(
+            "🔎 远程归档 %s: %d 个成员，%d 次请求下载 %d / %d 字节",
+            self.url,
+            len(self.zip.infolist()),
+            self.requests,
+            self.bytes_fetched,
+            self.size,
+        )
+        return self
+
+    def member_range(self, info: zipfile.ZipInfo) -> Tuple[int, int]:
+        """成员在归档中的字节范围：本地文件头、数据和数据描述符，到下一个成员为止"""
+        if self._boundaries is None:
+            self._boundaries = sorted(
+                {i.header_offset for i in self.members} | {self.zip.start_dir}
+            )
+        index = self._boundaries.index(info.header_offset)
+        return info.header_offset, self._boundaries[index + 1]
+
+    async def fetch_members(self, members: List[zipfile.ZipInfo]):
+        """下载成员的字节范围，间隔不超过 COALESCE_GAP 的范围合并为一个请求
+
+        Args:
+            members: 成员列表
+        """
+        for start, end in coalesce([self.member_range(info) for info in members]):
+            await self.fetch(start, end)
+
+    async def select(
+        self, patterns: List[str], pwd: Optional[bytes] = None
+    ) -> List[zipfile.ZipInfo]:
+        """按通配符或引用角色选择成员
+
+        通配符按完整路径匹配（* 可以匹配 /），如 *.model3.json；
+        role:角色[序号或分组] 按每个 model3.json 中的 FileReferences 选择，
+        如 role:Textures[0] 为每个模型的第一张贴图（需要先下载 model3.json）
+
+        Args:
+            patterns: 选择器列表
+            pwd: 成员的ZIP密码（读取 model3.json）
+
+        Returns:
+            List[zipfile.ZipInfo]: 选中的成员（中央目录顺序）
+        """
+        files = [info for info in self.members if not info.is_dir()]
+        chosen = set()
+        roles = []
+        for pattern in patterns:
+            match = ROLE_PATTERN.match(pattern)
+            if match:
+                roles.append(match.groups())
+                continue
+            chosen.update(
+                info.filename
+                for info in files
+                if fnmatch.fnmatchcase(info.filename, pattern)
+            )
+
+        if roles:
+            by_name = {info.filename: info for info in files}
+            models = [
+                info for info in files if info.filename.lower().endswith(".model3.json")
+            ]
+            await self.fetch_members(models)
+            for info in models:
+                try:
+                    model3 = json.loads(
+                        self.zip.read(info, pwd=pwd).decode("utf-8-sig")
+                    )
+                except (ValueError, RuntimeError) as e:
+                    log.warning("⚠️ 无法解析 %s: %s", info.filename, e)
+                    continue
+                base = posixpath.dirname(info.filename)
+                for role, key in roles:
+                    for ref in role_references(model3, role, key):
+                        path = posixpath.normpath(posixpath.join(base, ref))
+                        if path in by_name:
+                            chosen.add(path)
+                        else:
+                            log.debug("⚠️ %s 引用的 %s 不在归档中", info.filename, path)
+
+        return [info for info in files if info.filename in chosen]
+
+    async def extract(
+        self,
+        members: List[zipfile.ZipInfo],
+        output_dir: Path,
+        pwd: Optional[bytes] = None,
+    ) -> List[Path]:
+        """只下载并解压指定的成员，目录结构与解压整个归档相同
+
+        Args:
+            members: 成员列表
+            output_dir: 输出目录
+            pwd: 成员的ZIP密码
+
+        Returns:
+            List[Path]: 解压出的文件
+        """
+        await self.fetch_members(members)
+        return [Path(self.zip.extract(info, output_dir, pwd=pwd)) for info in members]
+
+    @property
+    def members(self) -> List[zipfile.ZipInfo]:
+        """成员列表（中央目录顺序）"""
+        return self.zip.infolist()
+
+    @property
+    def model_name(self) -> str:
+        """模型名称：与 ExtractTask 相同，取第一个 .moc3 文件的文件名"""
+        for info in self.members:
+            if info.filename.lower().endswith(".moc3"):
+                return Path(info.filename).stem
+        return "unknown_model"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        return {
+            "url": self.url,
+            "size": self.size,
+            "encrypted": self.encrypted,
+            "model_name": self.model_name,
+            "requests": self.requests,
+            "bytes_fetched": self.bytes_fetched,
+            "members": [
+                {
+                    "name": info.filename,
+                    "size": info.file_size,
+                    "compressed_size": info.compress_size,
+                    "offset": info.header_offset,
+                }
+                for info in self.members
+                if not info.is_dir()
+            ],
+        }
+
+
+async def inspect_remote(url: str, session: aiohttp.ClientSession) -> RemoteArchive:
+    """不下载整个文件，读取远程归档的成员列表和模型名称
+
+    Args:
+        url: 归档URL
+        session: HTTP会话
+
+    Returns:
+        RemoteArchive: 已打开的远程归档
+    """
+    return await RemoteArchive(url, session).open()
@@ -0,0 +1,226 @@
+"""
+任务产出（Artifact）传递实现
+
+任务之间原本只通过暂存目录中的文件交流：解密任务重新读取刚下载的文件，
+解压任务重新打开刚解密的ZIP。现在生产者把产出发布到产出仓库，
+调度器在执行消费者之前把依赖任务的产出交给它（task.inputs）：
+- 产出可以带有内存中的内容（bytes / memoryview），消费者直接使用，不再读回文件
+- 所有作品共享一个内存预算，超出预算的产出溢写到磁盘（生产者已写入文件时只丢弃内存副本），
+  消费者读取时透明地回退到文件
+- 每个产出记录消费者数量，最后一个消费者结束后释放内存
+
+产出还可以携带元数据（如解压任务的模型名、重命名任务的最终目录），
+后续任务按元数据取值，不必判断依赖任务结果的类型。
+"""
+
+import io
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+
+from .metrics import metrics
+
+log = logging.getLogger("nizima.artifacts")
+
+# 默认内存预算（字节）
+DEFAULT_BUDGET = 256 * 1024 * 1024
+
+Buffer = Union[bytes, bytearray, memoryview]
+ArtifactKey = Tuple[Optional[str], str]  # (作品ID, 任务ID)
+
+
+class Artifact:
+    """任务产出
+
+    path 为产出的文件或目录，data 为内存中的内容（可能因超出预算被丢弃），
+    meta 为附带的元数据
+    """
+
+    __slots__ = ("path", "data", "meta")
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        data: Optional[Buffer] = None,
+        **meta: Any,
+    ):
+        """初始化产出
+
+        Args:
+            path: 产出的文件或目录
+            data: 内存中的内容
+            **meta: 元数据
+        """
+        self.path = Path(path) if path is not None else None
+        self.data = memoryview(data) if data is not None else None
+        self.meta: Dict[str, Any] = meta
+
+    @classmethod
+    def from_result(cls, result: Any) -> "Artifact":
+        """由任务的返回值生成产出（没有显式设置产出的任务）
+
+        Args:
+            result: 任务返回值，路径或包含 output_dir 的字典
+
+        Returns:
+            Artifact: 产出
+        """
+        if isinstance(result, Artifact):
+            return result
+        if isinstance(result, (str, Path)):
+            return cls(path=result)
+        if isinstance(result, dict):
+            meta = dict(result)
+            return cls(path=meta.pop("output_dir", None), **meta)
+        return cls(value=result)
+
+    @property
+    def in_memory(self) -> bool:
+        """内容是否在内存中"""
+        return self.data is not None
+
+    @property
+    def size(self) -> int:
+        """内存中内容的字节数"""
+        return self.data.nbytes if self.data is not None else 0
+
+    def read(self) -> Buffer:
+        """读取内容：内存中时直接返回 memoryview，否则读取文件"""
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def open(self) -> BinaryIO:
+        """以文件对象打开内容（如交给 zipfile）"""
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return open(self.path, "rb")
+
+    def write_to(self, target: Path):
+        """把内容写入目标文件
+
+        Args:
+            target: 目标文件路径
+        """
+        if self.data is None:
+            import shutil
+
+            shutil.copyfile(self.path, target)
+            return
+        with open(target, "wb") as f:
+            f.write(self.data)
+
+    def __repr__(self) -> str:
+        where = f"{self.size} B 内存" if self.data is not None else "磁盘"
+        return f"Artifact({self.path}, {where}, meta={self.meta})"
+
+
+class ArtifactStore:
+    """产出仓库
+
+    按 (作品ID, 任务ID) 保存产出，所有作品共享同一个内存预算
+    """
+
+    def __init__(self, budget: int = DEFAULT_BUDGET, spill_dir: Optional[Path] = None):
+        """初始化仓库
+
+        Args:
+            budget: 内存中产出的总字节数上限，0表示全部溢写
+            spill_dir: 没有对应文件的产出溢写到的目录，默认系统临时目录
+        """
+        self.budget = budget
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.in_memory = 0  # 当前内存中的字节数
+        self.peak = 0
+        self._artifacts: Dict[ArtifactKey, Artifact] = {}
+        self._consumers: Dict[ArtifactKey, int] = {}
+        self._spilled: Dict[ArtifactKey, Path] = {}  # 仓库自己写出的溢写文件
+
+    def publish(self, key: ArtifactKey, artifact: Artifact, consumers: int):
+        """发布产出
+
+        Args:
+            key: (作品ID, 任务ID)
+            artifact: 产出
+            consumers: 消费者数量，为0时不保留内存中的内容
+        """
+        self.discard(key)
+        if artifact.data is not None:
+            if consumers == 0:
+                artifact.data = None
+            elif self.in_memory + artifact.size > self.budget:
+                self._spill(key, artifact)
+            else:
+                self.in_memory += artifact.size
+                self.peak = max(self.peak, self.in_memory)
+                metrics.artifact_memory.set(self.in_memory)
+        self._artifacts[key] = artifact
+        self._consumers[key] = consumers
+
+    def _spill(self, key: ArtifactKey, artifact: Artifact):
+        """超出预算：丢弃内存中的内容，必要时先写入溢写文件"""
+        metrics.artifact_spills.inc()
+        if artifact.path is None or not artifact.path.is_file():
+            fd, name = tempfile.mkstemp(
+                prefix="nizima-", suffix=".spill", dir=self.spill_dir
+            )
+            with os.fdopen(fd, "wb") as f:
+                f.write(artifact.data)
+            artifact.path = Path(name)
+            self._spilled[key] = artifact.path
+        log.debug(
+            "💾 产出 %s 超出内存预算（已用 %d / %d 字节），溢写到 %s",
+            key[1],
+            self.in_memory,
+            self.budget,
+            artifact.path,
+        )
+        artifact.data = None
+
+    def get(self, key: ArtifactKey) -> Optional[Artifact]:
+        """获取产出，不存在时返回None"""
+        return self._artifacts.get(key)
+
+    def release(self, key: ArtifactKey):
+        """一个消费者已结束；最后一个消费者结束后释放内存中的内容
+
+        Args:
+            key: (作品ID, 任务ID)
+        """
+        if key not in self._consumers:
+            return
+        self._consumers[key] -= 1
+        if self._consumers[key] <= 0:
+            self._free(self._artifacts[key], key)
+
+    def _free(self, artifact: Artifact, key: ArtifactKey):
+        if artifact.data is not None:
+            self.in_memory -= artifact.size
+            artifact.data = None
+            metrics.artifact_memory.set(self.in_memory)
+        spilled = self._spilled.pop(key, None)
+        if spilled is not None:
+            spilled.unlink(missing_ok=True)
+
+    def discard(self, key: ArtifactKey):
+        """删除产出并释放内存"""
+        artifact = self._artifacts.pop(key, None)
+        self._consumers.pop(key, None)
+        if artifact is not None:
+            self._free(artifact, key)
+
+    def discard_item(self, item_id: Optional[str]):
+        """删除一个作品的全部产出（任务图执行结束时调用）
+
+        Args:
+            item_id: 作品ID
+        """
+        for key in [k for k in self._artifacts if k[0] == item_id]:
+            self.discard(key)
+
+
+# 进程内共享的产出仓库
+artifact_store = ArtifactStore()
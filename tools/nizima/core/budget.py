@@ -0,0 +1,204 @@
+"""
+内存预算（准入控制）实现
+
+所有作品的任务共享一个字节预算：任务开始执行前按预期占用的内存
+（下载的 Content-Length / fileSize，解密、解压按输入大小估算）申请预算，
+执行结束后归还。这样即使同时有很多大归档在下载、解密和解压，
+进程占用的内存也不会超过容器的限制。
+
+- 预算不足时任务排队等待；排在前面的大任务等待期间，能放下的小任务可以先执行（回填）
+- 排在最前面的任务等待超过 STARVATION_TIMEOUT 秒后不再回填，空出的预算留给它
+- 单个任务的需求超过整个预算时按整个预算计算（等其他任务都结束后单独执行）
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque
+
+from .metrics import metrics
+
+log = logging.getLogger("nizima.budget")
+
+# 默认预算（字节）
+DEFAULT_LIMIT = 1024 * 1024 * 1024
+
+# 排在最前面的任务等待超过该时长（秒）后停止回填
+STARVATION_TIMEOUT = 30.0
+
+
+class _Waiter:
+    """排队等待预算的任务"""
+
+    __slots__ = ("nbytes", "since", "future")
+
+    def __init__(self, nbytes: int, future: asyncio.Future):
+        self.nbytes = nbytes
+        self.since = time.monotonic()
+        self.future = future
+
+
+class ByteBudget:
+    """字节预算信号量
+
+    用法:
+        async with budget.reserve(expected_bytes):
+            await task.execute()
+    """
+
+    def __init__(
+        self, limit: int = DEFAULT_LIMIT, starvation: float = STARVATION_TIMEOUT
+    ):
+        """初始化预算
+
+        Args:
+            limit: 预算上限（字节），0表示不限制
+            starvation: 排在最前面的任务等待超过该时长（秒）后停止回填
+        """
+        self.starvation = starvation
+        self.in_use = 0
+        self.peak = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self.limit = limit
+
+    @property
+    def limit(self) -> int:
+        """预算上限（字节），0表示不限制"""
+        return self._limit
+
+    @limit.setter
+    def limit(self, value: int):
+        self._limit = max(0, int(value))
+        metrics.memory_limit.set(self._limit)
+        self._wake()
+
+    @property
+    def waiting(self) -> int:
+        """排队等待的任务数"""
+        return len(self._waiters)
+
+    def _clamp(self, nbytes: int) -> int:
+        """需求超过整个预算时按整个预算计算"""
+        return min(max(0, int(nbytes)), self._limit)
+
+    def _fits(self, nbytes: int) -> bool:
+        return not self._limit or self.in_use + nbytes <= self._limit
+
+    def _starving(self) -> bool:
+        """最前面的任务是否已等待过久（停止回填）"""
+        return bool(self._waiters) and (
+            time.monotonic() - self._waiters[0].since >= self.starvation
+        )
+
+    def _grant(self, nbytes: int):
+        self.in_use += nbytes
+        self.peak = max(self.peak, self.in_use)
+        metrics.memory_reserved.set(self.in_use)
+
+    def try_acquire(self, nbytes: int) -> bool:
+        """不等待地申请预算
+
+        Args:
+            nbytes: 字节数
+
+        Returns:
+            bool: 是否申请成功
+        """
+        nbytes = self._clamp(nbytes)
+        if not nbytes:
+            return True
+        if self._starving() or not self._fits(nbytes):
+            return False
+        self._grant(nbytes)
+        return True
+
+    async def acquire(self, nbytes: int) -> int:
+        """申请预算，不足时排队等待
+
+        Args:
+            nbytes: 字节数
+
+        Returns:
+            int: 实际占用的字节数（release 时归还该值）
+        """
+        nbytes = self._clamp(nbytes)
+        if not nbytes:
+            return 0
+        if self.try_acquire(nbytes):
+            return nbytes
+
+        waiter = _Waiter(nbytes, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        metrics.admission_waits.inc()
+        log.debug(
+            "⏳ 等待内存预算: 需要 %.1f MB，已占用 %.1f / %.1f MB，排队 %d 个",
+            nbytes / (1024 * 1024),
+            self.in_use / (1024 * 1024),
+            self._limit / (1024 * 1024),
+            len(self._waiters),
+        )
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已分配到预算但同时被取消，归还
+                self.release(waiter.nbytes)
+            else:
+                self._waiters.remove(waiter)
+                self._wake()
+            raise
+        finally:
+            metrics.admission_wait.observe(time.monotonic() - waiter.since)
+        return waiter.nbytes
+
+    def release(self, nbytes: int):
+        """归还预算并唤醒能放下的等待者
+
+        Args:
+            nbytes: acquire 返回的字节数
+        """
+        if not nbytes:
+            return
+        self.in_use -= nbytes
+        metrics.memory_reserved.set(self.in_use)
+        self._wake()
+
+    def _wake(self):
+        """按排队顺序分配预算：放不下的任务后面能放下的任务可以回填，
+        最前面的任务等待过久时停止回填"""
+        if not self._waiters:
+            return
+        now = time.monotonic()
+        for waiter in list(self._waiters):
+            if waiter.future.done():
+                continue
+            if not self._limit:
+                waiter.nbytes = 0  # 预算已取消限制
+            if self._fits(waiter.nbytes):
+                self._waiters.remove(waiter)
+                self._grant(waiter.nbytes)
+                waiter.future.set_result(None)
+            elif now - waiter.since >= self.starvation:
+                break  # 空出的预算留给等待过久的任务
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[int]:
+        """在 with 块执行期间占用预算
+
+        Args:
+            nbytes: 字节数
+
+        Yields:
+            int: 实际占用的字节数
+        """
+        granted = await self.acquire(nbytes)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+
+# 进程内共享的内存预算
+memory_budget = ByteBudget()
@@ -0,0 +1,156 @@
+"""
+取消作用域实现
+
+用真正的 asyncio 取消代替全局中断标志：
+- 每次运行一个根作用域，每个作品一个子作用域，取消父作用域时所有子作用域一起取消
+- 进入作用域（with scope:）时绑定当前 asyncio 任务，取消时立即对其调用 cancel()，
+  正在进行的下载在下一次 await 处停止，不必等当前任务执行完
+- 作用域自己发出的取消在退出时被吸收，之后的代码通过 cancel_called 判断是否被取消；
+  来自作用域外的取消照常向上传播
+
+同一进程中的两次独立下载使用各自的作用域，互不影响。
+"""
+
+import asyncio
+import logging
+import signal
+import weakref
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+log = logging.getLogger("nizima.cancel")
+
+# 当前任务所在的取消作用域
+current_scope: ContextVar[Optional["CancelScope"]] = ContextVar(
+    "current_scope", default=None
+)
+
+
+class CancelScope:
+    """取消作用域
+
+    用法:
+        run_scope = CancelScope()
+        with run_scope.child() as scope:
+            await fetch()
+        if scope.cancel_called:
+            ...  # 被取消，fetch 在某个 await 处中断
+    """
+
+    def __init__(self, parent: Optional["CancelScope"] = None):
+        """初始化作用域
+
+        Args:
+            parent: 父作用域，父作用域取消时本作用域一起取消
+        """
+        self.parent = parent
+        self.reason: Optional[str] = None
+        self._cancelled = False
+        self._children: "weakref.WeakSet[CancelScope]" = weakref.WeakSet()
+        # 绑定的任务 -> 本作用域对其发出的取消次数
+        self._tasks: Dict[asyncio.Task, int] = {}
+        self._tokens = []
+        if parent is not None:
+            parent._children.add(self)
+
+    def child(self) -> "CancelScope":
+        """创建子作用域"""
+        return CancelScope(self)
+
+    @property
+    def cancel_called(self) -> bool:
+        """本作用域或任一父作用域是否已取消"""
+        scope = self
+        while scope is not None:
+            if scope._cancelled:
+                return True
+            scope = scope.parent
+        return False
+
+    def cancel(self, reason: str = "已取消"):
+        """取消作用域：绑定的任务立即收到 CancelledError，子作用域一起取消
+
+        Args:
+            reason: 取消原因
+        """
+        if self._cancelled:
+            return
+        self._cancelled = True
+        self.reason = reason
+        for task in list(self._tasks):
+            self._cancel_task(task)
+        for child in list(self._children):
+            child.cancel(reason)
+
+    def _cancel_task(self, task: asyncio.Task):
+        if not task.done():
+            task.cancel(self.reason)
+            self._tasks[task] += 1
+
+    def __enter__(self) -> "CancelScope":
+        task = asyncio.current_task()
+        if task is None:
+            raise RuntimeError("取消作用域只能在 asyncio 任务中使用")
+        self._tasks[task] = 0
+        self._tokens.append(current_scope.set(self))
+        if self.cancel_called:
+            self.reason = self.reason or self._inherited_reason()
+            self._cancel_task(task)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        current_scope.reset(self._tokens.pop())
+        task = asyncio.current_task()
+        issued = self._tasks.pop(task, 0)
+        if not issued:
+            return False
+        # 撤销本作用域发出的取消；仍有外部取消时继续传播
+        for _ in range(issued):
+            remaining = task.uncancel()
+        return exc_type is asyncio.CancelledError and remaining == 0
+
+    def _inherited_reason(self) -> str:
+        scope = self.parent
+        while scope is not None:
+            if scope._cancelled:
+                return scope.reason
+            scope = scope.parent
+        return "已取消"
+
+
+def cancel_requested() -> bool:
+    """当前任务所在的作用域是否已取消"""
+    scope = current_scope.get()
+    return scope is not None and scope.cancel_called
+
+
+def install_signal_handlers(scope: CancelScope) -> Callable[[], None]:
+    """把 SIGINT / SIGTERM 转为取消作用域
+
+    第一次信号取消作用域，进行中的下载立即停止并保留 .part 文件和暂存目录；
+    再次收到信号时恢复默认处理，直接终止进程。
+
+    Args:
+        scope: 收到信号时取消的作用域
+
+    Returns:
+        Callable[[], None]: 移除信号处理器的函数
+    """
+    loop = asyncio.get_running_loop()
+    signals = (signal.SIGINT, signal.SIGTERM)
+
+    def remove():
+        for sig in signals:
+            loop.remove_signal_handler(sig)
+
+    def handler():
+        remove()
+        log.warning("🛑 收到中断信号，正在取消进行中的下载...")
+        log.warning(
+            "💡 已下载的部分和暂存目录会被保留，重新运行时继续；再按一次 Ctrl+C 强制退出"
+        )
+        scope.cancel("收到中断信号")
+
+    for sig in signals:
+        loop.add_signal_handler(sig, handler)
+    return remove
@@ -0,0 +1,174 @@
+"""
+作品详情缓存
+
+把详情API的响应按 item_id 保存到磁盘，连同 ETag / Last-Modified：
+- 有效期内直接使用缓存，不发请求
+- 过期后带 If-None-Match / If-Modified-Since 重新验证，304时继续使用缓存
+- 同一作品的并发请求合并为一次（single-flight）
+- 离线模式只读缓存，不请求详情API
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+# 添加父目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils import DetailError, detail_url, read_detail_response
+
+# 默认有效期：24小时
+DEFAULT_TTL = 24 * 3600
+
+
+class DetailCache:
+    """作品详情磁盘缓存
+
+    每个作品一个文件 {cache_dir}/{item_id}.json：
+    {"item_id", "fetched_at", "etag", "last_modified", "data"}
+    """
+
+    def __init__(
+        self, cache_dir: Path, ttl: float = DEFAULT_TTL, offline: bool = False
+    ):
+        """初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            ttl: 有效期（秒），过期后需要重新验证
+            offline: 离线模式，只使用缓存
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.offline = offline
+        self.stats: Counter = Counter()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, item_id: str, session: aiohttp.ClientSession) -> Dict[str, Any]:
+        """获取作品详情
+
+        Args:
+            item_id: 作品ID
+            session: HTTP会话
+
+        Returns:
+            Dict[str, Any]: 详情数据
+
+        Raises:
+            DetailError: 作品无效，或离线模式下缓存未命中
+        """
+        future = self._inflight.get(item_id)
+        if future is None:
+            future = asyncio.ensure_future(self._load(item_id, session))
+            self._inflight[item_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(item_id, None))
+        else:
+            self.stats["coalesced"] += 1
+
+        # shield：一个等待者被取消不影响其他等待者
+        return await asyncio.shield(future)
+
+    async def _load(
+        self, item_id: str, session: aiohttp.ClientSession
+    ) -> Dict[str, Any]:
+        """读取缓存，必要时请求或重新验证"""
+        entry = self._read(item_id)
+
+        if entry is not None and (
+            self.offline or time.time() - entry["fetched_at"] < self.ttl
+        ):
+            self.stats["hit"] += 1
+            return entry["data"]
+
+        if self.offline:
+            self.stats["offline_miss"] += 1
+            raise DetailError("offline", f"离线模式下没有作品 '{item_id}' 的缓存详情")
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        async with session.get(detail_url(item_id), headers=headers) as response:
+            if response.status == 304 and entry is not None:
+                self.stats["revalidated"] += 1
+                entry["fetched_at"] = time.time()
+                self._write(item_id, entry)
+                return entry["data"]
+
+            data = await read_detail_response(item_id, response)
+            self.stats["updated" if entry is not None else "miss"] += 1
+            self._write(
+                item_id,
+                {
+                    "item_id": item_id,
+                    "fetched_at": time.time(),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "data": data,
+                },
+            )
+            return data
+
+    def peek(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的详情数据，不发请求也不检查有效期
+
+        Args:
+            item_id: 作品ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 详情数据，没有缓存时返回None
+        """
+        entry = self._read(item_id)
+        return entry["data"] if entry else None
+
+    def _path(self, item_id: str) -> Path:
+        return self.cache_dir / f"{item_id}.json"
+
+    def _read(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """读取缓存条目，不存在或损坏时返回None"""
+        try:
+            with open(self._path(item_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, item_id: str, entry: Dict[str, Any]):
+        """原子写入缓存条目"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(item_id)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def report(self) -> str:
+        """缓存统计摘要"""
+        lookups = sum(
+            self.stats[k]
+            for k in ("hit", "revalidated", "updated", "miss", "offline_miss")
+        )
+        if not lookups:
+            return "详情缓存: 未使用"
+        conditional = self.stats["revalidated"] + self.stats["updated"]
+        lines = [
+            f"详情缓存: 查询 {lookups} 次, 命中 {self.stats['hit']} "
+            f"({self.stats['hit'] / lookups:.0%}), 合并并发请求 {self.stats['coalesced']} 次",
+            (
+                f"  重新验证 {conditional} 次, 304 {self.stats['revalidated']} "
+                f"({self.stats['revalidated'] / conditional:.0%})"
+                if conditional
+                else "  重新验证 0 次"
+            ),
+            f"  未缓存 {self.stats['miss']} 次, 离线未命中 {self.stats['offline_miss']} 次",
+        ]
+        return "\n".join(lines)
@@ -0,0 +1,70 @@
+"""
+事件总线实现
+
+调度器、任务和下载器通过事件总线广播执行进度，
+守护进程等上层组件订阅事件而无需侵入任务代码
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, List
+
+log = logging.getLogger("nizima.events")
+
+Event = Dict[str, Any]
+Subscriber = Callable[[Event], None]
+
+
+class EventBus:
+    """事件总线
+
+    同步广播：emit 直接调用所有订阅者，订阅者必须快速返回。
+    没有订阅者时 emit 只做一次列表判空，开销可以忽略。
+    """
+
+    def __init__(self):
+        """初始化事件总线"""
+        self._subscribers: List[Subscriber] = []
+
+    @property
+    def active(self) -> bool:
+        """是否存在订阅者"""
+        return bool(self._subscribers)
+
+    def subscribe(self, callback: Subscriber) -> Callable[[], None]:
+        """订阅事件
+
+        Args:
+            callback: 事件回调，参数为事件字典
+
+        Returns:
+            Callable[[], None]: 取消订阅函数
+        """
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def emit(self, event_type: str, **fields: Any):
+        """广播事件
+
+        Args:
+            event_type: 事件类型，如 "task_start"
+            **fields: 事件字段，通常包含 item_id 和 task_id
+        """
+        if not self._subscribers:
+            return
+
+        event = {"type": event_type, "ts": time.time(), **fields}
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                log.warning("⚠️ 事件订阅者异常 (%s): %s", event_type, e)
+
+
+# 进程级事件总线，事件通过 item_id 区分来源
+bus = EventBus()
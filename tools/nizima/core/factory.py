@@ -6,15 +6,17 @@
 
 import sys
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 # 添加父目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import config
 from tasks import (
     DecryptTask,
     DownloadTask,
     ExtractTask,
+    FetchMembersTask,
     ProcessImagesTask,
     RenameDirectoryTask,
     SaveDetailJsonTask,
@@ -24,37 +26,60 @@ from tasks import (
 from .graph import TaskGraph
 
 
+def selective_deferred(item_id: str) -> List[str]:
+    """选择性下载时不执行的完整Preview任务，记为缺少"""
+    return [
+        f"{stage}_preview_{item_id}" for stage in ("download", "decrypt", "extract")
+    ]
+
+
 class TaskFactory:
     """任务工厂
 
     根据输入信息创建完整的任务图
     """
 
-    def __init__(self, item_id: str, base_output_dir: Path, temp_dir: Path):
+    def __init__(
+        self,
+        item_id: str,
+        base_output_dir: Path,
+        temp_dir: Path,
+        session: Optional["aiohttp.ClientSession"] = None,
+        select: Optional[List[str]] = None,
+    ):
         """初始化任务工厂
 
         Args:
             item_id: 作品ID
             base_output_dir: 基础输出目录 (如 models/nizima/)
             temp_dir: 临时工作目录
+            session: 下载任务共享的HTTP会话
+            select: 预览模型的成员选择器，指定时只下载选中的成员（选择性下载），
+                不下载Export，作品记为部分完成
         """
         self.item_id = item_id
         self.base_output_dir = Path(base_output_dir)
         self.temp_dir = Path(temp_dir)
+        self.session = session
+        self.select = select
 
     async def create_task_graph(
-        self, assets_info: "AssetsInfo", detail_data: Dict[str, Any]
+        self,
+        assets_info: "AssetsInfo",
+        detail_data: Dict[str, Any],
+        prepare_dirs: bool = True,
     ) -> TaskGraph:
         """根据资源信息创建任务图
 
         Args:
             assets_info: 资源信息
             detail_data: 详细数据
+            prepare_dirs: 是否创建暂存子目录（只规划不执行时为False，不修改磁盘）
 
         Returns:
             TaskGraph: 构建好的任务图
         """
-        graph = TaskGraph()
+        graph = TaskGraph(self.item_id)
 
         # 创建关键目录路径
         downloads_dir = self.temp_dir / "downloads"
@@ -62,8 +87,9 @@ class TaskFactory:
         extracted_dir = self.temp_dir / "extracted"
 
         # 确保目录存在
-        for dir_path in [downloads_dir, decrypted_dir, extracted_dir]:
-            dir_path.mkdir(parents=True, exist_ok=True)
+        if prepare_dirs:
+            for dir_path in [downloads_dir, decrypted_dir, extracted_dir]:
+                dir_path.mkdir(parents=True, exist_ok=True)
 
         # 1. 保存detail.json任务
         save_detail_task = SaveDetailJsonTask(
@@ -75,20 +101,24 @@ class TaskFactory:
 
         # 2. Preview相关任务
         preview_extract_task = None
-        if assets_info.preview_live2d_zip:
+        if assets_info.preview_live2d_zip and self.select:
+            preview_extract_task = self._create_selective_task(graph, assets_info)
+        elif assets_info.preview_live2d_zip:
             preview_extract_task = await self._create_preview_tasks(
                 graph, assets_info, downloads_dir, decrypted_dir, extracted_dir
             )
 
         # 3. Export相关任务（如果可用）
         export_extract_task = None
-        if assets_info.export_zip_info:
+        if assets_info.export_zip_info and not self.select:
             export_extract_task = await self._create_export_tasks(
                 graph, assets_info, downloads_dir, decrypted_dir, extracted_dir
             )
 
         # 4. 图片相关任务
-        await self._create_image_tasks(graph, assets_info, downloads_dir)
+        image_task_ids = await self._create_image_tasks(
+            graph, assets_info, downloads_dir
+        )
 
         # 5. 重命名目录任务（依赖preview解压任务获取模型名）
         rename_deps = []
@@ -109,6 +139,8 @@ class TaskFactory:
                 ),
                 deps_on=rename_deps,
             )
+            # 图片写在暂存目录中，必须在移动目录之前结束；图片失败不影响模型
+            rename_task.waits_for = image_task_ids
             graph.add_task(rename_task)
 
         # 6. 保存版本信息任务
@@ -123,10 +155,28 @@ class TaskFactory:
             script_version="v4",
             deps_on=version_deps,
         )
+        if self.select:
+            # 完整下载的任务记为缺少，之后不带选择器运行时补全
+            save_version_task.deferred = selective_deferred(self.item_id)
         graph.add_task(save_version_task)
 
         return graph
 
+    def _create_selective_task(
+        self, graph: TaskGraph, assets_info: "AssetsInfo"
+    ) -> "FetchMembersTask":
+        """创建Preview选择性下载任务，输出目录与完整解压相同"""
+        file_name = assets_info.preview_live2d_zip["fileName"]
+        fetch_task = FetchMembersTask(
+            task_id=f"fetch_members_preview_{self.item_id}",
+            url=f"{config.STORAGE_BASE}/{self.item_id}/{file_name}",
+            output_dir=self.temp_dir / "preview",
+            patterns=self.select,
+            session=self.session,
+        )
+        graph.add_task(fetch_task)
+        return fetch_task
+
     async def _create_preview_tasks(
         self,
         graph: TaskGraph,
@@ -137,13 +187,18 @@ class TaskFactory:
     ) -> "ExtractTask":
         """创建Preview相关任务"""
         file_name = assets_info.preview_live2d_zip["fileName"]
-        url = f"https://storage.googleapis.com/market_view_useritems/{self.item_id}/{file_name}"
+        url = f"{config.STORAGE_BASE}/{self.item_id}/{file_name}"
 
         # 下载任务
         download_task = DownloadTask(
             task_id=f"download_preview_{self.item_id}",
             url=url,
             target_path=downloads_dir / file_name,
+            session=self.session,
+            expected_size=_megabytes_to_bytes(
+                assets_info.preview_live2d_zip.get("fileSize")
+            ),
+            archive=True,
         )
         graph.add_task(download_task)
 
@@ -177,7 +232,7 @@ class TaskFactory:
     ) -> "ExtractTask":
         """创建Export相关任务"""
         item_content_id = assets_info.export_zip_info["itemContentId"]
-        download_url = f"https://nizima.com/api/items/{item_content_id}/download"
+        download_url = f"{config.API_BASE}/api/items/{item_content_id}/download"
 
         # 下载任务
         download_task = DownloadTask(
@@ -186,6 +241,11 @@ class TaskFactory:
             target_path=downloads_dir / "export.zip",
             file_name="export.zip",
             is_export=True,
+            session=self.session,
+            expected_size=_megabytes_to_bytes(
+                assets_info.export_zip_info.get("fileSize")
+            ),
+            archive=True,
         )
         graph.add_task(download_task)
 
@@ -211,17 +271,23 @@ class TaskFactory:
 
     async def _create_image_tasks(
         self, graph: TaskGraph, assets_info: "AssetsInfo", downloads_dir: Path
-    ):
-        """创建图片相关任务"""
+    ) -> List[str]:
+        """创建图片相关任务
+
+        Returns:
+            List[str]: 图片处理任务的ID
+        """
+        process_task_ids = []
         # 缩略图任务
         if assets_info.thumbnail_image:
             file_name = assets_info.thumbnail_image["fileName"]
-            url = f"https://storage.googleapis.com/market_view_useritems/{self.item_id}/{file_name}"
+            url = f"{config.STORAGE_BASE}/{self.item_id}/{file_name}"
 
             download_task = DownloadTask(
                 task_id=f"download_thumb_{self.item_id}",
                 url=url,
                 target_path=downloads_dir / f"thumb_{file_name}",
+                session=self.session,
             )
             graph.add_task(download_task)
 
@@ -232,17 +298,19 @@ class TaskFactory:
                 deps_on=[download_task.task_id],
             )
             graph.add_task(process_task)
+            process_task_ids.append(process_task.task_id)
 
         # 预览图任务
         if assets_info.preview_images:
             for i, img_info in enumerate(assets_info.preview_images):
                 file_name = img_info["fileName"]
-                url = f"https://storage.googleapis.com/market_view_useritems/{self.item_id}/images/{file_name}"
+                url = f"{config.STORAGE_BASE}/{self.item_id}/images/{file_name}"
 
                 download_task = DownloadTask(
                     task_id=f"download_preview_img_{i}_{self.item_id}",
                     url=url,
                     target_path=downloads_dir / f"preview_{i}_{file_name}",
+                    session=self.session,
                 )
                 graph.add_task(download_task)
 
@@ -253,3 +321,14 @@ class TaskFactory:
                     deps_on=[download_task.task_id],
                 )
                 graph.add_task(process_task)
+                process_task_ids.append(process_task.task_id)
+
+        return process_task_ids
+
+
+def _megabytes_to_bytes(file_size: Any) -> Optional[int]:
+    """把详情API的 fileSize（MB，可能为 "Unknown"）转换为字节数"""
+    try:
+        return int(float(file_size) * 1024 * 1024)
+    except (TypeError, ValueError):
+        return None
@@ -6,7 +6,7 @@
 
 import sys
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set
 
 # 添加父目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -19,8 +19,13 @@ class TaskGraph:
     由多个Task节点和它们之间的依赖关系构成的有向无环图(DAG)
     """
 
-    def __init__(self):
-        """初始化任务图"""
+    def __init__(self, item_id: Optional[str] = None):
+        """初始化任务图
+
+        Args:
+            item_id: 任务图所属的作品ID
+        """
+        self.item_id = item_id
         self.tasks: Dict[str, Task] = {}  # task_id -> Task实例
 
     def add_task(self, task: Task):
@@ -29,6 +34,7 @@ class TaskGraph:
         Args:
             task: 要添加的任务
         """
+        task.item_id = self.item_id
         self.tasks[task.task_id] = task
 
     def get_task(self, task_id: str) -> Task:
@@ -121,11 +127,14 @@ class TaskGraph:
         """
         errors = []
 
-        # 检查依赖的任务是否存在
+        # 检查依赖和等待的任务是否存在
         for task_id, task in self.tasks.items():
             for dep_id in task.deps_on:
                 if dep_id not in self.tasks:
                     errors.append(f"任务 {task_id} 依赖的任务 {dep_id} 不存在")
+            for dep_id in task.waits_for:
+                if dep_id not in self.tasks:
+                    errors.append(f"任务 {task_id} 等待的任务 {dep_id} 不存在")
 
         # 检查是否有循环依赖
         if self._has_cycle():
@@ -150,7 +159,8 @@ class TaskGraph:
 
             colors[task_id] = GRAY
 
-            for dep_id in self.tasks[task_id].deps_on:
+            task = self.tasks[task_id]
+            for dep_id in task.deps_on + task.waits_for:
                 if dep_id in self.tasks and dfs(dep_id):
                     return True
 
@@ -170,5 +180,7 @@ class TaskGraph:
         for task_id, task in self.tasks.items():
             status = "✅" if task.completed else "⏳"
             deps = f" <- {task.deps_on}" if task.deps_on else ""
+            if task.waits_for:
+                deps += f" (等待 {len(task.waits_for)} 个任务)"
             lines.append(f"  {status} {task_id}{deps}")
         return "\n".join(lines)
@@ -0,0 +1,189 @@
+"""
+失败日志实现
+
+以JSON Lines追加写入任务失败记录，每个事件一次缓冲写入，
+作品成功后追加 resolved 记录，之前的失败随之作废
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+# 添加父目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tasks.download import IntegrityError
+from utils import DetailError
+
+from .events import Event, EventBus
+
+# 各错误类别的重试冷却时间（秒）
+ERROR_COOLDOWNS = {
+    "http_404": 24 * 3600,
+    "http_429": 10 * 60,
+    "http_4xx": 3600,
+    "http_5xx": 5 * 60,
+    "login_required": 24 * 3600,
+    "invalid_item": 7 * 24 * 3600,
+    "timeout": 60,
+    "connection": 60,
+    "corrupt": 5 * 60,
+    "other": 5 * 60,
+}
+
+
+def classify_error(error: BaseException) -> str:
+    """把异常归类为错误类别
+
+    沿 __cause__ 链查找最具体的原因，任务通常用 raise ... from e 包装底层异常
+
+    Args:
+        error: 异常
+
+    Returns:
+        str: 错误类别，ERROR_COOLDOWNS 的键之一
+    """
+    while error is not None:
+        if isinstance(error, aiohttp.ClientResponseError):
+            if error.status == 404:
+                return "http_404"
+            if error.status == 429:
+                return "http_429"
+            return "http_5xx" if error.status >= 500 else "http_4xx"
+        if isinstance(error, DetailError):
+            # 只有作品不存在是长期的；非JSON响应（维护页、登录页）和离线缓存未命中可能很快恢复
+            return "invalid_item" if error.kind == "invalid" else "other"
+        if isinstance(error, IntegrityError):
+            return "corrupt"
+        if isinstance(error, asyncio.TimeoutError):
+            return "timeout"
+        if isinstance(error, aiohttp.ClientConnectionError):
+            return "connection"
+        if "登录" in str(error):
+            return "login_required"
+        error = error.__cause__
+    return "other"
+
+
+class FailureJournal:
+    """失败日志
+
+    每行一条记录：
+    - {"event": "failed", "ts", "item_id", "task_id", "url", "error_class", "error", "attempts"}
+    - {"event": "resolved", "ts", "item_id"}
+    """
+
+    def __init__(self, path: Path):
+        """初始化失败日志
+
+        Args:
+            path: 日志文件路径
+        """
+        self.path = Path(path)
+        self._file = None
+
+    def attach(self, bus: EventBus) -> Callable[[], None]:
+        """订阅事件总线，自动记录任务失败和作品成功
+
+        Args:
+            bus: 事件总线
+
+        Returns:
+            Callable[[], None]: 取消订阅函数
+        """
+        return bus.subscribe(self._on_event)
+
+    def _on_event(self, event: Event):
+        if event["type"] == "task_failed":
+            self.append(
+                {
+                    "event": "failed",
+                    "item_id": event.get("item_id"),
+                    "task_id": event.get("task_id"),
+                    "url": event.get("url"),
+                    "error_class": event.get("error_class", "other"),
+                    "error": event.get("error"),
+                    "attempts": event.get("attempts", 1),
+                }
+            )
+        elif event["type"] == "item_done" and event.get("success"):
+            self.append({"event": "resolved", "item_id": event.get("item_id")})
+
+    def append(self, record: Dict[str, Any]):
+        """追加一条记录（一次行缓冲写入）
+
+        Args:
+            record: 记录内容
+        """
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+        record = {"ts": round(time.time(), 3), **record}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        """关闭日志文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def pending_failures(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """读取尚未解决的失败
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, Any]]]: item_id -> task_id -> 最近一次失败记录
+        """
+        pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        if not self.path.exists():
+            return pending
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                item_id = record.get("item_id")
+                if record.get("event") == "resolved":
+                    pending.pop(item_id, None)
+                elif record.get("event") == "failed":
+                    pending.setdefault(item_id, {})[record.get("task_id")] = record
+        return pending
+
+    def retry_candidates(
+        self, now: Optional[float] = None
+    ) -> Tuple[Dict[str, List[str]], Dict[str, float]]:
+        """找出冷却期已过、可以重试的作品
+
+        作品的所有失败任务都过了各自错误类别的冷却期才会重试
+
+        Args:
+            now: 当前时间戳，默认为 time.time()
+
+        Returns:
+            Tuple[Dict[str, List[str]], Dict[str, float]]:
+                (可重试的 item_id -> 失败任务列表, 冷却中的 item_id -> 剩余秒数)
+        """
+        now = now or time.time()
+        ready: Dict[str, List[str]] = {}
+        waiting: Dict[str, float] = {}
+
+        for item_id, failures in self.pending_failures().items():
+            remaining = max(
+                record["ts"]
+                + ERROR_COOLDOWNS.get(
+                    record.get("error_class"), ERROR_COOLDOWNS["other"]
+                )
+                - now
+                for record in failures.values()
+            )
+            if remaining > 0:
+                waiting[item_id] = remaining
+            else:
+                ready[item_id] = list(failures)
+        return ready, waiting
@@ -0,0 +1,87 @@
+"""
+本地作品库索引
+
+一次扫描输出目录，建立 item_id -> 作品目录 的映射，
+避免每个作品都重新遍历整个输出目录
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class LibraryIndex:
+    """本地作品库索引
+
+    目录命名规则：{item_id}/ 或 {item_id}_{model_name}/，
+    同一作品同时存在两种目录时优先使用原始格式 {item_id}/
+    """
+
+    def __init__(self, output_dir: Path):
+        """初始化索引
+
+        Args:
+            output_dir: 作品输出目录
+        """
+        self.output_dir = Path(output_dir)
+        self._dirs: Optional[Dict[str, Path]] = None
+
+    def refresh(self):
+        """重新扫描输出目录"""
+        dirs: Dict[str, Path] = {}
+        if self.output_dir.is_dir():
+            for dir_path in self.output_dir.iterdir():
+                if not dir_path.is_dir() or dir_path.name.startswith("."):
+                    continue
+                item_id = dir_path.name.split("_", 1)[0]
+                # 原始格式目录优先
+                if item_id not in dirs or dir_path.name == item_id:
+                    dirs[item_id] = dir_path
+        self._dirs = dirs
+
+    def find(self, item_id: str) -> Optional[Path]:
+        """查找作品目录
+
+        Args:
+            item_id: 作品ID
+
+        Returns:
+            Optional[Path]: 作品目录，不存在时返回None
+        """
+        if self._dirs is None:
+            self.refresh()
+        return self._dirs.get(str(item_id))
+
+    def read_version(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """读取作品的version.json
+
+        Args:
+            item_id: 作品ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 版本信息，不存在或损坏时返回None
+        """
+        item_dir = self.find(item_id)
+        if item_dir is None:
+            return None
+        try:
+            with open(item_dir / "version.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def record(self, item_id: str, item_dir: Path):
+        """记录新完成的作品目录
+
+        Args:
+            item_id: 作品ID
+            item_dir: 作品最终目录
+        """
+        if self._dirs is None:
+            self.refresh()
+        self._dirs[str(item_id)] = Path(item_dir)
+
+    def __len__(self) -> int:
+        if self._dirs is None:
+            self.refresh()
+        return len(self._dirs)
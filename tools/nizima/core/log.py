@@ -0,0 +1,146 @@
+"""
+日志实现
+
+基于标准库 logging 的分级日志，所有模块使用 "nizima.*" 命名的日志器：
+- 控制台：默认 INFO；verbose 时显示 DEBUG（每个任务的执行细节）；
+  quiet 时只显示警告和整批下载的实时进度（core.progress）
+- JSON Lines：每条日志一行，包含 item_id / task_id，始终记录到 DEBUG
+
+控制台和文件都由后台线程写入（QueueHandler + QueueListener），
+事件循环上只做一次入队；未启用的级别在 logger.debug() 调用处直接返回。
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from pathlib import Path
+from typing import Callable, Optional
+
+from .events import EventBus
+from .progress import ProgressView
+
+LOGGER_NAME = "nizima"
+
+# JSON Lines 文件的写缓冲大小
+JSON_BUFFER_SIZE = 64 * 1024
+
+# 当前协程所处理的作品和任务，asyncio 创建任务时自动复制上下文
+current_item: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "nizima_item_id", default=None
+)
+current_task: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "nizima_task_id", default=None
+)
+
+
+class _ContextFilter(logging.Filter):
+    """在入队前把当前作品和任务ID附加到日志记录上"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.item_id = current_item.get()
+        record.task_id = current_task.get()
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条日志格式化为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("item_id", "task_id"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(
+    verbose: bool = False,
+    quiet: bool = False,
+    json_path: Optional[Path] = None,
+    bus: Optional[EventBus] = None,
+) -> Callable[[], None]:
+    """配置 "nizima" 日志器
+
+    Args:
+        verbose: 控制台显示DEBUG日志
+        quiet: 控制台只显示警告和实时进度（需要提供 bus）
+        json_path: JSON Lines 日志文件路径
+        bus: 事件总线，quiet 模式的进度行由其驱动
+
+    Returns:
+        Callable[[], None]: 关闭函数，停止后台写入线程并刷新所有输出
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    console_level = (
+        logging.WARNING if quiet else logging.DEBUG if verbose else logging.INFO
+    )
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(console_level)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    handlers = [console]
+
+    json_file = None
+    if json_path is not None:
+        json_path = Path(json_path)
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        json_file = open(json_path, "a", encoding="utf-8", buffering=JSON_BUFFER_SIZE)
+        json_handler = logging.StreamHandler(json_file)
+        json_handler.setLevel(logging.DEBUG)
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+
+    # 只有需要的最低级别才会被创建为日志记录
+    logger.setLevel(min(h.level for h in handlers))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+
+    progress = None
+    detach_progress = None
+    if quiet and bus is not None:
+        progress = ProgressView()
+        detach_progress = progress.attach(bus)
+
+    def shutdown():
+        listener.stop()
+        logger.removeHandler(queue_handler)
+        if json_file is not None:
+            json_file.close()
+        if progress is not None:
+            detach_progress()
+            progress.close()
+
+    return shutdown
+
+
+def add_logging_arguments(parser: "argparse.ArgumentParser"):
+    """添加日志相关的命令行参数"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--verbose", "-v", action="store_true", help="显示每个任务的详细日志"
+    )
+    group.add_argument(
+        "--quiet", "-q", action="store_true", help="只显示实时进度和警告"
+    )
+    parser.add_argument(
+        "--log-json", help="把全部日志（含DEBUG）以JSON Lines写入该文件"
+    )
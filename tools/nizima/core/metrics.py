@@ -0,0 +1,362 @@
+"""
+运行指标实现
+
+进程内的计数器、仪表和直方图，以 OpenMetrics 文本格式导出：
+- 批量下载结束时写入文本文件，供 node_exporter textfile collector 采集
+- 长时间运行时通过本地 /metrics 端点实时抓取
+
+埋点直接调用 metrics.xxx.inc()/observe()，只做字典更新，不依赖事件总线。
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from aiohttp import web
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# 默认直方图分桶（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 传输耗时的分桶（秒），大文件可能持续几十分钟
+TRANSFER_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+LabelValues = Tuple[str, ...]
+
+log = logging.getLogger("nizima.metrics")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """指标基类"""
+
+    type_name = "unknown"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        """渲染为 OpenMetrics 文本行"""
+        lines = [
+            f"# TYPE {self.name} {self.type_name}",
+            f"# HELP {self.name} {self.help}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        """增加计数
+
+        Args:
+            amount: 增量
+            **labels: 标签取值
+        """
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        """读取当前计数"""
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        """设置当前值"""
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        """增加当前值"""
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        """减少当前值"""
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        """读取当前值"""
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> 各分桶计数（非累计，最后一个为 +Inf）
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        """记录一个观测值
+
+        Args:
+            value: 观测值
+            **labels: 标签取值
+        """
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def count(self, **labels: str) -> int:
+        """读取观测次数"""
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key in sorted(self._counts):
+            counts = self._counts[key]
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                labels = _format_labels(
+                    self.labelnames + ("le",), key + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        """初始化注册表并创建下载器使用的指标"""
+        self._metrics: List[_Metric] = []
+
+        self.download_bytes = self.register(
+            Counter("nizima_download_bytes", "按主机统计的下载字节数", ("host",))
+        )
+        self.request_duration = self.register(
+            Histogram(
+                "nizima_request_duration_seconds",
+                "下载请求的首字节耗时（秒）：取得连接到收到响应头",
+                ("host",),
+            )
+        )
+        self.transfer_duration = self.register(
+            Histogram(
+                "nizima_transfer_duration_seconds",
+                "下载响应体的耗时（秒）：收到响应头到写完文件",
+                ("host",),
+                buckets=TRANSFER_BUCKETS,
+            )
+        )
+        self.retries = self.register(
+            Counter(
+                "nizima_download_retries", "按错误类别统计的下载重试次数", ("cause",)
+            )
+        )
+        self.stalls = self.register(
+            Counter(
+                "nizima_download_stalls",
+                "按原因统计的停滞中止的下载（connect / first_byte / idle / throughput）",
+                ("reason",),
+            )
+        )
+        self.resumes = self.register(
+            Counter("nizima_download_resumes", "从 .part 文件偏移处续传的下载次数")
+        )
+        self.integrity_failures = self.register(
+            Counter(
+                "nizima_download_integrity_failures",
+                "按检查项统计的完整性检查未通过的下载（length / size / md5 / archive）",
+                ("check",),
+            )
+        )
+        self.task_duration = self.register(
+            Histogram(
+                "nizima_task_duration_seconds",
+                "按任务类型统计的任务执行耗时（秒）",
+                ("task_class",),
+            )
+        )
+        self.queue_depth = self.register(
+            Gauge("nizima_scheduler_queue_depth", "等待调度器并发名额的任务数")
+        )
+        self.queue_depth.set(0)
+        self.items = self.register(
+            Counter("nizima_items", "按结果统计的作品数", ("result",))
+        )
+        self.artifact_memory = self.register(
+            Gauge("nizima_artifact_memory_bytes", "内存中传递的任务产出字节数")
+        )
+        self.artifact_memory.set(0)
+        self.artifact_spills = self.register(
+            Counter("nizima_artifact_spills", "超出内存预算溢写到磁盘的任务产出数")
+        )
+        self.memory_limit = self.register(
+            Gauge("nizima_memory_limit_bytes", "任务内存预算上限，0表示不限制")
+        )
+        self.memory_reserved = self.register(
+            Gauge("nizima_memory_reserved_bytes", "执行中的任务占用的内存预算")
+        )
+        self.memory_reserved.set(0)
+        self.admission_waits = self.register(
+            Counter("nizima_admission_waits", "因内存预算不足而排队的任务数")
+        )
+        self.admission_wait = self.register(
+            Histogram(
+                "nizima_admission_wait_seconds",
+                "任务等待内存预算的时间",
+                buckets=LATENCY_BUCKETS,
+            )
+        )
+        self.loop_lag = self.register(
+            Histogram(
+                "nizima_event_loop_lag_seconds",
+                "事件循环调度延迟（秒）",
+                buckets=LAG_BUCKETS,
+            )
+        )
+
+    def register(self, metric: _Metric) -> _Metric:
+        """注册指标
+
+        Args:
+            metric: 指标实例
+
+        Returns:
+            _Metric: 同一个指标实例
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """渲染全部指标为 OpenMetrics 文本"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path):
+        """原子写入 OpenMetrics 文本文件
+
+        Args:
+            path: 输出文件路径
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+# 进程级指标注册表
+metrics = MetricsRegistry()
+
+
+async def monitor_loop_lag(interval: float = 0.5):
+    """持续测量事件循环延迟，直到被取消
+
+    Args:
+        interval: 采样间隔（秒）
+    """
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        metrics.loop_lag.observe(max(0.0, time.perf_counter() - expected))
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """/metrics 请求处理器"""
+    return web.Response(
+        body=metrics.render().encode("utf-8"),
+        headers={"Content-Type": OPENMETRICS_CONTENT_TYPE},
+    )
+
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1") -> web.AppRunner:
+    """启动只提供 /metrics 的本地HTTP服务
+
+    Args:
+        port: 监听端口
+        host: 监听地址
+
+    Returns:
+        web.AppRunner: 服务运行器，停止时调用 cleanup()
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("📈 指标端点: http://%s:%d/metrics", host, port)
+    return runner
@@ -0,0 +1,444 @@
+"""
+运行计划实现
+
+开始耗时数小时的批量下载之前先估算代价（--plan）：
+- 解析每个作品的详情数据（优先使用详情缓存），构建任务图但不执行
+- 按作品库索引去掉已满足的任务：已是最新版本的作品整体跳过，
+  部分完成的作品和中断留下的暂存目录只保留缺少的任务
+- 汇总需要下载和写入的字节数、各类任务的数量，
+  按之前运行记录的各类任务速率（.cache/rates.json）估算耗时
+
+计划可以保存为JSON文件，之后用 --run-plan 执行，不再重新解析详情数据。
+"""
+
+import json
+import logging
+import math
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Union
+
+# 添加父目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ingest import as_async, run_workers
+from models import AssetsInfo
+from utils import SCRIPT_VERSION
+
+from .factory import TaskFactory
+from .library import LibraryIndex
+from .priority import expected_sizes, ItemSizeEstimator, RateHints, SizeHints
+from .session import CONNECTION_LIMIT_PER_HOST
+
+log = logging.getLogger("nizima.planner")
+
+# 计划文件格式版本
+PLAN_FORMAT = 1
+
+# 没有历史记录时各类资源的默认速率（字节/秒）
+DEFAULT_RATES = {
+    "network": 2 * 1024 * 1024,
+    "cpu": 8 * 1024 * 1024,
+    "disk": 200 * 1024 * 1024,
+}
+
+# 任务写入的字节数：处理的字节数 × 系数（重命名只移动目录，保存任务只写小文件）
+WRITE_FACTORS = {
+    "DownloadTask": 1.0,
+    "DecryptTask": 1.0,
+    "ExtractTask": 1.0,
+    "ProcessImagesTask": 1.0,
+}
+
+# 作品状态
+UP_TO_DATE = "up_to_date"  # 已是最新版本，整体跳过
+NEW = "new"  # 本地没有任何文件
+RESUME = "resume"  # 有中断留下的暂存目录
+PARTIAL = "partial"  # 上次部分完成
+NO_PREVIEW = "no_preview"  # 没有预览模型，下载时会跳过
+FAILED = "failed"  # 无法获取详情
+
+# 需要执行的作品状态
+RUNNABLE = (NEW, RESUME, PARTIAL)
+
+
+class ItemPlan:
+    """单个作品的计划"""
+
+    def __init__(
+        self,
+        item_id: str,
+        status: str,
+        detail: Optional[Dict[str, Any]] = None,
+        tasks: Optional[List[Dict[str, Any]]] = None,
+        satisfied: int = 0,
+        error: Optional[str] = None,
+    ):
+        """初始化作品计划
+
+        Args:
+            item_id: 作品ID
+            status: 作品状态（UP_TO_DATE / NEW / RESUME / PARTIAL / NO_PREVIEW / FAILED）
+            detail: 详情数据，执行计划时直接使用
+            tasks: 需要执行的任务，每项包含 task_id / task_class / resource / bytes
+            satisfied: 已满足（不再执行）的任务数
+            error: 获取详情失败的原因
+        """
+        self.item_id = item_id
+        self.status = status
+        self.detail = detail
+        self.tasks = tasks or []
+        self.satisfied = satisfied
+        self.error = error
+
+    @property
+    def download_bytes(self) -> int:
+        """需要下载的字节数（大小未知的文件按0计）"""
+        return sum(t["bytes"] for t in self.tasks if t["resource"] == "network")
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"item_id": self.item_id, "status": self.status}
+        if self.status in RUNNABLE:
+            data.update(detail=self.detail, tasks=self.tasks, satisfied=self.satisfied)
+        if self.error:
+            data["error"] = self.error
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ItemPlan":
+        return cls(
+            data["item_id"],
+            data["status"],
+            data.get("detail"),
+            data.get("tasks"),
+            data.get("satisfied", 0),
+            data.get("error"),
+        )
+
+
+class Plan:
+    """运行计划：按执行顺序排列的作品计划"""
+
+    def __init__(
+        self,
+        output_dir: Path,
+        items: Optional[List[ItemPlan]] = None,
+        order: str = "fifo",
+        created_at: Optional[str] = None,
+        script_version: str = SCRIPT_VERSION,
+    ):
+        """初始化计划
+
+        Args:
+            output_dir: 输出目录
+            items: 作品计划
+            order: 规划时使用的作品顺序
+            created_at: 创建时间（ISO格式）
+            script_version: 创建计划的脚本版本
+        """
+        self.output_dir = Path(output_dir)
+        self.items = items or []
+        self.order = order
+        self.created_at = created_at or datetime.now().isoformat()
+        self.script_version = script_version
+
+    def item_ids(self) -> List[str]:
+        """需要执行的作品ID（按计划顺序）"""
+        return [item.item_id for item in self.items if item.status in RUNNABLE]
+
+    def details(self) -> Dict[str, Dict[str, Any]]:
+        """需要执行的作品的详情数据"""
+        return {
+            item.item_id: item.detail
+            for item in self.items
+            if item.status in RUNNABLE and item.detail is not None
+        }
+
+    def summary(
+        self,
+        rate_hints: Optional[RateHints] = None,
+        concurrent: int = 3,
+        task_concurrency: int = 5,
+    ) -> Dict[str, Any]:
+        """汇总计划的代价
+
+        网络任务在连接池允许的范围内并行，解密、解压等CPU任务和磁盘任务
+        在事件循环上依次执行，预计耗时取两者中较大的一个
+
+        Args:
+            rate_hints: 之前运行记录的各类任务速率，没有记录的按 DEFAULT_RATES 估算
+            concurrent: 同时下载的作品数
+            task_concurrency: 每个作品同时执行的任务数
+
+        Returns:
+            Dict[str, Any]: 各状态的作品数、各类任务数、下载和写入字节数、预计耗时
+        """
+        statuses = Counter(item.status for item in self.items)
+        task_counts: Counter = Counter()
+        download_bytes = write_bytes = unknown = satisfied = 0
+        network_seconds = local_seconds = 0.0
+        measured = set()
+
+        for item in self.items:
+            satisfied += item.satisfied
+            for task in item.tasks:
+                task_class, size = task["task_class"], task["bytes"]
+                task_counts[task_class] += 1
+                write_bytes += int(size * WRITE_FACTORS.get(task_class, 0.0))
+                rate = rate_hints.rate(task_class) if rate_hints else None
+                if rate:
+                    measured.add(task_class)
+                else:
+                    rate = DEFAULT_RATES.get(task["resource"], DEFAULT_RATES["disk"])
+                if task["resource"] == "network":
+                    download_bytes += size
+                    unknown += not size
+                    network_seconds += size / rate
+                else:
+                    local_seconds += size / rate
+
+        parallel = max(1, min(concurrent * task_concurrency, CONNECTION_LIMIT_PER_HOST))
+        return {
+            "items": len(self.items),
+            "statuses": dict(statuses),
+            "tasks": dict(task_counts.most_common()),
+            "satisfied_tasks": satisfied,
+            "download_bytes": download_bytes,
+            "unknown_sizes": unknown,
+            "write_bytes": write_bytes,
+            "network_seconds": round(network_seconds / parallel, 1),
+            "local_seconds": round(local_seconds, 1),
+            "estimated_seconds": round(
+                max(network_seconds / parallel, local_seconds), 1
+            ),
+            "measured_rates": sorted(measured),
+        }
+
+    def save(self, path: Path, summary: Optional[Dict[str, Any]] = None):
+        """保存计划
+
+        Args:
+            path: 计划文件路径
+            summary: 同时写入的汇总（只供查看，执行时不使用）
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "format": PLAN_FORMAT,
+            "created_at": self.created_at,
+            "script_version": self.script_version,
+            "output_dir": str(self.output_dir),
+            "order": self.order,
+            "summary": summary,
+            "items": [item.to_dict() for item in self.items],
+        }
+        temp = path.with_suffix(path.suffix + ".tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        temp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "Plan":
+        """读取计划
+
+        Args:
+            path: 计划文件路径
+
+        Returns:
+            Plan: 计划
+
+        Raises:
+            ValueError: 文件格式不支持
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != PLAN_FORMAT:
+            raise ValueError(f"不支持的计划文件格式: {data.get('format')}")
+        if data.get("script_version") != SCRIPT_VERSION:
+            log.warning(
+                "⚠️ 计划由脚本版本 %s 创建，当前版本 %s",
+                data.get("script_version"),
+                SCRIPT_VERSION,
+            )
+        return cls(
+            data["output_dir"],
+            [ItemPlan.from_dict(item) for item in data["items"]],
+            data.get("order", "fifo"),
+            data.get("created_at"),
+            data.get("script_version", SCRIPT_VERSION),
+        )
+
+
+class Planner:
+    """生成运行计划
+
+    用法:
+        planner = Planner(output_dir, detail_cache, size_hints)
+        plan = await planner.plan(item_ids, session)
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        detail_cache: "DetailCache",
+        size_hints: Optional[SizeHints] = None,
+        library: Optional[LibraryIndex] = None,
+    ):
+        """初始化
+
+        Args:
+            output_dir: 输出目录
+            detail_cache: 详情缓存（规划时获取的详情也写入缓存）
+            size_hints: 之前运行的大小记录，用于估算没有 fileSize 的文件
+            library: 作品库索引，为空时扫描输出目录
+        """
+        self.output_dir = Path(output_dir)
+        self.detail_cache = detail_cache
+        self.size_hints = size_hints
+        self.library = library or LibraryIndex(self.output_dir)
+        self._estimator = ItemSizeEstimator(size_hints, self.library)
+
+    async def plan_item(
+        self, item_id: str, session: "aiohttp.ClientSession"
+    ) -> ItemPlan:
+        """规划单个作品
+
+        Args:
+            item_id: 作品ID
+            session: HTTP会话（详情不在缓存中时请求API）
+
+        Returns:
+            ItemPlan: 作品计划
+        """
+        if self._estimator.up_to_date(item_id):
+            return ItemPlan(item_id, UP_TO_DATE)
+
+        try:
+            detail = await self.detail_cache.get(item_id, session)
+        except Exception as e:
+            log.warning("❌ 作品 %s 获取详情失败: %s", item_id, e)
+            return ItemPlan(item_id, FAILED, error=str(e))
+        assets_info = AssetsInfo.from_api_response(detail)
+        if not assets_info.preview_live2d_zip:
+            return ItemPlan(item_id, NO_PREVIEW)
+
+        # 执行时部分完成的作品会被移回暂存目录，这里直接在作品目录上检查已有的文件
+        version = self.library.read_version(item_id)
+        staging_dir = self.output_dir / ".staging" / item_id
+        if version and version.get("status") == "partial":
+            status, temp_dir = PARTIAL, self.library.find(item_id)
+        elif staging_dir.exists():
+            status, temp_dir = RESUME, staging_dir
+        else:
+            status, temp_dir = NEW, staging_dir
+
+        factory = TaskFactory(item_id, self.output_dir, temp_dir)
+        graph = await factory.create_task_graph(assets_info, detail, prepare_dirs=False)
+        sizes = expected_sizes(graph, self.size_hints)
+        tasks = []
+        satisfied = 0
+        for task_id, task in graph.tasks.items():
+            if task.is_completed():
+                satisfied += 1
+                continue
+            tasks.append(
+                {
+                    "task_id": task_id,
+                    "task_class": type(task).__name__,
+                    "resource": task.resource_class,
+                    "bytes": sizes.get(task_id, 0),
+                }
+            )
+        return ItemPlan(item_id, status, detail, tasks, satisfied)
+
+    async def plan(
+        self,
+        item_ids: Union[Iterable[str], AsyncIterable[str]],
+        session: "aiohttp.ClientSession",
+        order: str = "fifo",
+        concurrency: int = 8,
+    ) -> Plan:
+        """规划一批作品
+
+        Args:
+            item_ids: 作品ID列表或迭代器（重复的ID只规划一次）
+            session: HTTP会话
+            order: 作品顺序，sjf / ljf 按需要下载的字节数排列
+            concurrency: 同时获取详情的作品数
+
+        Returns:
+            Plan: 按执行顺序排列的计划
+        """
+        positions: Dict[str, int] = {}
+        items: List[ItemPlan] = []
+
+        async def numbered():
+            async for item_id in as_async(item_ids):
+                positions.setdefault(item_id, len(positions))
+                yield item_id
+
+        async def handle(item_id: str) -> bool:
+            items.append(await self.plan_item(item_id, session))
+            return True
+
+        await run_workers(numbered(), handle, concurrency)
+
+        items.sort(key=lambda item: positions[item.item_id])
+        if order != "fifo":
+            items.sort(key=lambda item: item.download_bytes, reverse=order == "ljf")
+        return Plan(self.output_dir, items, order)
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = math.ceil(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def log_summary(summary: Dict[str, Any]):
+    """输出计划汇总"""
+    statuses = summary["statuses"]
+    log.info(
+        "📋 运行计划: %d 个作品，需要执行 %d 个"
+        "（新作品 %d，继续中断的 %d，补全部分完成的 %d），"
+        "已是最新 %d，无预览模型 %d，详情获取失败 %d",
+        summary["items"],
+        sum(statuses.get(s, 0) for s in RUNNABLE),
+        statuses.get(NEW, 0),
+        statuses.get(RESUME, 0),
+        statuses.get(PARTIAL, 0),
+        statuses.get(UP_TO_DATE, 0),
+        statuses.get(NO_PREVIEW, 0),
+        statuses.get(FAILED, 0),
+    )
+    log.info(
+        "📦 下载 %s%s，写入约 %s",
+        _format_bytes(summary["download_bytes"]),
+        (
+            f"（另有 {summary['unknown_sizes']} 个文件大小未知）"
+            if summary["unknown_sizes"]
+            else ""
+        ),
+        _format_bytes(summary["write_bytes"]),
+    )
+    tasks = ", ".join(f"{name} {count}" for name, count in summary["tasks"].items())
+    log.info("🧮 任务: %s（已满足 %d 个）", tasks or "无", summary["satisfied_tasks"])
+    log.info(
+        "⏱️ 预计耗时 %s（网络 %s，本地处理 %s；%s）",
+        _format_seconds(summary["estimated_seconds"]),
+        _format_seconds(summary["network_seconds"]),
+        _format_seconds(summary["local_seconds"]),
+        (
+            "按历史速率: " + ", ".join(summary["measured_rates"])
+            if summary["measured_rates"]
+            else "没有历史记录，按默认速率"
+        ),
+    )
@@ -0,0 +1,287 @@
+"""
+任务优先级实现
+
+就绪任务按优先级出队：先比较下游关键路径的长度（后面挂着的任务链越长越先开始），
+再比较预期字节数（越大越先开始），这样预览模型归档不会排在一堆小图片后面。
+
+预期字节数取任务的 expected_size（如详情API给出的 fileSize），
+否则取之前运行中同类任务的实际大小；非下载任务继承其输入（依赖任务）的预期字节数。
+"""
+
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .graph import TaskGraph
+
+log = logging.getLogger("nizima.priority")
+
+# 同类任务大小的指数移动平均权重
+SMOOTHING = 0.3
+
+Priority = Tuple[int, int]
+
+
+def task_kind(task_id: str, item_id: Optional[str] = None) -> str:
+    """任务类型：去掉作品ID和序号
+
+    如 download_preview_img_3_12345 -> download_preview_img
+
+    Args:
+        task_id: 任务ID
+        item_id: 作品ID
+
+    Returns:
+        str: 任务类型
+    """
+    if item_id and task_id.endswith(f"_{item_id}"):
+        task_id = task_id[: -len(item_id) - 1]
+    return re.sub(r"_\d+", "", task_id)
+
+
+class SizeHints:
+    """之前运行中各类任务的实际字节数
+
+    以任务类型为键保存指数移动平均，写入输出目录的 .cache/sizes.json
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        """初始化
+
+        Args:
+            path: 保存文件路径，为空时只在内存中记录
+        """
+        self.path = Path(path) if path else None
+        self.sizes: Dict[str, float] = {}
+        self._dirty = False
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.sizes = {k: float(v) for k, v in json.load(f).items()}
+            except (OSError, ValueError, AttributeError) as e:
+                log.warning("⚠️ 读取任务大小记录失败 (%s): %s", self.path, e)
+
+    def expected(self, task_id: str, item_id: Optional[str] = None) -> int:
+        """同类任务之前的平均字节数，没有记录时返回0"""
+        return int(self.sizes.get(task_kind(task_id, item_id), 0))
+
+    def observe(self, task_id: str, item_id: Optional[str], size: int):
+        """记录一次实际字节数"""
+        kind = task_kind(task_id, item_id)
+        old = self.sizes.get(kind)
+        self.sizes[kind] = size if old is None else old + (size - old) * SMOOTHING
+        self._dirty = True
+
+    def save(self):
+        """有新记录时写入文件"""
+        if not self.path or not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp = self.path.with_suffix(".tmp")
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump({k: round(v) for k, v in self.sizes.items()}, f, indent=2)
+            temp.replace(self.path)
+            self._dirty = False
+        except OSError as e:
+            log.warning("⚠️ 保存任务大小记录失败 (%s): %s", self.path, e)
+
+
+class RateHints(SizeHints):
+    """之前运行中各类任务的处理速率（字节/秒）
+
+    以任务类名为键保存指数移动平均，写入输出目录的 .cache/rates.json，
+    供 core.planner 估算运行时间
+    """
+
+    def rate(self, task_class: str) -> Optional[float]:
+        """同类任务之前的平均速率，没有记录时返回None"""
+        return self.sizes.get(task_class)
+
+    def observe_rate(self, task_class: str, size: int, seconds: float):
+        """记录一次任务的字节数和耗时"""
+        if not size or seconds <= 0:
+            return
+        rate = size / seconds
+        old = self.sizes.get(task_class)
+        self.sizes[task_class] = rate if old is None else old + (rate - old) * SMOOTHING
+        self._dirty = True
+
+
+# 进程内按文件共享的大小记录和速率记录
+_hints: Dict[Path, SizeHints] = {}
+_rates: Dict[Path, RateHints] = {}
+
+
+def size_hints_for(path: Path) -> SizeHints:
+    """获取指定文件的大小记录，不存在时加载
+
+    Args:
+        path: 保存文件路径
+
+    Returns:
+        SizeHints: 大小记录
+    """
+    path = Path(path)
+    if path not in _hints:
+        _hints[path] = SizeHints(path)
+    return _hints[path]
+
+
+def rate_hints_for(path: Path) -> RateHints:
+    """获取指定文件的速率记录，不存在时加载
+
+    Args:
+        path: 保存文件路径
+
+    Returns:
+        RateHints: 速率记录
+    """
+    path = Path(path)
+    if path not in _rates:
+        _rates[path] = RateHints(path)
+    return _rates[path]
+
+
+class ItemSizeEstimator:
+    """估算作品需要下载的字节数，用于作品级排序
+
+    本地已是最新版本的作品会直接跳过，估算为0；
+    否则按缓存的详情数据列出要下载的文件，每个文件取同类任务之前的平均大小
+    """
+
+    def __init__(
+        self,
+        hints: SizeHints,
+        library: Optional["LibraryIndex"] = None,
+        detail_cache: Optional["DetailCache"] = None,
+    ):
+        """初始化
+
+        Args:
+            hints: 之前运行的大小记录
+            library: 本地作品库索引
+            detail_cache: 详情缓存（只读取，不发请求）
+        """
+        self.hints = hints
+        self.library = library
+        self.detail_cache = detail_cache
+
+    def up_to_date(self, item_id: str) -> bool:
+        """本地是否已有当前版本的作品"""
+        from utils import SCRIPT_VERSION
+
+        if self.library is None:
+            return False
+        version = self.library.read_version(item_id)
+        return (
+            bool(version)
+            and version.get("version") == SCRIPT_VERSION
+            and version.get("status") != "partial"
+        )
+
+    def estimate(self, item_id: str) -> Optional[int]:
+        """估算作品的下载字节数
+
+        Args:
+            item_id: 作品ID
+
+        Returns:
+            Optional[int]: 字节数，没有缓存的详情时返回None
+        """
+        from models import AssetsInfo
+
+        from .factory import _megabytes_to_bytes
+
+        if self.up_to_date(item_id):
+            return 0
+        detail = self.detail_cache.peek(item_id) if self.detail_cache else None
+        if detail is None:
+            return None
+
+        assets = AssetsInfo.from_api_response(detail)
+        total = 0
+        if assets.preview_live2d_zip:
+            total += self.hints.expected("download_preview")
+        if assets.thumbnail_image:
+            total += self.hints.expected("download_thumb")
+        total += len(assets.preview_images) * self.hints.expected(
+            "download_preview_img"
+        )
+        if assets.export_zip_info:
+            total += _megabytes_to_bytes(
+                assets.export_zip_info.get("fileSize")
+            ) or self.hints.expected("download_export")
+        return total
+
+
+def _topological_order(graph: TaskGraph) -> List[str]:
+    """按依赖顺序排列任务ID（图已通过循环检查）"""
+    dependents: Dict[str, List[str]] = {tid: [] for tid in graph.tasks}
+    waiting: Dict[str, int] = {}
+    for tid, task in graph.tasks.items():
+        deps = [d for d in task.deps_on if d in graph.tasks]
+        waiting[tid] = len(deps)
+        for dep in deps:
+            dependents[dep].append(tid)
+
+    order = [tid for tid, count in waiting.items() if count == 0]
+    for tid in order:  # 遍历过程中追加
+        for dependent in dependents[tid]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                order.append(dependent)
+    return order
+
+
+def expected_sizes(
+    graph: TaskGraph,
+    hints: Optional[SizeHints] = None,
+    order: Optional[List[str]] = None,
+) -> Dict[str, int]:
+    """估算每个任务处理的字节数
+
+    Args:
+        graph: 任务图
+        hints: 之前运行的大小记录
+        order: 按依赖顺序排列的任务ID，为空时重新计算
+
+    Returns:
+        Dict[str, int]: 任务ID -> 预期字节数，未知时为0
+    """
+    size: Dict[str, int] = {}
+    for tid in order if order is not None else _topological_order(graph):
+        task = graph.tasks[tid]
+        expected = getattr(task, "expected_size", None)
+        if not expected and hints is not None:
+            expected = hints.expected(tid, graph.item_id)
+        if not expected:
+            expected = max((size[d] for d in task.deps_on if d in size), default=0)
+        size[tid] = expected
+    return size
+
+
+def task_priorities(
+    graph: TaskGraph, hints: Optional[SizeHints] = None
+) -> Dict[str, Priority]:
+    """计算任务优先级，值越小越先执行
+
+    Args:
+        graph: 任务图
+        hints: 之前运行的大小记录
+
+    Returns:
+        Dict[str, Priority]: 任务ID -> (-下游关键路径任务数, -预期字节数)
+    """
+    order = _topological_order(graph)
+    size = expected_sizes(graph, hints, order)
+
+    depth: Dict[str, int] = {tid: 1 for tid in order}
+    for tid in reversed(order):
+        for dep in graph.tasks[tid].deps_on:
+            if dep in depth:
+                depth[dep] = max(depth[dep], depth[tid] + 1)
+
+    return {tid: (-depth[tid], -size[tid]) for tid in order}
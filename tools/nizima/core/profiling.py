@@ -0,0 +1,351 @@
+"""
+性能剖析实现
+
+检测阻塞事件循环的回调并归属到任务：
+- 每个事件循环回调（asyncio.Handle._run）都被计时，超过阈值时记录为一次阻塞，
+  通过回调所在的上下文取得 item_id / task_id（core.log 的上下文变量）
+- 可选 tracemalloc：每个回调的内存峰值增量和净分配按任务累计，
+  每个阶段（任务类型）的第一个任务执行前后各取一次快照，记录分配最多的代码行
+- 可选 cProfile：整个运行期间的函数级剖析
+
+最后生成一份报告，按阻塞时间和内存分配对任务排名。
+"""
+
+import asyncio
+import cProfile
+import json
+import logging
+import pstats
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .events import Event, EventBus
+from .log import current_item, current_task
+
+log = logging.getLogger("nizima.profiling")
+
+# 报告中保留的条目数
+TOP_N = 20
+
+# 快照对比时排除 tracemalloc 自身的分配
+_SNAPSHOT_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+
+class _TaskStats:
+    """单个任务在事件循环上的耗时和内存分配"""
+
+    __slots__ = ("busy", "callbacks", "blocks", "max_block", "alloc_peak", "alloc_net")
+
+    def __init__(self):
+        self.busy = 0.0  # 全部回调的耗时
+        self.callbacks = 0
+        self.blocks = 0  # 超过阈值的回调数
+        self.max_block = 0.0
+        self.alloc_peak = 0  # 单个回调内的最大内存峰值增量
+        self.alloc_net = 0  # 回调前后已分配内存的净变化之和
+
+
+def _describe(handle: asyncio.Handle) -> str:
+    """回调的可读描述，用于没有任务上下文的回调"""
+    callback = handle._callback
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return getattr(coro, "__qualname__", repr(coro))
+    return getattr(callback, "__qualname__", repr(callback))[:120]
+
+
+class LoopProfiler:
+    """事件循环剖析器
+
+    用法:
+        profiler = LoopProfiler(threshold=0.05, memory=True)
+        detach = profiler.attach(bus)
+        profiler.start()
+        ...执行下载...
+        profiler.stop()
+        detach()
+        profiler.write(Path("profile.json"))
+    """
+
+    def __init__(
+        self, threshold: float = 0.05, memory: bool = False, cpu: bool = False
+    ):
+        """初始化剖析器
+
+        Args:
+            threshold: 单个回调超过该时长（秒）时记录为阻塞
+            memory: 启用 tracemalloc 统计内存分配
+            cpu: 启用 cProfile
+        """
+        self.threshold = threshold
+        self.memory = memory
+        self.cpu = cpu
+
+        self.tasks: Dict[Tuple[Optional[str], Optional[str]], _TaskStats] = {}
+        self.task_classes: Dict[Tuple[Optional[str], Optional[str]], str] = {}
+        self.blocks: List[Dict[str, Any]] = []
+        self.stage_allocations: Dict[str, List[Dict[str, Any]]] = {}
+
+        self._original_run: Optional[Callable] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self._snapshots: Dict[Tuple[Optional[str], Optional[str]], Any] = {}
+        self._snapshot_classes: Set[str] = set()  # 已取过快照的阶段
+        self._overhead = 0.0  # 回调内剖析器自身的耗时（取快照），从回调耗时中扣除
+        self._started_tracemalloc = False
+        self._start = 0.0
+        self.wall = 0.0
+
+    def attach(self, bus: EventBus) -> Callable[[], None]:
+        """订阅事件总线，记录任务类型并为每个阶段取内存快照
+
+        Args:
+            bus: 事件总线
+
+        Returns:
+            Callable[[], None]: 取消订阅函数
+        """
+        return bus.subscribe(self._on_event)
+
+    def _on_event(self, event: Event):
+        event_type = event["type"]
+        if event_type not in ("task_start", "task_done", "task_failed"):
+            return
+        key = (event.get("item_id"), event.get("task_id"))
+
+        if event_type == "task_start":
+            task_class = event.get("task_class", "")
+            self.task_classes[key] = task_class
+            if self.memory and task_class not in self._snapshot_classes:
+                self._snapshot_classes.add(task_class)
+                started = time.perf_counter()
+                self._snapshots[key] = tracemalloc.take_snapshot()
+                self._overhead += time.perf_counter() - started
+            return
+
+        before = self._snapshots.pop(key, None)
+        if before is not None and event_type == "task_done":
+            started = time.perf_counter()
+            diff = (
+                tracemalloc.take_snapshot()
+                .filter_traces(_SNAPSHOT_FILTERS)
+                .compare_to(before.filter_traces(_SNAPSHOT_FILTERS), "lineno")
+            )
+            self.stage_allocations[self.task_classes[key]] = [
+                {
+                    "line": str(stat.traceback[0]),
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in diff[:10]
+            ]
+            self._overhead += time.perf_counter() - started
+
+    def start(self):
+        """开始剖析（替换事件循环回调的执行函数）"""
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.cpu:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+        self._original_run = original = asyncio.Handle._run
+        profiler = self
+        perf_counter = time.perf_counter
+        memory = self.memory
+
+        def _run(handle: asyncio.Handle):
+            profiler._overhead = 0.0
+            if memory:
+                tracemalloc.reset_peak()
+                allocated = tracemalloc.get_traced_memory()[0]
+            started = perf_counter()
+            original(handle)
+            elapsed = perf_counter() - started - profiler._overhead
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                profiler._record(handle, elapsed, peak - allocated, current - allocated)
+            else:
+                profiler._record(handle, elapsed, 0, 0)
+
+        asyncio.Handle._run = _run
+        self._start = time.perf_counter()
+
+    def stop(self):
+        """停止剖析并恢复事件循环"""
+        if self._original_run is not None:
+            asyncio.Handle._run = self._original_run
+            self._original_run = None
+        self.wall = time.perf_counter() - self._start
+        if self._profile is not None:
+            self._profile.disable()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _record(self, handle: asyncio.Handle, elapsed: float, peak: int, net: int):
+        """累计一次回调的统计"""
+        context = handle._context
+        key = (context.get(current_item), context.get(current_task))
+        stats = self.tasks.get(key)
+        if stats is None:
+            stats = self.tasks[key] = _TaskStats()
+        stats.busy += elapsed
+        stats.callbacks += 1
+        stats.alloc_peak = max(stats.alloc_peak, peak)
+        stats.alloc_net += net
+
+        if elapsed >= self.threshold:
+            stats.blocks += 1
+            stats.max_block = max(stats.max_block, elapsed)
+            label = key[1] or _describe(handle)
+            self.blocks.append(
+                {
+                    "ms": round(elapsed * 1000, 1),
+                    "item_id": key[0],
+                    "task_id": key[1],
+                    "callback": label,
+                }
+            )
+            log.warning("🐢 事件循环被阻塞 %.0f ms: %s", elapsed * 1000, label)
+
+    def _task_rows(self) -> List[Dict[str, Any]]:
+        rows = []
+        for key, stats in self.tasks.items():
+            rows.append(
+                {
+                    "item_id": key[0],
+                    "task_id": key[1],
+                    "task_class": self.task_classes.get(key, ""),
+                    "busy_s": round(stats.busy, 4),
+                    "callbacks": stats.callbacks,
+                    "blocks": stats.blocks,
+                    "max_block_ms": round(stats.max_block * 1000, 1),
+                    "alloc_peak_bytes": stats.alloc_peak,
+                    "alloc_net_bytes": stats.alloc_net,
+                }
+            )
+        return rows
+
+    def _stage_rows(self, rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        stages: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            name = row["task_class"] or ("(作品)" if row["item_id"] else "(其他)")
+            stage = stages.setdefault(
+                name,
+                {
+                    "tasks": 0,
+                    "busy_s": 0.0,
+                    "blocks": 0,
+                    "max_block_ms": 0.0,
+                    "alloc_peak_bytes": 0,
+                },
+            )
+            stage["tasks"] += 1
+            stage["busy_s"] = round(stage["busy_s"] + row["busy_s"], 4)
+            stage["blocks"] += row["blocks"]
+            stage["max_block_ms"] = max(stage["max_block_ms"], row["max_block_ms"])
+            stage["alloc_peak_bytes"] = max(
+                stage["alloc_peak_bytes"], row["alloc_peak_bytes"]
+            )
+        for name, allocations in self.stage_allocations.items():
+            if name in stages:
+                stages[name]["top_allocations"] = allocations
+        return dict(sorted(stages.items(), key=lambda x: -x[1]["busy_s"]))
+
+    def _cprofile_rows(self) -> List[Dict[str, Any]]:
+        stats = pstats.Stats(self._profile)
+        rows = []
+        for (filename, line, func), (
+            _,
+            calls,
+            tottime,
+            cumtime,
+            _,
+        ) in stats.stats.items():
+            rows.append(
+                {
+                    "function": f"{Path(filename).name}:{line}({func})",
+                    "calls": calls,
+                    "tottime_s": round(tottime, 4),
+                    "cumtime_s": round(cumtime, 4),
+                }
+            )
+        rows.sort(key=lambda x: -x["tottime_s"])
+        return rows[:TOP_N]
+
+    def report(self) -> Dict[str, Any]:
+        """生成报告
+
+        Returns:
+            Dict[str, Any]: 按阻塞时间和内存分配排名的任务、各阶段汇总、
+                最长的阻塞回调以及（可选）cProfile 热点函数
+        """
+        rows = self._task_rows()
+        result: Dict[str, Any] = {
+            "threshold_ms": self.threshold * 1000,
+            "wall_s": round(self.wall, 3),
+            "loop_busy_s": round(sum(r["busy_s"] for r in rows), 3),
+            "by_blocking": sorted(rows, key=lambda r: -r["busy_s"])[:TOP_N],
+            "stages": self._stage_rows(rows),
+            "longest_blocks": sorted(self.blocks, key=lambda b: -b["ms"])[:TOP_N],
+        }
+        if self.memory:
+            result["by_allocation"] = sorted(
+                rows, key=lambda r: -r["alloc_peak_bytes"]
+            )[:TOP_N]
+        if self._profile is not None:
+            result["cprofile"] = self._cprofile_rows()
+        return result
+
+    def write(self, path: Path) -> Dict[str, Any]:
+        """写出JSON报告；启用 cProfile 时同时写出同名的 .prof 文件
+
+        Args:
+            path: 报告文件路径
+
+        Returns:
+            Dict[str, Any]: 报告内容
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = self.report()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        if self._profile is not None:
+            self._profile.dump_stats(str(path.with_suffix(".prof")))
+        return report
+
+    def log_summary(self, report: Dict[str, Any], top: int = 5):
+        """输出报告摘要"""
+        log.info(
+            "🔬 剖析: 运行 %.1f 秒，事件循环忙碌 %.1f 秒，%d 次阻塞超过 %.0f ms",
+            report["wall_s"],
+            report["loop_busy_s"],
+            len(self.blocks),
+            report["threshold_ms"],
+        )
+        for name, stage in report["stages"].items():
+            log.info(
+                "  %-20s 忙碌 %7.3f 秒, 阻塞 %4d 次, 最长 %8.1f ms",
+                name,
+                stage["busy_s"],
+                stage["blocks"],
+                stage["max_block_ms"],
+            )
+        for row in report["by_blocking"][:top]:
+            log.info(
+                "  ⏱️ %s: %.3f 秒 (最长 %.1f ms)",
+                row["task_id"] or row["item_id"] or "(无任务)",
+                row["busy_s"],
+                row["max_block_ms"],
+            )
+        for row in report.get("by_allocation", [])[:top]:
+            log.info(
+                "  🧠 %s: 峰值 +%.1f MB",
+                row["task_id"] or row["item_id"] or "(无任务)",
+                row["alloc_peak_bytes"] / (1024 * 1024),
+            )
@@ -0,0 +1,217 @@
+"""
+进度显示实现
+
+订阅事件总线，汇总整批下载的进度：
+- 作品完成数 / 总数
+- 已接收字节 / 预期字节（来自 Content-Length 或详情中的 fileSize）
+- 最近一段时间的下载速度和预计剩余时间
+- 最慢的几个进行中的传输
+
+事件处理只更新计数器，重绘受最小间隔限制；终端中原地刷新一行，
+输出不是终端时定期打印普通文本行。
+"""
+
+import shutil
+import sys
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, TextIO, Tuple
+
+from .events import Event, EventBus
+
+# 计算下载速度的时间窗口（秒）
+RATE_WINDOW = 10.0
+
+# 显示的最慢传输数量
+SLOWEST_SHOWN = 2
+
+
+def format_bytes(size: float) -> str:
+    """格式化字节数"""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.2f}GB"
+
+
+def format_duration(seconds: float) -> str:
+    """格式化时长为 h:mm:ss / m:ss"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+class _Transfer:
+    """一个进行中的下载"""
+
+    __slots__ = ("label", "received", "expected", "started")
+
+    def __init__(self, label: str, expected: Optional[int]):
+        self.label = label
+        self.received = 0
+        self.expected = expected
+        self.started = time.monotonic()
+
+
+class ProgressView:
+    """整批下载的实时进度
+
+    用法:
+        view = ProgressView()
+        detach = view.attach(bus)
+        ...执行下载...
+        detach()
+        view.close()
+    """
+
+    def __init__(self, stream: TextIO = sys.stdout, interval: float = 0.5):
+        """初始化进度显示
+
+        Args:
+            stream: 输出流
+            interval: 终端中的最小重绘间隔（秒），非终端时至少10秒输出一行
+        """
+        self.stream = stream
+        self.is_tty = stream.isatty()
+        self.interval = interval if self.is_tty else max(interval, 10.0)
+
+        self.items_total: Optional[int] = None
+        self.items_started = 0
+        self.items_ok = 0
+        self.items_failed = 0
+        self.bytes_received = 0  # 全部传输已接收的字节数（含重试丢弃的部分）
+        self.bytes_done = 0  # 已完成传输的字节数
+
+        self._transfers: Dict[Tuple[str, str], _Transfer] = {}
+        self._samples: Deque[Tuple[float, int]] = deque()
+        self._start = time.monotonic()
+        self._last_draw = 0.0
+
+    def attach(self, bus: EventBus) -> Callable[[], None]:
+        """订阅事件总线
+
+        Args:
+            bus: 事件总线
+
+        Returns:
+            Callable[[], None]: 取消订阅函数
+        """
+        return bus.subscribe(self._on_event)
+
+    def _on_event(self, event: Event):
+        event_type = event["type"]
+        key = (event.get("item_id"), event.get("task_id"))
+
+        if event_type == "download_progress":
+            transfer = self._transfers.get(key)
+            if transfer is not None:
+                transfer.received = event["received"]
+            self.bytes_received += event["delta"]
+        elif event_type == "download_start":
+            # 重试时重新开始计数，续传时从偏移处开始
+            transfer = _Transfer(key[1], event.get("expected"))
+            transfer.received = event.get("offset", 0)
+            self._transfers[key] = transfer
+        elif event_type in ("task_done", "task_failed", "task_cancelled"):
+            transfer = self._transfers.pop(key, None)
+            if transfer is not None and event_type == "task_done":
+                self.bytes_done += transfer.received
+        elif event_type == "batch_start":
+            self.items_total = event.get("total")
+        elif event_type == "item_start":
+            self.items_started += 1
+        elif event_type == "item_done":
+            if event.get("success") or event.get("partial"):
+                self.items_ok += 1  # 部分完成的作品模型已就位，不计为失败
+            else:
+                self.items_failed += 1
+        else:
+            return
+
+        now = time.monotonic()
+        if now - self._last_draw >= self.interval:
+            self._last_draw = now
+            self._draw(now)
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """最近时间窗口内的下载速度（字节/秒）"""
+        now = now or time.monotonic()
+        self._samples.append((now, self.bytes_received))
+        while len(self._samples) > 1 and now - self._samples[0][0] > RATE_WINDOW:
+            self._samples.popleft()
+        first_ts, first_bytes = self._samples[0]
+        if now - first_ts <= 0:
+            elapsed = now - self._start
+            return self.bytes_received / elapsed if elapsed > 0 else 0.0
+        return (self.bytes_received - first_bytes) / (now - first_ts)
+
+    def eta(self, now: Optional[float] = None) -> Optional[float]:
+        """预计剩余时间（秒），按作品完成速度估算，未知时返回None"""
+        now = now or time.monotonic()
+        finished = self.items_ok + self.items_failed
+        if not self.items_total or not finished:
+            return None
+        elapsed = now - self._start
+        return elapsed / finished * (self.items_total - finished)
+
+    def slowest(self, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """最慢的进行中传输（已持续至少1秒）
+
+        Returns:
+            List[Tuple[str, float]]: (传输标签, 字节/秒)
+        """
+        now = now or time.monotonic()
+        rates = [
+            (t.label, t.received / (now - t.started))
+            for t in self._transfers.values()
+            if now - t.started >= 1.0
+        ]
+        rates.sort(key=lambda x: x[1])
+        return rates[:SLOWEST_SHOWN]
+
+    def render(self, now: Optional[float] = None) -> str:
+        """当前进度文本（单行）"""
+        now = now or time.monotonic()
+        finished = self.items_ok + self.items_failed
+        total = self.items_total if self.items_total is not None else "?"
+
+        in_flight = list(self._transfers.values())
+        received = self.bytes_done + sum(t.received for t in in_flight)
+        expected = self.bytes_done + sum(
+            t.expected if t.expected else t.received for t in in_flight
+        )
+
+        parts = [
+            f"⏳ 作品 {finished}/{total} (失败 {self.items_failed})",
+            f"{format_bytes(received)}/{format_bytes(expected)}",
+            f"{self.rate(now) / (1024 * 1024):.2f}MB/s",
+        ]
+        eta = self.eta(now)
+        parts.append(f"ETA {format_duration(eta)}" if eta is not None else "ETA --")
+        slowest = self.slowest(now)
+        if slowest:
+            parts.append(
+                "最慢: "
+                + ", ".join(
+                    f"{label} {format_bytes(rate)}/s" for label, rate in slowest
+                )
+            )
+        return " | ".join(parts)
+
+    def _draw(self, now: Optional[float] = None):
+        line = self.render(now)
+        if self.is_tty:
+            width = shutil.get_terminal_size().columns
+            self.stream.write("\r\x1b[2K" + line[: max(width - 1, 20)])
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def close(self):
+        """输出最终进度并换行"""
+        self._draw()
+        if self.is_tty:
+            self.stream.write("\n")
+            self.stream.flush()
@@ -0,0 +1,115 @@
+"""
+自适应限流实现
+
+按主机限制在途请求数：成功时缓慢放宽（加性增），
+遇到429/5xx时减半并遵守Retry-After（乘性减）
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+
+class AdaptiveLimiter:
+    """AIMD自适应并发限制器
+
+    用法:
+        async with limiter:
+            ...请求...
+            limiter.on_success()  # 或 limiter.on_throttle(retry_after)
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64):
+        """初始化限制器
+
+        Args:
+            initial: 初始并发上限
+            minimum: 并发上限的下限
+            maximum: 并发上限的上限
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.throttled = 0  # 累计被限流次数
+        self._resume_at = 0.0  # Retry-After 冷却截止时间
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        """等待可用的并发名额"""
+        async with self._cond:
+            while True:
+                delay = self._resume_at - time.monotonic()
+                if delay > 0:
+                    # 冷却期内等待，期间被唤醒则重新检查
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < int(self.limit):
+                    break
+                await self._cond.wait()
+            self.in_flight += 1
+
+    async def release(self):
+        """归还并发名额"""
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def on_success(self):
+        """请求成功：每个窗口约增加1个并发"""
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """请求被限流：并发减半，并按Retry-After暂停发起新请求
+
+        Args:
+            retry_after: 服务器要求的等待秒数
+        """
+        self.throttled += 1
+        self.limit = max(self.minimum, self.limit / 2)
+        if retry_after:
+            self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After头（仅支持秒数格式）
+
+    Args:
+        value: 头部取值
+
+    Returns:
+        Optional[float]: 等待秒数，无法解析时返回None
+    """
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+# 进程内按主机共享的限制器
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def limiter_for(host: str, **kwargs) -> AdaptiveLimiter:
+    """获取指定主机的限制器，不存在时创建
+
+    Args:
+        host: 主机名
+        **kwargs: 创建限制器时的参数
+
+    Returns:
+        AdaptiveLimiter: 限制器实例
+    """
+    if host not in _limiters:
+        _limiters[host] = AdaptiveLimiter(**kwargs)
+    return _limiters[host]
@@ -1,36 +1,73 @@
 """
 任务调度器实现
 
-负责执行任务图中的任务，支持并发执行和优雅退出
+负责执行任务图中的任务，支持并发执行和取消
+
+所在的取消作用域被取消时，正在执行的任务在当前 await 处停止，
+调度器等它们全部退出（文件句柄关闭、.part 文件保留）后再向上传播取消
 """
 
 import asyncio
+import heapq
+import itertools
+import logging
 import sys
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 # 添加父目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from tasks.base import is_shutdown_requested, Task
+from tasks.base import Task
 
+from .artifacts import Artifact, artifact_store, ArtifactStore
+from .budget import ByteBudget, memory_budget
+from .events import bus
 from .graph import TaskGraph
+from .journal import classify_error
+from .log import current_task
+from .metrics import metrics
+from .priority import expected_sizes, RateHints, SizeHints, task_priorities
+
+log = logging.getLogger("nizima.scheduler")
 
 
 class TaskScheduler:
     """任务调度器
 
-    负责执行整个任务图，支持并发执行和依赖管理
+    负责执行整个任务图，支持并发执行和依赖管理。
+    任务一完成就把新就绪的后续任务放入优先队列，空出的并发名额
+    总是交给优先级最高的就绪任务（见 core.priority）。
+    任务失败时只跳过依赖它的任务（deps_on，传递），其余分支继续执行；
+    只等待它结束的任务（waits_for）照常就绪
     """
 
-    def __init__(self, max_concurrent: int = 5):
+    def __init__(
+        self,
+        max_concurrent: int = 5,
+        size_hints: Optional[SizeHints] = None,
+        prioritize: bool = True,
+        artifacts: Optional[ArtifactStore] = None,
+        budget: Optional[ByteBudget] = None,
+        rate_hints: Optional[RateHints] = None,
+    ):
         """初始化调度器
 
         Args:
             max_concurrent: 最大并发任务数
+            size_hints: 之前运行的任务大小记录，用于估算预期字节数，并记录本次的实际大小
+            prioritize: 是否按关键路径和预期字节数排序，否则按任务就绪的先后顺序
+            artifacts: 任务产出仓库，默认使用进程内共享的仓库（共享内存预算）
+            budget: 任务执行期间占用的内存预算，默认使用进程内共享的预算
+            rate_hints: 记录各类任务的处理速率，供运行计划估算时间
         """
         self.max_concurrent = max_concurrent
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.size_hints = size_hints
+        self.prioritize = prioritize
+        self.artifacts = artifacts or artifact_store
+        self.budget = budget or memory_budget
+        self.rate_hints = rate_hints
         self.task_results: Dict[str, Any] = {}  # 存储任务执行结果
 
     async def execute_graph(self, graph: TaskGraph) -> bool:
@@ -40,180 +77,297 @@ class TaskScheduler:
             graph: 要执行的任务图
 
         Returns:
-            bool: 是否成功执行完所有任务
+            bool: 是否成功执行完所有任务；部分失败时已完成的任务结果保留，
+                失败和被跳过的任务带有 error
         """
-        print(f"🚀 开始执行任务图，共 {len(graph.tasks)} 个任务")
+        log.debug("🚀 开始执行任务图，共 %d 个任务", len(graph.tasks))
+        bus.emit("graph_start", item_id=graph.item_id, total=len(graph.tasks))
 
         # 验证任务图
         errors = graph.validate_dependencies()
         if errors:
-            print("❌ 任务图验证失败:")
-            for error in errors:
-                print(f"  - {error}")
+            log.error("❌ 任务图验证失败:\n%s", "\n".join(f"  - {e}" for e in errors))
             return False
 
+        priorities = task_priorities(graph, self.size_hints) if self.prioritize else {}
+        sizes = expected_sizes(graph, self.size_hints)
+
+        # 每个任务还在等待的依赖数，以及依赖于它（需要其结果）和等待它结束的任务
+        dependents: Dict[str, List[str]] = {tid: [] for tid in graph.tasks}
+        waiters: Dict[str, List[str]] = {tid: [] for tid in graph.tasks}
+        waiting: Dict[str, int] = {}
+        for task_id, task in graph.tasks.items():
+            deps = [d for d in task.deps_on if d in graph.tasks]
+            waits = [d for d in task.waits_for if d in graph.tasks]
+            waiting[task_id] = sum(
+                1 for d in deps + waits if not graph.tasks[d].completed
+            )
+            for dep_id in deps:
+                dependents[dep_id].append(task_id)
+            for dep_id in waits:
+                waiters[dep_id].append(task_id)
+        blocked: List[str] = []  # 因依赖失败而跳过的任务
+        failed: Dict[str, None] = {}  # 失败或被跳过的任务（按发生顺序），供 set_missing
+
+        # 就绪队列：(优先级, 就绪顺序, 任务ID, 就绪时间)
+        ready: List[Tuple[Any, int, str, float]] = []
+        sequence = itertools.count()
+
+        def push(task_id: str):
+            entry = (priorities.get(task_id, ()), next(sequence), task_id, time.time())
+            heapq.heappush(ready, entry)
+            metrics.queue_depth.inc()
+
+        def release(task_id: str, targets: List[str]):
+            for target in targets:
+                waiting[target] -= 1
+                if waiting[target] == 0 and not graph.tasks[target].completed:
+                    push(target)
+
+        def release_inputs(task_id: str):
+            """任务已结束，不再需要依赖任务的产出"""
+            for dep_id in graph.tasks[task_id].deps_on:
+                self.artifacts.release((graph.item_id, dep_id))
+
+        def block(task_id: str):
+            """跳过失败任务的所有后续任务，不相关的分支继续执行"""
+            for dependent in dependents[task_id]:
+                task = graph.tasks[dependent]
+                if task.completed or task.error:
+                    continue
+                task.mark_failed(f"依赖的任务 {task_id} 失败")
+                blocked.append(dependent)
+                failed[dependent] = None
+                release_inputs(dependent)
+                block(dependent)
+            release(task_id, waiters[task_id])
+
+        for task_id, task in graph.tasks.items():
+            if not task.completed and waiting[task_id] == 0:
+                push(task_id)
+
+        running: Dict[asyncio.Task, str] = {}
         try:
-            while not graph.is_all_completed():
-                # 检查是否请求关闭
-                if is_shutdown_requested():
-                    print("🛑 收到关闭请求，停止执行任务图")
-                    return False
-
-                # 获取当前可执行的任务
-                ready_task_ids = graph.get_ready_tasks()
-
-                if not ready_task_ids:
-                    # 如果没有ready任务但图未完成，说明存在问题
-                    incomplete_tasks = [
-                        tid for tid, t in graph.tasks.items() if not t.completed
-                    ]
-                    failed_tasks = [tid for tid, t in graph.tasks.items() if t.error]
-
-                    if failed_tasks:
-                        print(f"❌ 存在失败的任务，无法继续: {failed_tasks}")
-                    else:
-                        print(
-                            f"❌ 无法继续执行，存在未完成且无ready任务的情况: {incomplete_tasks}"
+            while ready or running:
+                # 空出的并发名额交给优先级最高的就绪任务
+                while ready and len(running) < self.max_concurrent:
+                    _, _, task_id, queued_at = heapq.heappop(ready)
+                    metrics.queue_depth.dec()
+                    future = asyncio.create_task(
+                        self._execute_single_task(
+                            graph, task_id, queued_at, sizes.get(task_id, 0), failed
                         )
-                    return False
-
-                # 并发执行所有ready任务
-                print(f"📋 找到 {len(ready_task_ids)} 个可执行任务: {ready_task_ids}")
+                    )
+                    running[future] = task_id
 
-                # 执行任务并收集结果
-                results = await asyncio.gather(
-                    *[self._execute_single_task(graph, tid) for tid in ready_task_ids],
-                    return_exceptions=True,
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
                 )
 
                 # 处理执行结果
-                for i, result in enumerate(results):
-                    task_id = ready_task_ids[i]
-                    if isinstance(result, Exception):
-                        print(f"❌ 任务 {task_id} 执行异常: {result}")
-                        graph.tasks[task_id].mark_failed(str(result))
-                    else:
-                        self.task_results[task_id] = result
+                for future in done:
+                    task_id = running.pop(future)
+                    task = graph.tasks[task_id]
+                    release_inputs(task_id)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # 失败的任务不再重新执行，依赖它的任务被跳过
+                        log.debug("❌ 任务 %s 执行异常: %s", task_id, e)
+                        task.mark_failed(str(e))
+                        failed[task_id] = None
+                        block(task_id)
+                        continue
+                    if not task.completed:
+                        task.mark_completed(result)
+                    self.task_results[task_id] = result
+                    self.artifacts.publish(
+                        (graph.item_id, task_id),
+                        task.output or Artifact.from_result(result),
+                        len(dependents[task_id]),
+                    )
+                    release(task_id, dependents[task_id] + waiters[task_id])
+
+            if not graph.is_all_completed():
+                incomplete_tasks = [
+                    tid for tid, t in graph.tasks.items() if not t.completed
+                ]
+                failed_tasks = [
+                    tid
+                    for tid, t in graph.tasks.items()
+                    if t.error and tid not in blocked
+                ]
+
+                if failed_tasks:
+                    log.warning(
+                        "❌ 失败的任务: %s，跳过依赖它们的 %d 个任务",
+                        failed_tasks,
+                        len(blocked),
+                    )
+                else:
+                    log.error(
+                        "❌ 无法继续执行，存在未完成且无ready任务的情况: %s",
+                        incomplete_tasks,
+                    )
+                return False
 
             # 输出完成统计
             stats = graph.get_completion_stats()
-            print(f"📊 任务执行完成: {stats['completed']}/{stats['total']} 成功")
+            log.debug("📊 任务执行完成: %d/%d 成功", stats["completed"], stats["total"])
 
             if stats["failed"] > 0:
-                print(f"⚠️ 失败任务数: {stats['failed']}")
+                log.warning("⚠️ 失败任务数: %d", stats["failed"])
                 return False
 
-            print("🎉 所有任务执行完毕！")
+            log.debug("🎉 所有任务执行完毕！")
             return True
 
         except Exception as e:
-            print(f"❌ 执行任务图时发生异常: {e}")
+            log.error("❌ 执行任务图时发生异常: %s", e)
             return False
 
-    async def _execute_single_task(self, graph: TaskGraph, task_id: str) -> Any:
+        finally:
+            # 被取消或异常退出时，等正在执行的任务退出后再返回，暂存目录保持一致
+            for future in running:
+                future.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            for _ in ready:
+                metrics.queue_depth.dec()
+            self.artifacts.discard_item(graph.item_id)
+
+    async def _execute_single_task(
+        self,
+        graph: TaskGraph,
+        task_id: str,
+        queued_at: float,
+        expected: int = 0,
+        failed: Optional[Dict[str, None]] = None,
+    ) -> Any:
         """执行单个任务
 
+        开始执行前按任务预计占用的内存申请预算，预算不足时等待
+
         Args:
             graph: 任务图
             task_id: 任务ID
+            queued_at: 任务就绪（进入就绪队列）的时间，用于追踪排队耗时
+            expected: 任务处理的预期字节数
+            failed: 图中已失败或被跳过的任务ID
 
         Returns:
             Any: 任务执行结果
         """
-        async with self.semaphore:  # 控制并发数
-            task = graph.tasks[task_id]
-
-            # 再次检查是否已完成（防止并发冲突）
-            if task.completed:
-                print(f"✅ 任务 {task_id} 已完成（跳过）")
-                return task.result
-
-            # 检查依赖是否真的都完成了（双重保险）
-            for dep_id in task.deps_on:
-                if dep_id in graph.tasks and not graph.tasks[dep_id].completed:
-                    raise RuntimeError(f"任务 {task_id} 的依赖 {dep_id} 未完成")
-
-            # 检查输出是否存在，决定是否跳过
-            if task.is_completed():
-                print(f"✅ 任务 {task_id} 输出已存在（跳过执行）")
-                task.mark_completed()
-                # 尝试从现有输出恢复结果
-                return await self._recover_task_result(task)
-
-            print(f"▶️ 开始执行任务: {task_id}")
-
-            try:
-                # 为任务提供依赖任务的结果
-                await self._prepare_task_dependencies(graph, task)
-
-                # 执行任务
-                result = await task.execute()
+        current_task.set(task_id)  # 每个任务运行在 create_task 复制的独立上下文中
+        task = graph.tasks[task_id]
+
+        # 再次检查是否已完成（防止并发冲突）
+        if task.completed:
+            log.debug("✅ 任务 %s 已完成（跳过）", task_id)
+            return task.result
+
+        # 检查依赖是否真的都完成了（双重保险）
+        for dep_id in task.deps_on:
+            if dep_id in graph.tasks and not graph.tasks[dep_id].completed:
+                raise RuntimeError(f"任务 {task_id} 的依赖 {dep_id} 未完成")
+
+        # 检查输出是否存在，决定是否跳过
+        if task.is_completed():
+            log.debug("✅ 任务 %s 输出已存在（跳过执行）", task_id)
+            # 尝试从现有输出恢复结果，供后续任务使用（如解压任务的模型名）
+            result = task.recover_result()
+            task.mark_completed(result)
+            bus.emit(
+                "task_skipped",
+                item_id=graph.item_id,
+                task_id=task_id,
+                queued=queued_at,
+                task_class=type(task).__name__,
+                resource=task.resource_class,
+            )
+            return result
+
+        granted = await self.budget.acquire(task.memory_cost(expected))
+        task.memory_reserved = granted if self.budget.limit else None
+
+        log.debug("▶️ 开始执行任务: %s", task_id)
+        bus.emit(
+            "task_start",
+            item_id=graph.item_id,
+            task_id=task_id,
+            queued=queued_at,
+            task_class=type(task).__name__,
+            resource=task.resource_class,
+            deps=list(task.deps_on),
+            url=getattr(task, "url", None),
+        )
 
-                print(f"✅ 任务 {task_id} 执行成功")
-                return result
-
-            except Exception as e:
-                print(f"❌ 任务 {task_id} 执行失败: {e}")
-                task.mark_failed(str(e))
-                raise
+        try:
+            # 为任务提供依赖任务的结果
+            await self._prepare_task_dependencies(graph, task, failed or {})
+
+            # 执行任务
+            started = time.perf_counter()
+            result = await task.execute()
+            elapsed = time.perf_counter() - started
+            metrics.task_duration.observe(elapsed, task_class=type(task).__name__)
+
+            log.debug("✅ 任务 %s 执行成功", task_id)
+            size = getattr(task, "bytes_downloaded", None)
+            if size and self.size_hints is not None:
+                self.size_hints.observe(task_id, graph.item_id, size)
+            if self.rate_hints is not None:
+                self.rate_hints.observe_rate(
+                    type(task).__name__, size or expected, elapsed
+                )
+            bus.emit(
+                "task_done",
+                item_id=graph.item_id,
+                task_id=task_id,
+                bytes=size,
+            )
+            return result
+
+        except asyncio.CancelledError:
+            log.debug("🛑 任务 %s 已取消", task_id)
+            bus.emit("task_cancelled", item_id=graph.item_id, task_id=task_id)
+            raise
 
-    async def _prepare_task_dependencies(self, graph: TaskGraph, task: Task):
-        """为任务准备依赖信息
+        except Exception as e:
+            log.warning("❌ 任务 %s 执行失败: %s", task_id, e)
+            task.mark_failed(str(e))
+            bus.emit(
+                "task_failed",
+                item_id=graph.item_id,
+                task_id=task_id,
+                url=getattr(task, "url", None),
+                error=str(e),
+                error_class=classify_error(e),
+                attempts=getattr(task, "attempts", 1),
+            )
+            raise
+
+        finally:
+            self.budget.release(granted)
+
+    async def _prepare_task_dependencies(
+        self, graph: TaskGraph, task: Task, failed: Dict[str, None]
+    ):
+        """为任务提供依赖任务的产出（模型名、最终目录等通过产出的元数据传递）
 
         Args:
             graph: 任务图
             task: 要准备的任务
+            failed: 图中已失败或被跳过的任务ID
         """
-        # 为特定类型的任务提供依赖任务的结果
-        from tasks.process import RenameDirectoryTask
-        from tasks.save import SaveVersionTask
-
-        if isinstance(task, RenameDirectoryTask):
-            # 为重命名任务提供模型名称
-            for dep_id in task.deps_on:
-                dep_task = graph.tasks.get(dep_id)
-                if dep_task and dep_task.completed and dep_task.result:
-                    if (
-                        isinstance(dep_task.result, dict)
-                        and "model_name" in dep_task.result
-                    ):
-                        task.set_model_name(dep_task.result["model_name"])
-                        break
-
-        elif isinstance(task, SaveVersionTask):
-            # 为版本保存任务提供模型名称
-            model_name = None
-            for dep_id in task.deps_on:
-                dep_task = graph.tasks.get(dep_id)
-                if dep_task and dep_task.completed and dep_task.result:
-                    if (
-                        isinstance(dep_task.result, dict)
-                        and "model_name" in dep_task.result
-                    ):
-                        model_name = dep_task.result["model_name"]
-                        break
-            if model_name:
-                task.set_model_name(model_name)
-
-    async def _recover_task_result(self, task: Task) -> Any:
-        """从已存在的输出恢复任务结果
-
-        Args:
-            task: 任务实例
-
-        Returns:
-            Any: 恢复的结果
-        """
-        # 对于不同类型的任务，尝试恢复其结果
-        from tasks.extract import ExtractTask
-
-        if isinstance(task, ExtractTask):
-            # 尝试恢复解压任务的结果
-            model_name = task._find_model_name()
-            return {"output_dir": task.output_dir, "model_name": model_name}
-
-        # 默认返回None
-        return None
+        task.inputs = {}
+        for dep_id in task.deps_on:
+            artifact = self.artifacts.get((graph.item_id, dep_id))
+            if artifact is not None:
+                task.inputs[dep_id] = artifact
+
+        # 记录完成状态的任务最后执行，此时其余任务都已结束
+        task.set_missing([tid for tid in failed if tid != task.task_id])
 
     def get_task_result(self, task_id: str) -> Any:
         """获取任务执行结果
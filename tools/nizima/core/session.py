@@ -0,0 +1,66 @@
+"""
+HTTP会话管理
+
+所有网络请求共享同一个连接池，避免每个任务重复建立DNS/TLS连接
+
+超时分为几类：
+- 连接超时：建立TCP/TLS连接的时长（不含等待连接池名额的时间）
+- API请求（详情、列表、导出接口）：整个请求的总时长上限 API_TIMEOUT
+- 文件传输：没有总时长上限，只要持续有进展就一直下载；
+  首字节超时、读取空闲超时和最低吞吐量由 DownloadTask 的停滞检测负责。
+  首字节计时从取得连接时开始（CONNECTION_TRACE），等待连接池名额的时间不算停滞
+"""
+
+from typing import Any
+
+import aiohttp
+
+# 连接池总上限与单主机上限
+CONNECTION_LIMIT = 20
+CONNECTION_LIMIT_PER_HOST = 10
+
+# 建立连接的超时（秒）
+CONNECT_TIMEOUT = 15
+
+# API请求的总超时（秒）
+API_TIMEOUT = 300
+
+# 文件传输请求的超时：只限制建立连接，其余由停滞检测处理
+TRANSFER_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT)
+
+
+async def _on_connection_acquired(
+    session: aiohttp.ClientSession, trace_config_ctx: Any, params: Any
+):
+    """请求取得连接（新建或复用）时，调用请求传入的 trace_request_ctx 回调"""
+    callback = trace_config_ctx.trace_request_ctx
+    if callable(callback):
+        callback()
+
+
+# 取得连接的通知：请求传入 trace_request_ctx=回调函数 时调用
+CONNECTION_TRACE = aiohttp.TraceConfig()
+CONNECTION_TRACE.on_connection_create_end.append(_on_connection_acquired)
+CONNECTION_TRACE.on_connection_reuseconn.append(_on_connection_acquired)
+CONNECTION_TRACE.freeze()
+
+
+def create_session(
+    limit: int = CONNECTION_LIMIT, limit_per_host: int = CONNECTION_LIMIT_PER_HOST
+) -> aiohttp.ClientSession:
+    """创建共享的HTTP会话
+
+    Args:
+        limit: 连接池总连接数上限
+        limit_per_host: 单个主机的连接数上限
+
+    Returns:
+        aiohttp.ClientSession: 会话实例，由调用方负责关闭
+    """
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=API_TIMEOUT, sock_connect=CONNECT_TIMEOUT),
+        connector=aiohttp.TCPConnector(
+            limit=limit, limit_per_host=limit_per_host, ttl_dns_cache=300
+        ),
+        trace_configs=[CONNECTION_TRACE],
+    )
@@ -0,0 +1,243 @@
+"""
+任务追踪实现
+
+订阅事件总线，为每个任务记录一个时间区间（排队、开始、结束、字节数、资源类别），
+并导出为 Chrome trace-event JSON，可直接在 Perfetto / chrome://tracing 中按时间线查看。
+
+未启用追踪时不订阅事件总线，调度器只多一次 time.time() 调用。
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .events import Event, EventBus
+
+
+class Span:
+    """单个任务的执行区间"""
+
+    __slots__ = (
+        "item_id",
+        "task_id",
+        "task_class",
+        "resource",
+        "host",
+        "deps",
+        "queued",
+        "start",
+        "end",
+        "status",
+        "bytes",
+        "error",
+    )
+
+    def __init__(self, item_id: str, task_id: str, queued: float, start: float):
+        self.item_id = item_id
+        self.task_id = task_id
+        self.task_class = ""
+        self.resource = ""
+        self.host: Optional[str] = None
+        self.deps: List[str] = []
+        self.queued = queued
+        self.start = start
+        self.end: Optional[float] = None
+        self.status = "running"
+        self.bytes: Optional[int] = None
+        self.error: Optional[str] = None
+
+
+class Tracer:
+    """任务追踪器
+
+    用法:
+        tracer = Tracer()
+        detach = tracer.attach(bus)
+        ...执行任务...
+        detach()
+        tracer.write(Path("out.json"))
+    """
+
+    def __init__(self):
+        """初始化追踪器"""
+        self.spans: List[Span] = []
+        self.items: Dict[str, Tuple[float, Optional[float], Optional[bool]]] = {}
+        self._running: Dict[Tuple[str, str], Span] = {}
+
+    def attach(self, bus: EventBus) -> Callable[[], None]:
+        """订阅事件总线
+
+        Args:
+            bus: 事件总线
+
+        Returns:
+            Callable[[], None]: 取消订阅函数
+        """
+        return bus.subscribe(self._on_event)
+
+    def _on_event(self, event: Event):
+        event_type = event["type"]
+        key = (event.get("item_id"), event.get("task_id"))
+
+        if event_type == "task_start":
+            span = Span(key[0], key[1], event.get("queued", event["ts"]), event["ts"])
+            span.task_class = event.get("task_class", "")
+            span.resource = event.get("resource", "")
+            span.deps = event.get("deps", [])
+            if event.get("url"):
+                span.host = urlsplit(event["url"]).hostname
+            self._running[key] = span
+            self.spans.append(span)
+
+        elif event_type in ("task_done", "task_failed", "task_cancelled"):
+            span = self._running.pop(key, None)
+            if span is None:
+                # 任务图执行之前的失败（如获取详情）没有开始事件
+                span = Span(key[0], key[1], event["ts"], event["ts"])
+                self.spans.append(span)
+            span.end = event["ts"]
+            span.bytes = event.get("bytes")
+            if event_type == "task_failed":
+                span.status = "failed"
+                span.error = event.get("error")
+            elif event_type == "task_cancelled":
+                span.status = "cancelled"
+            else:
+                span.status = "done"
+
+        elif event_type == "task_skipped":
+            span = Span(key[0], key[1], event.get("queued", event["ts"]), event["ts"])
+            span.task_class = event.get("task_class", "")
+            span.resource = event.get("resource", "")
+            span.end = event["ts"]
+            span.status = "skipped"
+            self.spans.append(span)
+
+        elif event_type == "item_start":
+            self.items[key[0]] = (event["ts"], None, None)
+
+        elif event_type == "item_done":
+            start = self.items.get(key[0], (event["ts"], None, None))[0]
+            self.items[key[0]] = (start, event["ts"], event.get("success"))
+
+    def to_trace_events(self) -> List[Dict[str, Any]]:
+        """转换为 Chrome trace-event 列表
+
+        每个作品是一个进程（pid），作品内并发的任务分配到互不重叠的线程（tid）上，
+        排队等待显示为任务之前的 "queued" 区间。
+
+        Returns:
+            List[Dict[str, Any]]: trace-event 列表
+        """
+        times = [s.queued for s in self.spans] + [t[0] for t in self.items.values()]
+        if not times:
+            return []
+        origin = min(times)
+
+        def us(ts: float) -> float:
+            return round((ts - origin) * 1e6, 1)
+
+        events: List[Dict[str, Any]] = []
+        pids: Dict[str, int] = {}
+
+        def pid_for(item_id: str) -> int:
+            if item_id not in pids:
+                pids[item_id] = len(pids) + 1
+                events.append(
+                    {
+                        "name": "process_name",
+                        "ph": "M",
+                        "pid": pids[item_id],
+                        "args": {"name": f"item {item_id}"},
+                    }
+                )
+            return pids[item_id]
+
+        # 作品整体区间放在 tid 0
+        for item_id, (start, end, success) in self.items.items():
+            if end is None:
+                continue
+            events.append(
+                {
+                    "name": f"item {item_id}",
+                    "cat": "item",
+                    "ph": "X",
+                    "pid": pid_for(item_id),
+                    "tid": 0,
+                    "ts": us(start),
+                    "dur": round(us(end) - us(start), 1),
+                    "args": {"success": success},
+                }
+            )
+
+        # 同一作品内按排队时间分配不重叠的车道
+        lanes: Dict[str, List[float]] = {}
+        last_end = max(
+            [s.end for s in self.spans if s.end is not None]
+            + [t[1] for t in self.items.values() if t[1] is not None]
+            + [origin]
+        )
+        for span in sorted(self.spans, key=lambda s: s.queued):
+            end = span.end if span.end is not None else last_end
+            item_lanes = lanes.setdefault(span.item_id, [])
+            for tid, free_at in enumerate(item_lanes):
+                if free_at <= span.queued:
+                    item_lanes[tid] = end
+                    break
+            else:
+                tid = len(item_lanes)
+                item_lanes.append(end)
+
+            pid = pid_for(span.item_id)
+            if span.start > span.queued:
+                events.append(
+                    {
+                        "name": "queued",
+                        "cat": "queue",
+                        "ph": "X",
+                        "pid": pid,
+                        "tid": tid + 1,
+                        "ts": us(span.queued),
+                        "dur": round(us(span.start) - us(span.queued), 1),
+                    }
+                )
+            args: Dict[str, Any] = {
+                "task_class": span.task_class,
+                "status": span.status,
+                "deps": span.deps,
+            }
+            if span.host:
+                args["host"] = span.host
+            if span.bytes is not None:
+                args["bytes"] = span.bytes
+            if span.error:
+                args["error"] = span.error
+            events.append(
+                {
+                    "name": span.task_id,
+                    "cat": span.resource or "task",
+                    "ph": "X",
+                    "pid": pid,
+                    "tid": tid + 1,
+                    "ts": us(span.start),
+                    "dur": round(us(end) - us(span.start), 1),
+                    "args": args,
+                }
+            )
+        return events
+
+    def write(self, path: Path):
+        """写出 Chrome trace-event JSON 文件
+
+        Args:
+            path: 输出文件路径
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"traceEvents": self.to_trace_events(), "displayTimeUnit": "ms"},
+                f,
+                ensure_ascii=False,
+            )
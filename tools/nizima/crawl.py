@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+作品ID爬取
+
+按ID区间高并发探测作品详情API，在自适应限流下发现有效作品：
+
+    fetch_nizima.py crawl --range 130000-135000 [--emit new_ids.txt] [--fetch]
+
+每个ID的探测结果（valid / no_preview / invalid / non_json）写入带TTL的
+持久化探测缓存，之后的扫描直接跳过仍在有效期内的ID。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# 添加当前目录到Python路径，以支持相对导入
+sys.path.insert(0, str(Path(__file__).parent))
+
+import aiohttp
+
+import config
+from core.events import bus
+from core.log import add_logging_arguments, setup_logging
+from core.ratelimit import AdaptiveLimiter, parse_retry_after
+from core.session import create_session
+from utils import DetailError, fetch_detail
+
+log = logging.getLogger("nizima.crawl")
+
+# 探测结果类型
+OUTCOMES = ("valid", "no_preview", "invalid", "non_json")
+
+# 各结果类型在缓存中的默认有效期（天）
+DEFAULT_TTL_DAYS = {"valid": 7, "no_preview": 7, "invalid": 30, "non_json": 1}
+
+# 临时错误（429/5xx/网络错误）的最大尝试次数
+MAX_PROBE_ATTEMPTS = 5
+
+# 缓存每写入多少条刷新一次磁盘
+FLUSH_EVERY = 256
+
+
+class ProbeCache:
+    """持久化探测缓存
+
+    以JSON Lines追加写入，每行一条 {"id", "outcome", "ts"}，
+    加载时后写入的记录覆盖先写入的记录
+    """
+
+    def __init__(self, path: Path, ttl_days: Optional[Dict[str, float]] = None):
+        """初始化缓存
+
+        Args:
+            path: 缓存文件路径
+            ttl_days: 各结果类型的有效期（天），未指定的使用默认值
+        """
+        self.path = Path(path)
+        self.ttl = {
+            k: v * 86400 for k, v in {**DEFAULT_TTL_DAYS, **(ttl_days or {})}.items()
+        }
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._file = None
+        self._pending = 0
+
+    def load(self):
+        """从磁盘加载缓存，跳过损坏的行"""
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._entries[record["id"]] = (record["outcome"], record["ts"])
+                except (ValueError, KeyError):
+                    continue
+
+    def get(self, item_id: str) -> Optional[str]:
+        """获取仍在有效期内的探测结果
+
+        Args:
+            item_id: 作品ID
+
+        Returns:
+            Optional[str]: 探测结果，不存在或已过期时返回None
+        """
+        entry = self._entries.get(item_id)
+        if entry is None:
+            return None
+        outcome, ts = entry
+        if time.time() - ts > self.ttl.get(outcome, 0):
+            return None
+        return outcome
+
+    def record(self, item_id: str, outcome: str):
+        """记录探测结果
+
+        Args:
+            item_id: 作品ID
+            outcome: 探测结果
+        """
+        ts = time.time()
+        self._entries[item_id] = (outcome, ts)
+
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(
+            json.dumps({"id": item_id, "outcome": outcome, "ts": round(ts)}) + "\n"
+        )
+        self._pending += 1
+        if self._pending >= FLUSH_EVERY:
+            self._file.flush()
+            self._pending = 0
+
+    def close(self):
+        """刷新并关闭缓存文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Crawler:
+    """作品ID爬虫
+
+    多个探测协程共享同一个ID迭代器，在途请求数由自适应限制器控制
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        cache: ProbeCache,
+        limiter: AdaptiveLimiter,
+    ):
+        """初始化爬虫
+
+        Args:
+            session: HTTP会话
+            cache: 探测缓存
+            limiter: 详情API的自适应限制器
+        """
+        self.session = session
+        self.cache = cache
+        self.limiter = limiter
+        self.stats: Counter = Counter()
+
+    async def sweep(self, item_ids: Iterable[str]) -> AsyncIterator[str]:
+        """扫描ID，逐个产出新发现的有效作品ID
+
+        Args:
+            item_ids: 待探测的作品ID
+
+        Yields:
+            str: 新发现的有效作品ID
+        """
+        found: asyncio.Queue = asyncio.Queue()
+        ids = iter(item_ids)
+
+        async def worker():
+            for item_id in ids:
+                if self.cache.get(item_id) is not None:
+                    self.stats["cached"] += 1
+                    continue
+                outcome = await self._probe(item_id)
+                if outcome is None:
+                    self.stats["gave_up"] += 1
+                    continue
+                self.stats[outcome] += 1
+                self.cache.record(item_id, outcome)
+                if outcome == "valid":
+                    await found.put(item_id)
+
+        async def run():
+            try:
+                await asyncio.gather(*[worker() for _ in range(self.limiter.maximum)])
+            finally:
+                await found.put(None)
+
+        runner = asyncio.create_task(run())
+        try:
+            while True:
+                item_id = await found.get()
+                if item_id is None:
+                    break
+                yield item_id
+            await runner
+        finally:
+            runner.cancel()
+
+    async def _probe(self, item_id: str) -> Optional[str]:
+        """探测单个ID
+
+        Args:
+            item_id: 作品ID
+
+        Returns:
+            Optional[str]: 探测结果，临时错误重试耗尽时返回None
+        """
+        for _ in range(MAX_PROBE_ATTEMPTS):
+            async with self.limiter:
+                self.stats["requests"] += 1
+                try:
+                    data = await fetch_detail(item_id, self.session)
+                except DetailError as e:
+                    self.limiter.on_success()
+                    return e.kind
+                except aiohttp.ClientResponseError as e:
+                    if e.status != 429 and e.status < 500:
+                        self.limiter.on_success()
+                        return "invalid"
+                    retry_after = parse_retry_after(
+                        (e.headers or {}).get("Retry-After")
+                    )
+                    self.limiter.on_throttle(retry_after or 1.0)
+                    continue
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    self.limiter.on_throttle(1.0)
+                    continue
+
+                self.limiter.on_success()
+                has_preview = bool(data["assetsInfo"].get("previewLive2DZip"))
+                return "valid" if has_preview else "no_preview"
+        return None
+
+
+def parse_ranges(specs: List[str]) -> Iterator[str]:
+    """解析ID区间
+
+    Args:
+        specs: 区间列表，如 ["130000-135000", "111381"]，区间包含两端
+
+    Yields:
+        str: 作品ID
+    """
+    for spec in specs:
+        start, _, end = spec.partition("-")
+        for n in range(int(start), int(end or start) + 1):
+            yield str(n)
+
+
+def parse_ttl(specs: List[str]) -> Dict[str, float]:
+    """解析 --ttl outcome=days 参数"""
+    ttl = {}
+    for spec in specs:
+        outcome, _, days = spec.partition("=")
+        if outcome not in OUTCOMES:
+            raise ValueError(f"未知的探测结果类型: {outcome}")
+        ttl[outcome] = float(days)
+    return ttl
+
+
+async def main(argv: List[str] = None):
+    """爬取子命令入口"""
+    from fetch_nizima import fetch_multiple_items
+
+    parser = argparse.ArgumentParser(
+        prog="fetch_nizima.py crawl", description="扫描ID区间发现有效作品"
+    )
+    parser.add_argument(
+        "--range",
+        dest="ranges",
+        action="append",
+        required=True,
+        help="ID区间，如 130000-135000，可重复指定",
+    )
+    parser.add_argument(
+        "--output", "-o", default="../../models/nizima", help="输出目录"
+    )
+    parser.add_argument(
+        "--cache", help="探测缓存文件（默认 <output>/.crawl_cache.jsonl）"
+    )
+    parser.add_argument(
+        "--ttl",
+        action="append",
+        default=[],
+        help="覆盖缓存有效期，如 invalid=60（天），可重复指定",
+    )
+    parser.add_argument("--max-probes", type=int, default=64, help="最大并发探测数")
+    parser.add_argument("--emit", help="把新发现的作品ID追加写入该文件")
+    parser.add_argument("--fetch", action="store_true", help="发现后立即下载")
+    parser.add_argument(
+        "--concurrent", "-c", type=int, default=3, help="下载时的最大并发作品数"
+    )
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    shutdown_logging = setup_logging(args.verbose, args.quiet, args.log_json, bus)
+
+    cache = ProbeCache(
+        Path(args.cache or Path(args.output) / ".crawl_cache.jsonl"),
+        parse_ttl(args.ttl),
+    )
+    cache.load()
+    log.info("🗂️ 已加载探测缓存: %d 条", len(cache))
+
+    limiter = AdaptiveLimiter(initial=8, maximum=args.max_probes)
+    emit_file = open(args.emit, "a", encoding="utf-8") if args.emit else None
+    host = urlparse(config.API_BASE).hostname
+    start_time = time.monotonic()
+
+    async with create_session(args.max_probes, args.max_probes) as session:
+        crawler = Crawler(session, cache, limiter)
+
+        async def discovered() -> AsyncIterator[str]:
+            async for item_id in crawler.sweep(parse_ranges(args.ranges)):
+                log.info("🆕 发现作品: %s", item_id)
+                if emit_file:
+                    emit_file.write(item_id + "\n")
+                    emit_file.flush()
+                yield item_id
+
+        try:
+            if args.fetch:
+                await fetch_multiple_items(discovered(), args.output, args.concurrent)
+            else:
+                async for _ in discovered():
+                    pass
+        finally:
+            cache.close()
+            if emit_file:
+                emit_file.close()
+
+    elapsed = time.monotonic() - start_time
+    stats = crawler.stats
+    log.info("=" * 80)
+    log.info("📊 扫描完成 (%s)，耗时 %.1f 秒", host, elapsed)
+    for outcome in OUTCOMES:
+        log.info("  %s: %d", outcome, stats[outcome])
+    log.info("  缓存跳过: %d，放弃: %d", stats["cached"], stats["gave_up"])
+    log.info(
+        "  请求数: %d，被限流: %d 次，最终并发上限: %d",
+        stats["requests"],
+        limiter.throttled,
+        int(limiter.limit),
+    )
+    if elapsed > 0:
+        log.info("  探测速度: %.1f 次/秒", stats["requests"] / elapsed)
+    shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
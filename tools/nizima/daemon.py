@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Nizima下载守护进程
+
+常驻进程保持连接池、作品库索引和下载工作者常驻，
+通过本地HTTP或Unix socket的JSON API接收下载任务：
+
+- POST /jobs                 提交作品ID列表，可选 priority（越小越优先）和 stream
+- GET  /jobs/{job_id}        查询任务状态
+- GET  /jobs/{job_id}/events 以JSON Lines流式返回进度事件
+- GET  /status               查询守护进程状态
+- GET  /metrics              OpenMetrics 格式的运行指标
+
+同一作品的重复请求会合并为一次下载，按需请求可通过更高优先级插队到批量任务之前。
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import signal
+import sys
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# 添加当前目录到Python路径，以支持相对导入
+sys.path.insert(0, str(Path(__file__).parent))
+
+from aiohttp import web
+
+from core.cancel import CancelScope
+from core.detail_cache import DetailCache
+from core.events import bus, Event
+from core.journal import FailureJournal
+from core.library import LibraryIndex
+from core.log import add_logging_arguments, setup_logging
+from core.metrics import handle_metrics, monitor_loop_lag
+from core.session import create_session
+from fetch_nizima import (
+    add_detail_cache_arguments,
+    add_memory_arguments,
+    apply_memory_arguments,
+    create_detail_cache,
+    FetchResult,
+    NizimaFetcher,
+)
+from ingest import is_item_id
+
+log = logging.getLogger("nizima.daemon")
+
+# 优先级：数值越小越先执行
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# 保留的历史任务数
+MAX_FINISHED_JOBS = 1000
+
+
+class _ItemEntry:
+    """单个作品的下载条目，被所有请求该作品的任务共享"""
+
+    def __init__(self, item_id: str, priority: int):
+        self.item_id = item_id
+        self.priority = priority
+        self.state = "queued"  # queued -> running -> done
+        self.success: Optional[bool] = None
+        self.done = asyncio.get_running_loop().create_future()
+        self.subscribers: List[asyncio.Queue] = []
+
+    def publish(self, event: Event):
+        """把事件推送给所有订阅者"""
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    def finish(self, success: bool):
+        """标记下载结束"""
+        self.state = "done"
+        self.success = success
+        if not self.done.done():
+            self.done.set_result(success)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "item_id": self.item_id,
+            "priority": self.priority,
+            "state": self.state,
+            "success": self.success,
+        }
+
+
+class FetchDaemon:
+    """下载守护进程
+
+    使用优先级队列调度作品下载，固定数量的工作者共享同一个连接池和作品库索引。
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        workers: int = 3,
+        detail_cache: Optional[DetailCache] = None,
+    ):
+        """初始化守护进程
+
+        Args:
+            output_dir: 输出目录
+            workers: 同时下载的作品数
+            detail_cache: 共享的详情缓存
+        """
+        self.output_dir = Path(output_dir)
+        self.workers = workers
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self.library = LibraryIndex(self.output_dir)
+        self.detail_cache = detail_cache
+        self.session = None
+        self._entries: Dict[str, _ItemEntry] = {}  # 排队或执行中的作品
+        self._jobs: "OrderedDict[str, List[_ItemEntry]]" = OrderedDict()
+        self._seq = itertools.count()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._unsubscribe = None
+        self.scope = CancelScope()  # 停止时取消进行中的作品
+
+    async def start(self):
+        """启动工作者并预热连接池和作品库索引"""
+        self.session = create_session()
+        self.library.refresh()
+        self._unsubscribe = bus.subscribe(self._on_event)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"nizima-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._worker_tasks.append(
+            asyncio.create_task(monitor_loop_lag(), name="nizima-loop-lag")
+        )
+        log.info(
+            "🔥 守护进程已就绪: %d 个工作者, 已索引 %d 个作品",
+            self.workers,
+            len(self.library),
+        )
+
+    async def stop(self):
+        """停止工作者并关闭连接池
+
+        进行中的作品立即取消，已下载的部分保留在暂存目录中
+        """
+        self.scope.cancel("守护进程停止")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        if self._unsubscribe:
+            self._unsubscribe()
+        if self.session:
+            await self.session.close()
+
+    def submit(self, item_ids: List[str], priority: int = PRIORITY_BATCH) -> str:
+        """提交下载任务
+
+        Args:
+            item_ids: 作品ID列表
+            priority: 优先级，数值越小越优先
+
+        Returns:
+            str: 任务ID
+        """
+        entries = [self._enqueue(str(item_id), priority) for item_id in item_ids]
+        job_id = uuid.uuid4().hex[:12]
+        self._jobs[job_id] = entries
+
+        # 只保留最近的任务记录
+        while len(self._jobs) > MAX_FINISHED_JOBS:
+            self._jobs.popitem(last=False)
+
+        return job_id
+
+    def _enqueue(self, item_id: str, priority: int) -> _ItemEntry:
+        """把作品加入队列，已在队列中的作品合并请求"""
+        entry = self._entries.get(item_id)
+
+        if entry is None:
+            entry = _ItemEntry(item_id, priority)
+            self._entries[item_id] = entry
+            self.queue.put_nowait((priority, next(self._seq), item_id))
+        elif entry.state == "queued" and priority < entry.priority:
+            # 提升优先级：重新入队，旧的队列项在出队时被丢弃
+            entry.priority = priority
+            self.queue.put_nowait((priority, next(self._seq), item_id))
+
+        entry.publish(
+            {"type": "queued", "item_id": item_id, "priority": entry.priority}
+        )
+        return entry
+
+    def job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务状态，任务不存在时返回None
+        """
+        entries = self._jobs.get(job_id)
+        if entries is None:
+            return None
+        return {
+            "job_id": job_id,
+            "done": all(e.state == "done" for e in entries),
+            "items": [e.to_dict() for e in entries],
+        }
+
+    async def stream_job(self, job_id: str) -> AsyncIterator[Event]:
+        """流式返回任务内所有作品的进度事件，直到全部完成
+
+        Args:
+            job_id: 任务ID
+
+        Yields:
+            Event: 进度事件
+        """
+        entries = self._jobs.get(job_id, [])
+        queue: asyncio.Queue = asyncio.Queue()
+        pending = [e for e in entries if e.state != "done"]
+
+        for entry in entries:
+            if entry.state == "done":
+                yield {
+                    "type": "item_done",
+                    "item_id": entry.item_id,
+                    "success": entry.success,
+                }
+            else:
+                entry.subscribers.append(queue)
+
+        try:
+            remaining = {e.item_id for e in pending}
+            while remaining:
+                event = await queue.get()
+                yield event
+                if event["type"] == "item_done":
+                    remaining.discard(event["item_id"])
+        finally:
+            for entry in pending:
+                if queue in entry.subscribers:
+                    entry.subscribers.remove(queue)
+
+        yield {"type": "job_done", **self.job_status(job_id)}
+
+    def status(self) -> Dict[str, Any]:
+        """守护进程状态"""
+        states = [e.state for e in self._entries.values()]
+        return {
+            "workers": self.workers,
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            "library_size": len(self.library),
+            "detail_cache": dict(self.detail_cache.stats) if self.detail_cache else {},
+        }
+
+    def _on_event(self, event: Event):
+        """把总线事件路由给对应作品的订阅者
+
+        item_done 由工作者统一发布，保证异常退出时订阅者也能收到结束事件
+        """
+        if event["type"] == "item_done":
+            return
+        entry = self._entries.get(event.get("item_id"))
+        if entry is not None:
+            entry.publish(event)
+
+    async def _worker(self):
+        """工作者：按优先级取出作品并下载"""
+        while True:
+            priority, _, item_id = await self.queue.get()
+            entry = self._entries.get(item_id)
+
+            # 跳过优先级提升后遗留的旧队列项
+            if entry is None or entry.state != "queued" or entry.priority != priority:
+                continue
+
+            entry.state = "running"
+            result = FetchResult.FAILED
+            try:
+                fetcher = NizimaFetcher(
+                    item_id,
+                    str(self.output_dir),
+                    self.session,
+                    self.library,
+                    self.detail_cache,
+                    self.scope,
+                )
+                result = await fetcher.fetch()
+            except Exception as e:
+                log.error("❌ 作品 %s 下载异常: %s", item_id, e)
+            finally:
+                del self._entries[item_id]
+                entry.publish(
+                    {
+                        "type": "item_done",
+                        "item_id": item_id,
+                        "success": bool(result),
+                        "result": result.value,
+                    }
+                )
+                entry.finish(bool(result))
+
+
+def create_app(daemon: FetchDaemon) -> web.Application:
+    """创建JSON API应用
+
+    Args:
+        daemon: 守护进程实例
+
+    Returns:
+        web.Application: aiohttp应用
+    """
+    routes = web.RouteTableDef()
+
+    async def _stream(request: web.Request, job_id: str) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        async for event in daemon.stream_job(job_id):
+            line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+            await response.write(line.encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    @routes.post("/jobs")
+    async def submit_job(request: web.Request) -> web.StreamResponse:
+        try:
+            body = await request.json()
+            item_ids = [str(i) for i in body["item_ids"]]
+            priority = int(body.get("priority", PRIORITY_BATCH))
+        except (ValueError, KeyError, TypeError) as e:
+            return web.json_response({"error": f"无效的请求: {e}"}, status=400)
+        invalid = [i for i in item_ids if not is_item_id(i)]
+        if invalid or not item_ids:
+            return web.json_response(
+                {"error": f"无效的作品ID: {invalid}" if invalid else "没有作品ID"},
+                status=400,
+            )
+
+        job_id = daemon.submit(item_ids, priority)
+        if body.get("stream"):
+            return await _stream(request, job_id)
+        return web.json_response(daemon.job_status(job_id), status=202)
+
+    @routes.get("/jobs/{job_id}")
+    async def get_job(request: web.Request) -> web.Response:
+        status = daemon.job_status(request.match_info["job_id"])
+        if status is None:
+            return web.json_response({"error": "任务不存在"}, status=404)
+        return web.json_response(status)
+
+    @routes.get("/jobs/{job_id}/events")
+    async def get_job_events(request: web.Request) -> web.StreamResponse:
+        job_id = request.match_info["job_id"]
+        if daemon.job_status(job_id) is None:
+            return web.json_response({"error": "任务不存在"}, status=404)
+        return await _stream(request, job_id)
+
+    @routes.get("/status")
+    async def get_status(request: web.Request) -> web.Response:
+        return web.json_response(daemon.status())
+
+    app = web.Application()
+    app.add_routes(routes)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+async def main(argv: List[str] = None):
+    """守护进程入口"""
+    parser = argparse.ArgumentParser(
+        prog="fetch_nizima.py daemon", description="Nizima下载守护进程"
+    )
+    parser.add_argument(
+        "--output", "-o", default="../../models/nizima", help="输出目录"
+    )
+    parser.add_argument(
+        "--concurrent", "-c", type=int, default=3, help="同时下载的作品数"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--socket", help="Unix socket路径（指定后不监听TCP端口）")
+    parser.add_argument(
+        "--journal", help="失败日志文件（默认 <output>/fail_journal.jsonl）"
+    )
+    add_detail_cache_arguments(parser)
+    add_memory_arguments(parser)
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    shutdown_logging = setup_logging(args.verbose, args.quiet, args.log_json, bus)
+    apply_memory_arguments(args)
+
+    journal = FailureJournal(
+        Path(args.journal or Path(args.output) / "fail_journal.jsonl")
+    )
+    detach_journal = journal.attach(bus)
+    daemon = FetchDaemon(args.output, args.concurrent, create_detail_cache(args))
+    await daemon.start()
+
+    runner = web.AppRunner(create_app(daemon))
+    await runner.setup()
+    if args.socket:
+        site = web.UnixSite(runner, args.socket)
+        log.info("🔌 监听Unix socket: %s", args.socket)
+    else:
+        site = web.TCPSite(runner, args.host, args.port)
+        log.info("🔌 监听地址: http://%s:%d", args.host, args.port)
+    await site.start()
+
+    # 等待中断信号
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    log.warning("🛑 收到中断信号，正在停止守护进程...")
+    await runner.cleanup()
+    await daemon.stop()
+    detach_journal()
+    journal.close()
+    shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -12,17 +12,78 @@ Nizima Live2D模型下载器 v4.0
 """
 
 import asyncio
+import enum
+import json
+import logging
+import shutil
+import statistics
 import sys
-import tempfile
+import time
 from pathlib import Path
-from typing import List
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Union,
+)
 
 # 添加当前目录到Python路径，以支持相对导入
 sys.path.insert(0, str(Path(__file__).parent))
 
+import aiohttp
+
 from core import TaskFactory, TaskGraph, TaskScheduler
-from tasks.base import is_shutdown_requested, reset_shutdown_flag
-from utils import check_version, get_assets_info, SCRIPT_VERSION, setup_signal_handlers
+from core.archive import CATALOGUE_SELECTION
+from core.artifacts import artifact_store, DEFAULT_BUDGET
+from core.budget import DEFAULT_LIMIT, memory_budget
+from core.cancel import CancelScope, install_signal_handlers
+from core.detail_cache import DEFAULT_TTL, DetailCache
+from core.events import bus
+from core.factory import selective_deferred
+from core.journal import FailureJournal, classify_error
+from core.library import LibraryIndex
+from core.log import add_logging_arguments, current_item, setup_logging
+from core.metrics import metrics, monitor_loop_lag, start_metrics_server
+from core.priority import ItemSizeEstimator, rate_hints_for, size_hints_for
+from core.planner import log_summary as log_plan_summary, Plan, Planner
+from core.profiling import LoopProfiler
+from core.session import create_session
+from core.tracing import Tracer
+from ingest import (
+    is_item_id,
+    ordered_ids,
+    ORDER_WINDOW,
+    ORDERS,
+    read_ids,
+    run_workers,
+)
+from models import AssetsInfo
+from tasks.extract import SELECTIVE_MANIFEST
+from utils import check_version, detail_url, get_assets_info, SCRIPT_VERSION
+
+log = logging.getLogger("nizima.fetcher")
+
+# 排序前预取详情的并发数
+PREFETCH_CONCURRENCY = 8
+
+# 每个作品同时执行的任务数
+TASK_CONCURRENCY = 5
+
+
+class FetchResult(enum.Enum):
+    """作品的下载结果，只有 COMPLETED 为真值"""
+
+    COMPLETED = "completed"
+    PARTIAL = "partial"  # 模型已就位，缺少部分任务（失败的分支或选择性下载）
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __bool__(self) -> bool:
+        return self is FetchResult.COMPLETED
 
 
 class NizimaFetcher:
@@ -31,92 +92,237 @@ class NizimaFetcher:
     基于任务图的全新架构，支持模块化任务管理和并发执行
     """
 
-    def __init__(self, item_id: str, output_dir: str = "models/nizima"):
+    def __init__(
+        self,
+        item_id: str,
+        output_dir: str = "models/nizima",
+        session: Optional[aiohttp.ClientSession] = None,
+        library: Optional[LibraryIndex] = None,
+        detail_cache: Optional[DetailCache] = None,
+        scope: Optional[CancelScope] = None,
+        detail: Optional[Dict[str, Any]] = None,
+        select: Optional[List[str]] = None,
+    ):
         """初始化下载器
 
         Args:
             item_id: 作品ID
             output_dir: 输出目录
+            session: 共享HTTP会话，为空时每次下载自行创建
+            library: 共享的作品库索引，为空时自行扫描输出目录
+            detail_cache: 共享的详情缓存，为空时总是请求详情API
+            scope: 所属运行的取消作用域，为空时只能取消本次下载
+            detail: 已解析的详情数据（来自运行计划），为空时查询详情缓存或API
+            select: 预览模型的成员选择器，指定时只下载选中的成员（见 core.archive）
         """
         self.item_id = str(item_id)
         self.output_dir = Path(output_dir)
-
-    async def fetch(self) -> bool:
+        self.session = session
+        self.library = library or LibraryIndex(self.output_dir)
+        self.detail_cache = detail_cache
+        self.detail = detail
+        self.select = select
+        self.scope = CancelScope(scope)  # 本作品的取消作用域
+        self.cancelled = False
+        self.missing: List[str] = []  # 部分完成时失败或被跳过的任务
+
+    async def fetch(self) -> FetchResult:
         """下载作品
 
         Returns:
-            bool: 是否成功下载
+            FetchResult: 下载结果，只有完整下载时为真值
         """
-        print("🚀 开始下载 Nizima 作品: {}".format(self.item_id))
-        print("=" * 60)
+        bus.emit("item_start", item_id=self.item_id)
+        context_token = current_item.set(self.item_id)
 
-        # 重置关闭标志
-        reset_shutdown_flag()
+        result = FetchResult.FAILED
+        try:
+            with self.scope:
+                if self.session is not None:
+                    result = await self._fetch(self.session)
+                else:
+                    async with create_session() as session:
+                        result = await self._fetch(session)
+        finally:
+            current_item.reset(context_token)
+
+        if self.scope.cancel_called:
+            # 取消前完成的任务和 .part 文件留在暂存目录，重新运行时继续
+            log.warning("🛑 作品 %s 已取消: %s", self.item_id, self.scope.reason)
+            self.cancelled = True
+            result = FetchResult.CANCELLED
+
+        metrics.items.inc(result=result.value)
+        bus.emit(
+            "item_done",
+            item_id=self.item_id,
+            success=bool(result),
+            cancelled=self.cancelled,
+            partial=result is FetchResult.PARTIAL,
+        )
+        return result
+
+    async def _fetch(self, session: aiohttp.ClientSession) -> FetchResult:
+        """使用给定会话下载作品"""
+        log.info("🚀 开始下载 Nizima 作品: %s", self.item_id)
 
         # 检查版本，如果已是最新版本则跳过
-        if check_version(self.item_id, str(self.output_dir)):
-            return True
+        if self.select and self._selection_satisfied():
+            log.info("🔎 作品 %s 已按相同的选择器下载，跳过", self.item_id)
+            self.missing = self.library.read_version(self.item_id)["missing"]
+            return FetchResult.PARTIAL
+        if check_version(self.item_id, str(self.output_dir), self.library):
+            return FetchResult.COMPLETED
 
         try:
             # 1. 获取资源信息
-            print("📋 获取资源信息...")
-            assets_info, detail_data = await get_assets_info(self.item_id)
-
-            # 如果没有preview模型，直接跳过
-            if not assets_info.preview_live2d_zip:
-                print("⚠️ 该作品没有Preview模型，直接跳过")
-                return False
-
-            # 2. 创建临时工作目录
-            with tempfile.TemporaryDirectory(
-                prefix=f"nizima_{self.item_id}_"
-            ) as temp_dir_str:
-                temp_dir = Path(temp_dir_str)
-                print(f"📁 创建临时工作目录: {temp_dir}")
+            log.debug("📋 获取资源信息...")
+            if self.detail is not None:
+                assets_info = AssetsInfo.from_api_response(self.detail)
+                detail_data = self.detail
+            else:
+                assets_info, detail_data = await get_assets_info(
+                    self.item_id, session, self.detail_cache
+                )
+        except Exception as e:
+            log.warning("❌ 获取资源信息失败: %s", e)
+            bus.emit(
+                "task_failed",
+                item_id=self.item_id,
+                task_id=f"fetch_detail_{self.item_id}",
+                url=detail_url(self.item_id),
+                error=str(e),
+                error_class=classify_error(e),
+                attempts=1,
+            )
+            return FetchResult.FAILED
 
-                # 3. 创建任务工厂和调度器
-                factory = TaskFactory(self.item_id, self.output_dir, temp_dir)
-                scheduler = TaskScheduler(max_concurrent=5)
+        # 如果没有preview模型，直接跳过
+        if not assets_info.preview_live2d_zip:
+            log.info("⚠️ 该作品没有Preview模型，直接跳过")
+            return FetchResult.FAILED
 
-                # 4. 构建任务图
-                print("🏗️ 构建任务图...")
-                try:
-                    task_graph = await factory.create_task_graph(
-                        assets_info, detail_data
-                    )
-                    print(f"📊 任务图构建完成，共 {len(task_graph.tasks)} 个任务")
+        try:
+            # 2. 准备暂存目录
+            # 失败时保留，重试时已完成的任务通过 is_completed() 跳过，
+            # 成功时由重命名任务整体移动到最终位置
+            temp_dir = self.staging_dir
+            self._resume_partial(temp_dir)
+            temp_dir.mkdir(parents=True, exist_ok=True)
+            log.debug("📁 暂存目录: %s", temp_dir)
+
+            # 3. 创建任务工厂和调度器
+            factory = TaskFactory(
+                self.item_id, self.output_dir, temp_dir, session, self.select
+            )
+            size_hints = size_hints_for(self.output_dir / ".cache" / "sizes.json")
+            rate_hints = rate_hints_for(self.output_dir / ".cache" / "rates.json")
+            scheduler = TaskScheduler(
+                max_concurrent=TASK_CONCURRENCY,
+                size_hints=size_hints,
+                rate_hints=rate_hints,
+            )
 
-                    # 显示任务图结构
-                    print("📋 任务图结构:")
-                    print(task_graph)
+            # 4. 构建任务图
+            log.debug("🏗️ 构建任务图...")
+            try:
+                task_graph = await factory.create_task_graph(assets_info, detail_data)
+                log.debug("📊 任务图构建完成，共 %d 个任务", len(task_graph.tasks))
 
-                except Exception as e:
-                    print(f"❌ 构建任务图失败: {e}")
-                    return False
+                # 显示任务图结构
+                log.debug("📋 任务图结构:\n%s", task_graph)
 
-                # 5. 执行任务图
-                print("⚡ 开始执行任务图...")
-                try:
-                    success = await scheduler.execute_graph(task_graph)
+            except Exception as e:
+                log.error("❌ 构建任务图失败: %s", e)
+                return FetchResult.FAILED
 
-                    if success:
-                        print("✅ 所有任务执行完成")
+            # 5. 执行任务图
+            log.debug("⚡ 开始执行任务图...")
+            try:
+                success = await scheduler.execute_graph(task_graph)
+                size_hints.save()
+                rate_hints.save()
 
-                        # 6. 移动结果到最终位置
-                        await self._finalize_output(temp_dir, task_graph)
+                version_task = task_graph.get_task(f"save_version_{self.item_id}")
+                if success:
+                    log.debug("✅ 所有任务执行完成")
+
+                    # 6. 移动结果到最终位置
+                    await self._finalize_output(temp_dir, task_graph)
+
+                    if version_task is not None and version_task.missing:
+                        # 选择性下载：完整的Preview任务有意不执行
+                        self.missing = version_task.missing
+                        log.info(
+                            "🧩 作品 %s 选择性下载完成（不带选择器重新运行时下载完整模型）",
+                            self.item_id,
+                        )
+                        return FetchResult.PARTIAL
+                    return FetchResult.COMPLETED
+
+                if version_task is not None and version_task.completed:
+                    # 模型已就位，只有不影响它的分支（如预览图）失败
+                    self.missing = version_task.missing
+                    await self._finalize_output(temp_dir, task_graph)
+                    log.warning(
+                        "🧩 作品 %s 部分完成，缺少 %d 个任务: %s（重新运行时只下载缺少的部分）",
+                        self.item_id,
+                        len(self.missing),
+                        ", ".join(self.missing),
+                    )
+                    return FetchResult.PARTIAL
 
-                        return True
-                    else:
-                        print("❌ 任务执行失败")
-                        return False
+                log.warning("❌ 任务执行失败")
+                return FetchResult.FAILED
 
-                except Exception as e:
-                    print(f"❌ 执行任务图失败: {e}")
-                    return False
+            except Exception as e:
+                log.error("❌ 执行任务图失败: %s", e)
+                return FetchResult.FAILED
 
         except Exception as e:
-            print(f"❌ 下载失败: {e}")
+            log.error("❌ 下载失败: %s", e)
+            return FetchResult.FAILED
+
+    def _selection_satisfied(self) -> bool:
+        """作品是否已是本次选择器的选择性下载结果（没有其他缺少的任务）"""
+        version = self.library.read_version(self.item_id)
+        if (
+            not version
+            or version.get("version") != SCRIPT_VERSION
+            or version.get("status") != "partial"
+            or not set(version.get("missing", []))
+            <= set(selective_deferred(self.item_id))
+        ):
+            return False
+        manifest_path = self.library.find(self.item_id) / "preview" / SELECTIVE_MANIFEST
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                patterns = json.load(f)["patterns"]
+        except (OSError, ValueError, KeyError):
             return False
+        return set(self.select) <= set(patterns)
+
+    def _resume_partial(self, temp_dir: Path):
+        """把上次部分完成的作品移回暂存目录，已有的文件在执行时直接跳过
+
+        Args:
+            temp_dir: 暂存目录
+        """
+        version = self.library.read_version(self.item_id)
+        if not version or version.get("status") != "partial":
+            return
+        item_dir = self.library.find(self.item_id)
+        if temp_dir.exists():
+            # 之前中断留下的暂存目录不如部分完成的作品完整
+            shutil.rmtree(temp_dir)
+        temp_dir.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(item_dir), str(temp_dir))
+        log.debug("🧩 已移回暂存目录: %s -> %s", item_dir.name, temp_dir)
+
+    @property
+    def staging_dir(self) -> Path:
+        """作品的暂存目录，位于输出目录下的 .staging 中"""
+        return self.output_dir / ".staging" / self.item_id
 
     async def _finalize_output(self, temp_dir: Path, task_graph: TaskGraph):
         """完成输出处理
@@ -134,138 +340,602 @@ class NizimaFetcher:
 
         if rename_task and rename_task.completed and rename_task.result:
             final_dir = rename_task.result
-            print(f"📁 最终输出目录: {final_dir}")
+            log.info("📁 最终输出目录: %s", final_dir)
         else:
             # 如果没有重命名任务，直接移动到默认位置
             final_dir = self.output_dir / self.item_id
             final_dir.parent.mkdir(parents=True, exist_ok=True)
 
             if final_dir.exists():
-                import shutil
-
                 shutil.rmtree(final_dir)
 
             shutil.move(str(temp_dir), str(final_dir))
-            print(f"📁 输出目录: {final_dir}")
+            log.info("📁 输出目录: %s", final_dir)
+
+        self.library.record(self.item_id, final_dir)
 
 
 async def fetch_multiple_items(
-    item_ids: List[str], output_dir: str = "models/nizima", max_concurrent: int = 3
+    item_ids: Union[Iterable[str], AsyncIterable[str]],
+    output_dir: str = "models/nizima",
+    max_concurrent: int = 3,
+    detail_cache: Optional[DetailCache] = None,
+    metrics_file: Optional[str] = None,
+    order: str = "fifo",
+    scope: Optional[CancelScope] = None,
+    details: Optional[Dict[str, Dict[str, Any]]] = None,
+    select: Optional[List[str]] = None,
 ) -> None:
     """批量下载多个作品
 
+    作品ID经有界队列交给固定数量的工作者，ID可以是列表，
+    也可以是惰性读取的（异步）迭代器，内存占用与ID数量无关。
+
     Args:
-        item_ids: 作品ID列表
+        item_ids: 作品ID列表或迭代器
         output_dir: 输出目录
         max_concurrent: 最大并发数
+        detail_cache: 共享的详情缓存
+        metrics_file: 结束时写入 OpenMetrics 文本文件的路径
+        order: 作品顺序（fifo / sjf / ljf），按预计下载字节数排序
+        scope: 本次运行的取消作用域，取消后不再开始新作品，进行中的作品立即停止
+        details: 运行计划中已解析的详情数据（作品ID -> 详情），这些作品不再查询详情
+        select: 预览模型的成员选择器，指定时每个作品只下载选中的成员
     """
-    print(f"🚀 开始并发下载 {len(item_ids)} 个作品")
-    print(f"📋 作品列表: {', '.join(item_ids)}")
-    print(f"🔧 最大并发数: {max_concurrent}")
-    print("=" * 80)
-
-    # 创建信号量控制并发数
-    semaphore = asyncio.Semaphore(max_concurrent)
-
-    async def download_single(item_id: str) -> bool:
-        """下载单个作品"""
-        async with semaphore:
-            # 检查是否请求关闭
-            if is_shutdown_requested():
-                print(f"🛑 跳过作品 {item_id}（用户请求中断）")
-                return False
+    scope = scope or CancelScope()
+    details = details or {}
+    if isinstance(item_ids, list):
+        log.info("🚀 开始并发下载 %d 个作品", len(item_ids))
+        log.debug("📋 作品列表: %s", ", ".join(item_ids))
+    else:
+        log.info("🚀 开始流式下载作品")
+    log.info("🔧 最大并发数: %d", max_concurrent)
+    if order != "fifo":
+        log.info("🔀 作品顺序: %s（每 %d 个作品排序一次）", order, ORDER_WINDOW)
+
+    bus.emit("batch_start", total=len(item_ids) if isinstance(item_ids, list) else None)
+
+    # 所有作品共享连接池和作品库索引
+    library = LibraryIndex(Path(output_dir))
+    session = create_session()
+    estimator = ItemSizeEstimator(
+        size_hints_for(Path(output_dir) / ".cache" / "sizes.json"),
+        library,
+        detail_cache,
+    )
 
-            print(f"\n🎯 开始处理作品: {item_id}")
-            try:
-                fetcher = NizimaFetcher(item_id, output_dir)
-                success = await fetcher.fetch()
-                if success:
-                    print(f"✅ 作品 {item_id} 下载成功")
-                    return True
-                else:
-                    print(f"❌ 作品 {item_id} 下载失败")
-                    return False
-            except KeyboardInterrupt:
-                print(f"🛑 作品 {item_id} 被用户中断")
-                return False
-            except Exception as e:
-                print(f"❌ 作品 {item_id} 下载异常: {e}")
+    async def estimate(batch: List[str]) -> Dict[str, Optional[int]]:
+        """预取一批作品的详情（存入详情缓存，下载时直接命中）并估算字节数"""
+        semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+        async def prefetch(item_id: str):
+            if detail_cache is None or estimator.up_to_date(item_id):
+                return
+            async with semaphore:
+                try:
+                    await detail_cache.get(item_id, session)
+                except Exception as e:
+                    # 下载时会重新请求并记录失败
+                    log.debug("⚠️ 预取作品 %s 的详情失败: %s", item_id, e)
+
+        with scope.child():
+            await asyncio.gather(*(prefetch(item_id) for item_id in batch))
+        return {item_id: estimator.estimate(item_id) for item_id in batch}
+
+    started = time.monotonic()
+    completion_times: List[float] = []  # 每个作品从批量开始到完成的秒数
+    cancelled: List[str] = []
+    partial: List[str] = []
+
+    async def download_single(item_id: str) -> Optional[bool]:
+        """下载单个作品，部分完成和取消的作品单独统计，返回None"""
+        log.debug("🎯 开始处理作品: %s", item_id)
+        try:
+            fetcher = NizimaFetcher(
+                item_id,
+                output_dir,
+                session,
+                library,
+                detail_cache,
+                scope,
+                details.get(item_id),
+                select,
+            )
+            result = await fetcher.fetch()
+            if result is FetchResult.CANCELLED:
+                cancelled.append(item_id)
+                return None
+            if result is FetchResult.COMPLETED:
+                log.info("✅ 作品 %s 下载成功", item_id)
+                return True
+            elif result is FetchResult.PARTIAL:
+                partial.append(item_id)
+                return None
+            else:
+                log.warning("❌ 作品 %s 下载失败", item_id)
                 return False
+        except Exception as e:
+            log.error("❌ 作品 %s 下载异常: %s", item_id, e)
+            return False
+        finally:
+            if not scope.cancel_called:
+                completion_times.append(time.monotonic() - started)
 
     # 执行并发下载
-    results = await asyncio.gather(
-        *[download_single(item_id) for item_id in item_ids], return_exceptions=True
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
+    try:
+        successful, failed_items = await run_workers(
+            ordered_ids(item_ids, order, estimate),
+            download_single,
+            max_concurrent,
+            lambda: scope.cancel_called,
+        )
+    finally:
+        lag_monitor.cancel()
+        await session.close()
+
+    # 输出总结
+    total = successful + len(partial) + len(failed_items)
+    log.info("=" * 80)
+    log.info("📊 批量下载完成")
+    log.info("✅ 成功: %d/%d 个作品", successful, total)
+    if partial:
+        log.warning(
+            "🧩 部分完成: %d 个作品（重新运行时只补全缺少的部分）", len(partial)
+        )
+    if cancelled:
+        log.warning("🛑 取消: %d 个进行中的作品（暂存目录已保留）", len(cancelled))
+
+    if completion_times:
+        log.info(
+            "⏱️ 作品完成时间: 均值 %.1f 秒, p95 %.1f 秒",
+            statistics.fmean(completion_times),
+            _p95(completion_times),
+        )
+    if memory_budget.limit:
+        log.info(
+            "🧮 内存预算: 峰值 %.1f / %.1f MB，%d 个任务排队等待",
+            memory_budget.peak / (1024 * 1024),
+            memory_budget.limit / (1024 * 1024),
+            metrics.admission_waits.get(),
+        )
+
+    if failed_items:
+        log.warning("❌ 失败: %d 个作品", len(failed_items))
+        log.warning("失败列表: %s", ", ".join(failed_items))
+    elif not scope.cancel_called:
+        log.info("🎉 所有作品下载完成!")
+
+    if detail_cache is not None:
+        log.info("🗂️ %s", detail_cache.report())
+
+    if metrics_file:
+        metrics.write_textfile(Path(metrics_file))
+        log.info("📈 指标已写入: %s", metrics_file)
+
+
+async def plan_items(
+    item_ids: Union[Iterable[str], AsyncIterable[str]],
+    output_dir: str,
+    detail_cache: DetailCache,
+    order: str = "fifo",
+    max_concurrent: int = 3,
+    plan_file: Optional[str] = None,
+) -> Plan:
+    """生成运行计划并输出汇总，不下载任何文件
+
+    Args:
+        item_ids: 作品ID列表或迭代器
+        output_dir: 输出目录
+        detail_cache: 详情缓存，规划时获取的详情也写入缓存
+        order: 作品顺序
+        max_concurrent: 执行时的最大并发数，用于估算耗时
+        plan_file: 保存计划的文件路径，为空时不保存
+
+    Returns:
+        Plan: 运行计划
+    """
+    cache_dir = Path(output_dir) / ".cache"
+    planner = Planner(
+        output_dir, detail_cache, size_hints_for(cache_dir / "sizes.json")
     )
+    async with create_session() as session:
+        plan = await planner.plan(item_ids, session, order, PREFETCH_CONCURRENCY)
 
-    # 统计结果
-    successful = 0
-    failed_items = []
+    summary = plan.summary(
+        rate_hints_for(cache_dir / "rates.json"), max_concurrent, TASK_CONCURRENCY
+    )
+    log_plan_summary(summary)
+    if plan_file:
+        plan.save(Path(plan_file), summary)
+        log.info("💾 运行计划已保存: %s（使用 --run-plan 执行）", plan_file)
+    return plan
+
+
+async def retry_failed_items(
+    journal: FailureJournal,
+    output_dir: str = "models/nizima",
+    max_concurrent: int = 3,
+    detail_cache: Optional[DetailCache] = None,
+    metrics_file: Optional[str] = None,
+    order: str = "fifo",
+    scope: Optional[CancelScope] = None,
+) -> None:
+    """重试失败日志中冷却期已过的作品
 
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            print(f"❌ 作品 {item_ids[i]} 发生异常: {result}")
-            failed_items.append(item_ids[i])
-        elif result:
-            successful += 1
-        else:
-            failed_items.append(item_ids[i])
+    失败作品的暂存目录会被保留，重试时已完成的任务直接跳过，
+    只有失败的任务及其后续任务会重新执行
 
-    # 输出总结
-    print("\n" + "=" * 80)
-    print("📊 批量下载完成")
-    print("=" * 80)
-    print(f"✅ 成功: {successful}/{len(item_ids)} 个作品")
+    Args:
+        journal: 失败日志
+        output_dir: 输出目录
+        max_concurrent: 最大并发数
+        detail_cache: 共享的详情缓存
+        metrics_file: 结束时写入 OpenMetrics 文本文件的路径
+        order: 作品顺序（fifo / sjf / ljf）
+        scope: 本次运行的取消作用域
+    """
+    ready, waiting = journal.retry_candidates()
+
+    if waiting:
+        log.info("⏳ %d 个作品仍在冷却期:", len(waiting))
+        for item_id, remaining in sorted(waiting.items(), key=lambda x: x[1]):
+            log.info("  - %s: 还需等待 %.0f 分钟", item_id, remaining / 60)
+
+    if not ready:
+        log.info("✅ 没有需要重试的作品")
+        return
+
+    log.info("🔁 重试 %d 个作品:", len(ready))
+    for item_id, task_ids in ready.items():
+        log.info("  - %s: %s", item_id, ", ".join(task_ids))
+
+    await fetch_multiple_items(
+        list(ready),
+        output_dir,
+        max_concurrent,
+        detail_cache,
+        metrics_file,
+        order,
+        scope,
+    )
 
-    if failed_items:
-        print(f"❌ 失败: {len(failed_items)} 个作品")
-        print(f"失败列表: {', '.join(failed_items)}")
-    else:
-        print("🎉 所有作品下载完成!")
+
+def _p95(values: List[float]) -> float:
+    """线性插值的95分位数"""
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=20, method="inclusive")[-1]
+
+
+def add_detail_cache_arguments(parser: "argparse.ArgumentParser"):
+    """添加详情缓存相关的命令行参数"""
+    parser.add_argument(
+        "--cache-dir", help="详情缓存目录（默认 <output>/.cache/detail）"
+    )
+    parser.add_argument(
+        "--detail-ttl",
+        type=float,
+        default=DEFAULT_TTL / 3600,
+        help="详情缓存有效期（小时），过期后向API重新验证",
+    )
+    parser.add_argument(
+        "--offline", action="store_true", help="只使用缓存的详情数据，不请求详情API"
+    )
+
+
+def create_detail_cache(args: "argparse.Namespace") -> DetailCache:
+    """根据命令行参数创建详情缓存"""
+    cache_dir = args.cache_dir or Path(args.output) / ".cache" / "detail"
+    return DetailCache(Path(cache_dir), args.detail_ttl * 3600, args.offline)
+
+
+def add_memory_arguments(parser: "argparse.ArgumentParser"):
+    """添加内存预算相关的命令行参数"""
+    parser.add_argument(
+        "--memory-limit",
+        type=float,
+        default=DEFAULT_LIMIT / (1024 * 1024),
+        help="执行中的任务占用内存的总上限（MB），任务按预期大小申请，"
+        "不足时大任务等待、小任务先执行，0表示不限制",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=DEFAULT_BUDGET / (1024 * 1024),
+        help="任务之间在内存中传递的产出总大小上限（MB），超出时溢写到磁盘，0表示不在内存中传递",
+    )
+
+
+def apply_memory_arguments(args: "argparse.Namespace"):
+    """按命令行参数设置进程内共享的内存预算和产出仓库预算"""
+    memory_budget.limit = int(args.memory_limit * 1024 * 1024)
+    artifact_store.budget = int(args.memory_budget * 1024 * 1024)
+
+
+def _item_id_arg(value: str) -> str:
+    """命令行作品ID：只接受数字"""
+    import argparse
+
+    if not is_item_id(value):
+        raise argparse.ArgumentTypeError(f"无效的作品ID: {value!r}")
+    return value
+
+
+def _id_source(
+    args: "argparse.Namespace",
+) -> Union[List[str], AsyncIterable[str]]:
+    """命令行作品ID，指定 --id-file 时惰性读取文件中的ID"""
+    if args.id_file:
+        return _chain_ids(args.item_ids, read_ids(args.id_file))
+    return args.item_ids
+
+
+async def _chain_ids(
+    item_ids: List[str], rest: AsyncIterable[str]
+) -> AsyncIterator[str]:
+    """先输出命令行ID，再输出文件中的ID"""
+    for item_id in item_ids:
+        yield item_id
+    async for item_id in rest:
+        yield item_id
+
+
+# 子命令 -> 模块名，模块需提供 async main(argv)
+SUBCOMMANDS = {
+    "daemon": "daemon",
+    "crawl": "crawl",
+    "inspect": "inspect_archive",
+    "benchmark": "benchmark.e2e",
+    "bench": "benchmark.micro",
+    "simulate": "benchmark.simulate",
+}
 
 
 async def main():
     """主函数"""
     import argparse
 
-    # 设置信号处理器
-    setup_signal_handlers()
+    # 子命令：fetch_nizima.py <command> [args...]
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        import importlib
+
+        module = importlib.import_module(SUBCOMMANDS[sys.argv[1]])
+        await module.main(sys.argv[2:])
+        return
 
     parser = argparse.ArgumentParser(description="Nizima Live2D模型下载器 v4.0")
-    parser.add_argument("item_ids", nargs="+", help="作品ID列表")
+    parser.add_argument("item_ids", nargs="*", type=_item_id_arg, help="作品ID列表")
+    parser.add_argument(
+        "--id-file",
+        help="从文件流式读取作品ID（每行一个，支持 # 注释），'-' 表示标准输入",
+    )
     parser.add_argument(
         "--output", "-o", default="../../models/nizima", help="输出目录"
     )
     parser.add_argument("--concurrent", "-c", type=int, default=3, help="最大并发数")
+    parser.add_argument(
+        "--order",
+        choices=ORDERS,
+        default="fifo",
+        help="批量下载的作品顺序：fifo 按输入顺序，sjf 预计小的先下载（平均完成时间短），"
+        "ljf 大的先下载（总耗时短）",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="只规划不下载：解析详情、去掉已满足的任务，输出下载和写入字节数、各类任务数和预计耗时",
+    )
+    parser.add_argument(
+        "--save-plan",
+        help="规划并把运行计划保存到该文件（不下载），之后用 --run-plan 执行",
+    )
+    parser.add_argument(
+        "--run-plan", help="执行保存的运行计划，使用计划中的详情数据和输出目录"
+    )
+    parser.add_argument(
+        "--journal", help="失败日志文件（默认 <output>/fail_journal.jsonl）"
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="重试失败日志中冷却期已过的作品，只重新执行失败的任务",
+    )
+    parser.add_argument(
+        "--trace",
+        help="把任务时间线写入该文件（Chrome trace-event JSON，可用Perfetto查看）",
+    )
+    parser.add_argument(
+        "--metrics-file", help="结束时把运行指标写入该 OpenMetrics 文本文件"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, help="运行期间在该本地端口提供 /metrics 端点"
+    )
+    parser.add_argument(
+        "--profile",
+        help="剖析运行：检测阻塞事件循环的任务，把排名报告写入该JSON文件",
+    )
+    parser.add_argument(
+        "--profile-threshold",
+        type=float,
+        default=50,
+        help="单个回调超过该时长（毫秒）时记录为阻塞",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="剖析时启用 tracemalloc，统计各任务的内存分配",
+    )
+    parser.add_argument(
+        "--profile-cpu",
+        action="store_true",
+        help="剖析时启用 cProfile，同时写出同名的 .prof 文件",
+    )
+    parser.add_argument(
+        "--select",
+        action="append",
+        metavar="PATTERN",
+        help="只下载预览模型中匹配的成员（通配符如 '*.model3.json'，"
+        "或 role:Textures[0] 按 model3.json 的引用选择），可重复；"
+        "作品记为部分完成，之后不带该选项运行时补全",
+    )
+    parser.add_argument(
+        "--catalogue",
+        action="store_true",
+        help="编目模式：只下载 model3.json、cdi3.json 和第一张纹理，"
+        "相当于 " + " ".join(f"--select '{p}'" for p in CATALOGUE_SELECTION),
+    )
+    add_detail_cache_arguments(parser)
+    add_memory_arguments(parser)
+    add_logging_arguments(parser)
 
     args = parser.parse_args()
+    if args.run_plan:
+        if args.item_ids or args.id_file or args.retry_failed:
+            parser.error(
+                "--run-plan 不能与作品ID、--id-file 或 --retry-failed 同时使用"
+            )
+    elif not args.item_ids and not args.id_file and not args.retry_failed:
+        parser.error("需要提供作品ID、--id-file、--retry-failed 或 --run-plan")
+    elif args.retry_failed and (args.plan or args.save_plan):
+        parser.error("--plan / --save-plan 需要提供作品ID或 --id-file")
+    select = (args.select or []) + (list(CATALOGUE_SELECTION) if args.catalogue else [])
+    if select and (args.run_plan or args.plan or args.save_plan or args.retry_failed):
+        parser.error("--select / --catalogue 只能用于直接下载作品ID或 --id-file")
+    shutdown_logging = setup_logging(args.verbose, args.quiet, args.log_json, bus)
+    plan = None
+    if args.run_plan:
+        # 计划记录了输出目录，执行时使用同一个目录
+        plan = Plan.load(Path(args.run_plan))
+        args.output = str(plan.output_dir)
+    detail_cache = create_detail_cache(args)
+    apply_memory_arguments(args)
+    journal = FailureJournal(
+        Path(args.journal or Path(args.output) / "fail_journal.jsonl")
+    )
+    detach_journal = journal.attach(bus)
+    tracer = Tracer() if args.trace else None
+    detach_tracer = tracer.attach(bus) if tracer else None
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = await start_metrics_server(args.metrics_port)
+    profiler = None
+    if args.profile:
+        profiler = LoopProfiler(
+            args.profile_threshold / 1000, args.profile_memory, args.profile_cpu
+        )
+        detach_profiler = profiler.attach(bus)
+        profiler.start()
+
+    # Ctrl+C 取消本次运行：进行中的下载立即停止，.part 文件和暂存目录保留
+    run_scope = CancelScope()
+    remove_signal_handlers = install_signal_handlers(run_scope)
 
     try:
-        if len(args.item_ids) == 1:
+        if plan is not None:
+            log.info(
+                "📋 执行运行计划 %s（创建于 %s）: %d 个作品",
+                args.run_plan,
+                plan.created_at,
+                len(plan.item_ids()),
+            )
+            await fetch_multiple_items(
+                plan.item_ids(),
+                args.output,
+                args.concurrent,
+                detail_cache,
+                args.metrics_file,
+                "fifo",  # 规划时已按 --order 排列
+                run_scope,
+                plan.details(),
+            )
+            if run_scope.cancel_called:
+                log.warning("🛑 运行计划被用户中断，重新执行同一个计划时继续")
+
+        elif args.plan or args.save_plan:
+            await plan_items(
+                _id_source(args),
+                args.output,
+                detail_cache,
+                args.order,
+                args.concurrent,
+                args.save_plan,
+            )
+
+        elif args.retry_failed:
+            await retry_failed_items(
+                journal,
+                args.output,
+                args.concurrent,
+                detail_cache,
+                args.metrics_file,
+                args.order,
+                run_scope,
+            )
+
+        elif len(args.item_ids) == 1 and not args.id_file:
             # 单个作品下载
-            fetcher = NizimaFetcher(args.item_ids[0], args.output)
-            success = await fetcher.fetch()
-
-            if is_shutdown_requested():
-                print("\n🛑 下载被用户中断")
-            elif success:
-                print(
-                    f"\n🎉 下载完成! 文件保存在: {Path(args.output) / args.item_ids[0]}"
+            fetcher = NizimaFetcher(
+                args.item_ids[0],
+                args.output,
+                detail_cache=detail_cache,
+                scope=run_scope,
+                select=select or None,
+            )
+            result = await fetcher.fetch()
+            log.info("🗂️ %s", detail_cache.report())
+            if args.metrics_file:
+                metrics.write_textfile(Path(args.metrics_file))
+
+            if result is FetchResult.CANCELLED:
+                log.warning("🛑 下载被用户中断")
+                log.warning("💡 提示：已下载的部分会被保留，重新运行时继续")
+            elif result is FetchResult.COMPLETED:
+                log.info(
+                    "🎉 下载完成! 文件保存在: %s", Path(args.output) / args.item_ids[0]
                 )
+            elif result is FetchResult.PARTIAL:
+                log.warning("🧩 部分完成，重新运行时只补全缺少的部分")
             else:
-                print("\n❌ 下载失败")
+                log.warning("❌ 下载失败")
         else:
-            # 批量下载
+            # 批量下载，指定 --id-file 时惰性读取ID
             await fetch_multiple_items(
-                list(set(args.item_ids)), args.output, args.concurrent
+                _id_source(args),
+                args.output,
+                args.concurrent,
+                detail_cache,
+                args.metrics_file,
+                args.order,
+                run_scope,
+                select=select or None,
             )
 
-            if is_shutdown_requested():
-                print("\n🛑 批量下载被用户中断")
-                print("💡 提示：已完成的下载会被保留，未完成的可以重新运行")
-
-    except KeyboardInterrupt:
-        print("\n🛑 下载被用户中断")
-        print("💡 提示：系统已安全清理，可以重新运行")
+            if run_scope.cancel_called:
+                log.warning("🛑 批量下载被用户中断")
+                log.warning("💡 提示：已完成的下载会被保留，未完成的可以重新运行")
+
+    finally:
+        remove_signal_handlers()
+        if profiler:
+            profiler.stop()
+            detach_profiler()
+            report = profiler.write(Path(args.profile))
+            profiler.log_summary(report)
+            log.info("🔬 剖析报告已写入: %s", args.profile)
+        detach_journal()
+        journal.close()
+        if metrics_server:
+            await metrics_server.cleanup()
+        if tracer:
+            detach_tracer()
+            tracer.write(Path(args.trace))
+            log.info(
+                "🧭 任务时间线已写入: %s（共 %d 个任务区间）",
+                args.trace,
+                len(tracer.spans),
+            )
+        shutdown_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,259 @@
+"""
+流式作品ID摄取
+
+惰性读取ID列表，经有界队列交给固定数量的工作者处理，
+内存占用与ID列表长度无关
+"""
+
+import asyncio
+import logging
+import sys
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable
+from typing import List, Optional, Tuple, Union
+
+log = logging.getLogger("nizima.ingest")
+
+# 队列长度为工作者数的倍数，生产者最多领先这么多个ID
+QUEUE_FACTOR = 2
+
+# 每次从文件读取的字节数提示
+READ_BATCH_BYTES = 64 * 1024
+
+# 作品顺序：fifo 保持输入顺序，sjf 预计字节数小的先下载（平均完成时间最短），
+# ljf 大的先下载（总耗时最短）
+ORDERS = ("fifo", "sjf", "ljf")
+
+# 排序时最多缓冲的ID数，流式输入按窗口分段排序
+ORDER_WINDOW = 200
+
+# 存入位图的最大数字ID（位图最多 8MB），更大的ID退回普通set
+MAX_BITMAP_ID = (1 << 26) - 1
+
+
+class IdSet:
+    """紧凑的作品ID去重集合
+
+    规范的数字ID（不超过 MAX_BITMAP_ID、没有前导零）存入位图
+    （每个ID占1 bit，100万个ID约125KB），其余ID按原字符串存入普通set
+    """
+
+    def __init__(self):
+        """初始化集合"""
+        self._bits = bytearray()
+        self._others = set()
+        self._count = 0
+
+    def add(self, item_id: str) -> bool:
+        """加入ID
+
+        Args:
+            item_id: 作品ID
+
+        Returns:
+            bool: 是否为新ID
+        """
+        n = _bitmap_id(item_id)
+        if n is None:
+            if item_id in self._others:
+                return False
+            self._others.add(item_id)
+            self._count += 1
+            return True
+
+        index, mask = n >> 3, 1 << (n & 7)
+        if index >= len(self._bits):
+            size = min(max(index + 1, 2 * len(self._bits)), (MAX_BITMAP_ID >> 3) + 1)
+            self._bits.extend(bytes(size - len(self._bits)))
+        if self._bits[index] & mask:
+            return False
+        self._bits[index] |= mask
+        self._count += 1
+        return True
+
+    def __contains__(self, item_id: str) -> bool:
+        n = _bitmap_id(item_id)
+        if n is None:
+            return item_id in self._others
+        index = n >> 3
+        return index < len(self._bits) and bool(self._bits[index] & (1 << (n & 7)))
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def is_item_id(item_id: str) -> bool:
+    """是否为有效的作品ID（ASCII数字），ID会用于拼接暂存目录和输出目录的路径"""
+    return item_id.isascii() and item_id.isdigit()
+
+
+def _bitmap_id(item_id: str) -> Optional[int]:
+    """可以存入位图的ID对应的整数，否则返回None"""
+    if not is_item_id(item_id):
+        return None
+    if item_id[0] == "0" and item_id != "0":
+        return None  # "0123" 与 "123" 是不同的ID
+    n = int(item_id)
+    return n if n <= MAX_BITMAP_ID else None
+
+
+def parse_id_line(line: str) -> List[str]:
+    """解析ID文件中的一行，支持空白分隔和 # 注释
+
+    Args:
+        line: 文件中的一行
+
+    Returns:
+        List[str]: 该行包含的作品ID
+    """
+    return line.split("#", 1)[0].split()
+
+
+async def read_ids(path: str) -> AsyncIterator[str]:
+    """惰性读取ID文件
+
+    文件按批读取，读取在线程中进行，不阻塞事件循环。
+
+    Args:
+        path: ID文件路径，"-" 表示标准输入
+
+    Yields:
+        str: 作品ID
+    """
+    stream = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        while True:
+            lines = await asyncio.to_thread(stream.readlines, READ_BATCH_BYTES)
+            if not lines:
+                break
+            for line in lines:
+                for item_id in parse_id_line(line):
+                    if is_item_id(item_id):
+                        yield item_id
+                    else:
+                        log.warning("⚠️ 跳过无效的作品ID: %r", item_id)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+async def as_async(source: Union[Iterable[str], AsyncIterable[str]]):
+    """把同步可迭代对象包装为异步迭代器"""
+    if hasattr(source, "__aiter__"):
+        async for item in source:
+            yield item
+    else:
+        for item in source:
+            yield item
+
+
+async def ordered_ids(
+    source: Union[Iterable[str], AsyncIterable[str]],
+    order: str,
+    estimate: Callable[[List[str]], Awaitable[Dict[str, Optional[int]]]],
+    window: int = ORDER_WINDOW,
+) -> AsyncIterator[str]:
+    """按预计字节数排列作品ID
+
+    每读取 window 个ID排序一次，内存占用与ID总数无关；
+    无法估算的作品按已估算作品的中位数处理
+
+    Args:
+        source: 作品ID来源
+        order: ORDERS 之一
+        estimate: 估算一批作品字节数的协程函数，返回 作品ID -> 字节数（None表示未知）
+        window: 排序窗口大小
+
+    Yields:
+        str: 排序后的作品ID
+    """
+    if order == "fifo":
+        async for item_id in as_async(source):
+            yield item_id
+        return
+
+    async def flush(batch: List[str]) -> List[str]:
+        sizes = await estimate(batch)
+        known = sorted(size for size in sizes.values() if size is not None)
+        default = known[len(known) // 2] if known else 0
+        key = {
+            item_id: sizes.get(item_id) if sizes.get(item_id) is not None else default
+            for item_id in batch
+        }
+        return sorted(batch, key=key.get, reverse=order == "ljf")
+
+    batch: List[str] = []
+    async for item_id in as_async(source):
+        batch.append(item_id)
+        if len(batch) >= window:
+            for ordered in await flush(batch):
+                yield ordered
+            batch = []
+    if batch:
+        for ordered in await flush(batch):
+            yield ordered
+
+
+async def run_workers(
+    source: Union[Iterable[str], AsyncIterable[str]],
+    handler: Callable[[str], Awaitable[Optional[bool]]],
+    workers: int,
+    should_stop: Callable[[], bool] = lambda: False,
+) -> Tuple[int, List[str]]:
+    """生产者/消费者方式处理作品ID
+
+    生产者去重后把ID放入有界队列，队列满时阻塞读取；
+    固定数量的工作者逐个处理，处理完的作品不保留任何引用。
+
+    Args:
+        source: 作品ID来源（列表、生成器或异步迭代器）
+        handler: 处理单个作品的协程函数，返回是否成功；返回None表示既不计入成功
+            也不计入失败（如被取消或部分完成，由处理函数自行统计）
+        workers: 工作者数量
+        should_stop: 返回True时停止读取新的ID，已排队的ID也不再处理
+
+    Returns:
+        Tuple[int, List[str]]: (成功数, 失败ID列表)
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * QUEUE_FACTOR)
+    seen = IdSet()
+    successful = 0
+    failed: List[str] = []
+
+    async def produce():
+        async for item_id in as_async(source):
+            if should_stop():
+                break
+            if seen.add(item_id):
+                await queue.put(item_id)
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def consume():
+        nonlocal successful
+        while True:
+            item_id = await queue.get()
+            if item_id is None:
+                return
+            if should_stop():
+                continue
+            try:
+                ok = await handler(item_id)
+            except Exception as e:
+                log.error("❌ 作品 %s 发生异常: %s", item_id, e)
+                ok = False
+            if ok:
+                successful += 1
+            elif ok is not None:
+                failed.append(item_id)
+
+    consumers = [asyncio.create_task(consume()) for _ in range(workers)]
+    try:
+        await produce()
+    except BaseException:
+        # 读取ID失败（或被取消）时停止工作者，调用方随后会关闭共享会话
+        for task in consumers:
+            task.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+        raise
+    await asyncio.gather(*consumers)
+    return successful, failed
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+远程归档查看
+
+只用 Range 请求下载预览模型归档的末尾和中央目录（按位置XOR就地解密），
+输出模型名称、成员列表和大小，不下载整个文件：
+
+    fetch_nizima.py inspect 12345 [67890 ...] [--json]
+    fetch_nizima.py inspect https://.../12345/xxxx.lee
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加当前目录到Python路径，以支持相对导入
+sys.path.insert(0, str(Path(__file__).parent))
+
+import aiohttp
+
+import config
+from core.archive import ArchiveError, inspect_remote
+from core.log import add_logging_arguments, setup_logging
+from core.session import create_session
+from models import AssetsInfo
+from utils import DetailError, fetch_detail
+
+log = logging.getLogger("nizima.inspect")
+
+
+async def preview_url(item_id: str, session: aiohttp.ClientSession) -> str:
+    """作品预览模型归档的URL
+
+    Args:
+        item_id: 作品ID
+        session: HTTP会话
+
+    Returns:
+        str: 归档URL
+
+    Raises:
+        DetailError: 作品无效或没有预览模型
+    """
+    assets = AssetsInfo.from_api_response(await fetch_detail(item_id, session))
+    if not assets.preview_live2d_zip:
+        raise DetailError("no_preview", f"作品 {item_id} 没有预览模型")
+    file_name = assets.preview_live2d_zip["fileName"]
+    return f"{config.STORAGE_BASE}/{item_id}/{file_name}"
+
+
+async def inspect_target(target: str, session: aiohttp.ClientSession) -> Dict[str, Any]:
+    """查看一个作品ID或归档URL
+
+    Args:
+        target: 作品ID或URL
+        session: HTTP会话
+
+    Returns:
+        Dict[str, Any]: 归档信息（RemoteArchive.to_dict），失败时包含 error
+    """
+    try:
+        url = target if "://" in target else await preview_url(target, session)
+        archive = await inspect_remote(url, session)
+    except (ArchiveError, DetailError, aiohttp.ClientError) as e:
+        return {"target": target, "error": str(e)}
+    return {"target": target, **archive.to_dict()}
+
+
+def print_report(info: Dict[str, Any]):
+    """打印一个归档的信息"""
+    if "error" in info:
+        print(f"❌ {info['target']}: {info['error']}")
+        return
+    members = info["members"]
+    print(f"📦 {info['target']}: {info['model_name']}")
+    print(
+        f"  {len(members)} 个文件，解压后 {sum(m['size'] for m in members):,} 字节，"
+        f"归档 {info['size']:,} 字节{'（XOR加密）' if info['encrypted'] else ''}"
+    )
+    print(
+        f"  {info['requests']} 次 Range 请求，下载 {info['bytes_fetched']:,} 字节 "
+        f"({info['bytes_fetched'] / info['size']:.1%})"
+    )
+    for member in members:
+        print(f"  {member['size']:>12,}  {member['name']}")
+
+
+async def main(argv: List[str] = None):
+    """查看子命令入口"""
+    parser = argparse.ArgumentParser(
+        prog="fetch_nizima.py inspect",
+        description="只下载末尾和中央目录，查看远程预览模型归档的内容",
+    )
+    parser.add_argument("targets", nargs="+", help="作品ID或归档URL")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    shutdown_logging = setup_logging(args.verbose, args.quiet, args.log_json)
+
+    try:
+        async with create_session() as session:
+            results = await asyncio.gather(
+                *(inspect_target(target, session) for target in args.targets)
+            )
+    finally:
+        shutdown_logging()
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for info in results:
+            print_report(info)
+    if any("error" in info for info in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
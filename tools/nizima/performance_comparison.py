@@ -3,6 +3,9 @@
 性能对比测试
 
 比较新架构与旧架构的性能差异
+
+依赖线上API，结果不可复现；可复现的离线基准测试见 benchmark/e2e.py
+（fetch_nizima.py benchmark）
 """
 
 import asyncio
@@ -0,0 +1,15 @@
+"""
+Nizima本地替身服务器
+
+在本地模拟作品详情API和存储路径，用于离线测试、故障注入和基准测试
+"""
+
+from .faults import FaultServer, load_scenario
+from .server import StandinServer, SyntheticCatalog
+
+__all__ = [
+    "FaultServer",
+    "load_scenario",
+    "StandinServer",
+    "SyntheticCatalog",
+]
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+故障注入替身服务器
+
+按场景文件（JSON）模拟不可靠的存储和导出接口，用于测试下载的重试和退避：
+- GET  /storage/{item_id}/{fileName}：确定性的随机内容
+- POST /api/items/{item_content_id}/download：返回指向存储路径的 downloadUrl
+
+可注入的故障：
+- latency: 每个请求的延迟分布（fixed / uniform / lognormal）
+- bandwidth_kbps: 每个连接的带宽上限
+- status: 返回指定状态码（如 429 + Retry-After、5xx 突发）
+- reset: 发送部分响应体后断开连接
+- slow_first_byte: 发送响应头后延迟很久才发送第一个字节
+- stall: 发送部分响应体后保持连接但停止发送（delay 秒后断开）
+- trickle: 发送部分响应体后降到极低的速度（kbps）
+- truncate: 响应体被截断，Content-Length 与截断后的长度一致（传输层看不出异常）
+- login_page: 导出接口返回HTML登录页
+
+存储接口支持 Range 请求（返回 206），用于测试断点续传；
+场景的 client 字段覆盖 DownloadTask 的停滞检测参数（如 idle_timeout），
+让停滞场景不必等待默认的几十秒。payload 为 "archive" 时存储内容是
+XOR加密的ZIP（与预览模型归档相同），下载任务按归档检查完整性。
+
+场景文件示例（standin/scenarios/ 下有完整的一组）：
+
+    {
+      "description": "一半的文件第一次下载到一半时连接被重置",
+      "downloads": 12,
+      "size_kb": 256,
+      "faults": [{"kind": "reset", "ratio": 0.5, "attempts": [1], "at": 0.5}]
+    }
+
+故障通过 ratio（受影响路径的比例，按路径哈希确定）和 attempts（对该路径的
+第几次请求生效）选择，或者用 burst 指定前N个请求全部生效；结果可复现。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import math
+import random
+import time
+import zipfile
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# 场景文件目录
+SCENARIOS_DIR = Path(__file__).parent / "scenarios"
+
+# 发送响应体的分块大小
+CHUNK_SIZE = 16 * 1024
+
+# trickle 故障降速后的分块大小
+TRICKLE_CHUNK_SIZE = 1024
+
+LOGIN_PAGE = "<html><head><title>Login | nizima</title></head><body>login</body></html>"
+
+
+def load_scenario(path: Path) -> Dict[str, Any]:
+    """读取场景文件，补全默认值
+
+    Args:
+        path: 场景文件路径
+
+    Returns:
+        Dict[str, Any]: 场景配置，name 默认为文件名
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        scenario = json.load(f)
+    scenario.setdefault("name", path.stem)
+    scenario.setdefault("seed", 0)
+    scenario.setdefault("downloads", 8)
+    scenario.setdefault("size_kb", 256)
+    scenario.setdefault("export_ratio", 0.0)
+    scenario.setdefault("concurrency", 4)
+    scenario.setdefault("faults", [])
+    scenario.setdefault("expect", {})
+    scenario.setdefault("client", {})
+    scenario.setdefault("payload", "random")
+    return scenario
+
+
+def _range_start(header: Optional[str]) -> Optional[int]:
+    """解析 Range 请求头（只支持 bytes=start- 形式），不是续传请求时返回None"""
+    if not header or not header.startswith("bytes="):
+        return None
+    first, _, last = header[len("bytes=") :].partition("-")
+    if last or not first.isdigit():
+        return None
+    return int(first)
+
+
+def _fraction(seed: int, key: str) -> float:
+    """把 (seed, key) 映射到 [0, 1) 区间"""
+    digest = hashlib.blake2b(f"{seed}:{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+class FaultServer:
+    """故障注入替身服务器
+
+    用法:
+        server = FaultServer(load_scenario(path))
+        base_url = await server.start()
+        ...
+        await server.stop()
+        print(server.wasted_bytes())
+    """
+
+    def __init__(self, scenario: Dict[str, Any]):
+        """初始化服务器
+
+        Args:
+            scenario: 场景配置（load_scenario 的返回值）
+        """
+        self.scenario = scenario
+        self.seed = scenario["seed"]
+        self.size = int(scenario["size_kb"] * 1024)
+        self.stats: Counter = Counter()  # 按响应类型统计请求数
+        self.bytes_sent = 0  # 全部响应体字节数（含中断的部分）
+        self.completed: Dict[str, int] = {}  # 完整发送过的路径 -> 大小
+        self.retry_after_violations = 0  # 未等待 Retry-After 就重新请求的次数
+        self._attempts: Counter = Counter()  # 路径 -> 请求次数
+        self._target_counts: Counter = Counter()  # 目标类型 -> 请求次数
+        self._retry_not_before: Dict[str, float] = {}
+        self._rng = random.Random(self.seed)
+        self._base_url = ""
+        self._runner: Optional[web.AppRunner] = None
+
+    def create_app(self) -> web.Application:
+        """创建aiohttp应用"""
+        app = web.Application()
+        app.router.add_get("/storage/{item_id}/{name}", self._storage)
+        app.router.add_post("/api/items/{content_id}/download", self._export)
+        return app
+
+    def payload(self, path: str) -> bytes:
+        """路径对应的确定性内容"""
+        data = random.Random(f"{self.seed}:{path}").randbytes(self.size)
+        if self.scenario["payload"] != "archive":
+            return data
+        from core.archive import xor_at
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+            archive.writestr("model/texture_00.png", data)
+            archive.writestr("model/model.model3.json", "{}")
+        return xor_at(buffer.getvalue())
+
+    def wasted_bytes(self) -> int:
+        """发送但没有成为完整下载的字节数"""
+        return self.bytes_sent - sum(self.completed.values())
+
+    def _pick_fault(self, target: str, path: str, attempt: int) -> Optional[Dict]:
+        """选择对本次请求生效的故障"""
+        index = self._target_counts[target]
+        for fault in self.scenario["faults"]:
+            if fault.get("target", "storage") != target:
+                continue
+            if "burst" in fault:
+                start = fault.get("start", 0)
+                if start <= index < start + fault["burst"]:
+                    return fault
+                continue
+            if attempt not in fault.get("attempts", [1]):
+                continue
+            if _fraction(self.seed, f"{fault['kind']}:{path}") < fault.get(
+                "ratio", 1.0
+            ):
+                return fault
+        return None
+
+    def _latency(self) -> float:
+        """按场景的延迟分布采样一次延迟（秒）"""
+        spec = self.scenario.get("latency")
+        if not spec:
+            return 0.0
+        dist = spec.get("dist", "fixed")
+        if dist == "uniform":
+            return self._rng.uniform(spec["low_ms"], spec["high_ms"]) / 1000
+        if dist == "lognormal":
+            mu = math.log(spec["median_ms"] / 1000)
+            return self._rng.lognormvariate(mu, spec.get("sigma", 0.5))
+        return spec.get("value_ms", 0) / 1000
+
+    def _track_attempt(self, path: str) -> int:
+        """记录请求次数，检查是否遵守了之前的 Retry-After"""
+        self._attempts[path] += 1
+        not_before = self._retry_not_before.pop(path, None)
+        if not_before is not None and time.monotonic() < not_before:
+            self.retry_after_violations += 1
+        return self._attempts[path]
+
+    async def _error_response(self, fault: Dict, path: str) -> web.Response:
+        """按故障返回状态码响应"""
+        status = fault.get("status", 503)
+        self.stats[f"status_{status}"] += 1
+        headers = {}
+        if "retry_after" in fault:
+            headers["Retry-After"] = str(fault["retry_after"])
+            self._retry_not_before[path] = time.monotonic() + fault["retry_after"]
+        return web.Response(status=status, headers=headers, text="injected")
+
+    async def _storage(self, request: web.Request) -> web.StreamResponse:
+        path = f"{request.match_info['item_id']}/{request.match_info['name']}"
+        attempt = self._track_attempt(path)
+        fault = self._pick_fault("storage", path, attempt)
+        self._target_counts["storage"] += 1
+        self.stats["storage"] += 1
+
+        await asyncio.sleep(self._latency())
+        if fault and fault["kind"] == "status":
+            return await self._error_response(fault, path)
+
+        body = self.payload(path)
+        start = _range_start(request.headers.get("Range"))
+        if start is not None and start >= len(body):
+            self.stats["status_416"] += 1
+            return web.Response(
+                status=416, headers={"Content-Range": f"bytes */{len(body)}"}
+            )
+        response = web.StreamResponse(
+            headers={"Content-Type": "application/octet-stream"}
+        )
+        if start is not None:
+            self.stats["range"] += 1
+            response.set_status(206)
+            response.headers["Content-Range"] = (
+                f"bytes {start}-{len(body) - 1}/{len(body)}"
+            )
+        else:
+            start = 0
+        if fault and fault["kind"] == "truncate":
+            self.stats["truncate"] += 1
+            body = body[: int(len(body) * fault.get("at", 0.5))]
+        response.content_length = len(body) - start
+        await response.prepare(request)
+
+        if fault and fault["kind"] == "slow_first_byte":
+            self.stats["slow_first_byte"] += 1
+            await asyncio.sleep(fault.get("delay", 5.0))
+
+        # 故障位置按整个文件计算，续传的请求越过该位置后不再生效
+        limit = len(body)
+        slow_from = len(body)
+        if fault and fault["kind"] in ("reset", "stall"):
+            limit = max(start, int(len(body) * fault.get("at", 0.5)))
+        elif fault and fault["kind"] == "trickle":
+            slow_from = int(len(body) * fault.get("at", 0.5))
+
+        bandwidth = self.scenario.get("bandwidth_kbps")
+        sent = start
+        while sent < limit:
+            rate = fault.get("kbps", 1) if sent >= slow_from else bandwidth
+            size = CHUNK_SIZE if sent < slow_from else TRICKLE_CHUNK_SIZE
+            chunk = body[sent : min(sent + size, limit)]
+            try:
+                await response.write(chunk)
+            except ConnectionResetError:
+                # 客户端中止了停滞的传输
+                self.stats["client_abort"] += 1
+                return response
+            sent += len(chunk)
+            self.bytes_sent += len(chunk)
+            if rate:
+                await asyncio.sleep(len(chunk) / (rate * 1024))
+
+        if sent < len(body) and fault and fault["kind"] == "stall":
+            # 模拟连接停滞：不再发送数据也不关闭连接
+            self.stats["stall"] += 1
+            await asyncio.sleep(fault.get("delay", 60.0))
+            if request.transport is not None:
+                request.transport.abort()
+            return response
+
+        if sent < len(body):
+            # 模拟传输中途连接被重置
+            self.stats["reset"] += 1
+            request.transport.abort()
+            return response
+
+        self.completed[path] = len(body)
+        await response.write_eof()
+        return response
+
+    async def _export(self, request: web.Request) -> web.Response:
+        content_id = request.match_info["content_id"]
+        path = f"export/{content_id}"
+        attempt = self._track_attempt(path)
+        fault = self._pick_fault("export", path, attempt)
+        self._target_counts["export"] += 1
+        self.stats["export"] += 1
+
+        await asyncio.sleep(self._latency())
+        if fault and fault["kind"] == "login_page":
+            self.stats["login_page"] += 1
+            return web.Response(text=LOGIN_PAGE, content_type="text/html")
+        if fault and fault["kind"] == "status":
+            return await self._error_response(fault, path)
+        return web.json_response(
+            {
+                "isSucceeded": True,
+                "downloadUrl": f"{self._base_url}/storage/{content_id}/export.zip",
+            }
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """启动服务器
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示随机端口
+
+        Returns:
+            str: 服务器基础URL
+        """
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self._base_url = f"http://{host}:{port}"
+        return self._base_url
+
+    async def stop(self):
+        """停止服务器"""
+        if self._runner:
+            await self._runner.cleanup()
+
+
+def download_plan(scenario: Dict[str, Any], base_url: str) -> List[Dict[str, Any]]:
+    """场景中要执行的下载列表
+
+    Args:
+        scenario: 场景配置
+        base_url: 服务器基础URL
+
+    Returns:
+        List[Dict[str, Any]]: 每项包含 name / url / is_export
+    """
+    plan = []
+    exports = round(scenario["downloads"] * scenario["export_ratio"])
+    for index in range(scenario["downloads"]):
+        if index < exports:
+            content_id = 700000 + index
+            plan.append(
+                {
+                    "name": f"export_{content_id}",
+                    "url": f"{base_url}/api/items/{content_id}/download",
+                    "is_export": True,
+                }
+            )
+        else:
+            item_id = 900000 + index
+            plan.append(
+                {
+                    "name": f"preview_{item_id}",
+                    "url": f"{base_url}/storage/{item_id}/{item_id}.lee",
+                    "is_export": False,
+                }
+            )
+    return plan
+
+
+async def main(argv=None):
+    """独立运行故障注入服务器"""
+    parser = argparse.ArgumentParser(description="Nizima故障注入替身服务器")
+    parser.add_argument("scenario", help="场景文件或 standin/scenarios 下的场景名")
+    parser.add_argument("--port", type=int, default=8801, help="监听端口")
+    args = parser.parse_args(argv)
+
+    path = Path(args.scenario)
+    if not path.exists():
+        path = SCENARIOS_DIR / f"{args.scenario}.json"
+    server = FaultServer(load_scenario(path))
+    base_url = await server.start(port=args.port)
+    print(f"🧪 故障注入服务器已启动: {base_url} ({server.scenario['name']})")
+    print(f"💡 NIZIMA_STORAGE_BASE={base_url}/storage NIZIMA_API_BASE={base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+替身服务器实现
+
+提供与线上一致的作品详情API和存储路径：
+- GET /api/items/{item_id}/detail
+- GET /storage/{item_id}/{fileName}（对应 config.STORAGE_BASE，需要提供 storage）
+
+作品ID空间由 SyntheticCatalog 按ID哈希合成，结果可复现
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from aiohttp import web
+
+# 合成结果类型，与 crawl.OUTCOMES 对应
+VALID = "valid"
+NO_PREVIEW = "no_preview"
+INVALID = "invalid"
+NON_JSON = "non_json"
+
+
+class SyntheticCatalog:
+    """合成的作品ID空间
+
+    每个ID的结果由 (seed, item_id) 的哈希决定，
+    同一组参数在任何机器上生成相同的ID空间
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        valid_ratio: float = 0.2,
+        no_preview_ratio: float = 0.05,
+        non_json_ratio: float = 0.02,
+        preview_images: int = 0,
+    ):
+        """初始化ID空间
+
+        Args:
+            seed: 随机种子
+            valid_ratio: 有效作品比例
+            no_preview_ratio: 没有Preview模型的作品比例
+            non_json_ratio: 返回非JSON响应的ID比例
+            preview_images: 每个作品的预览图数量
+        """
+        self.seed = seed
+        self.valid_ratio = valid_ratio
+        self.no_preview_ratio = no_preview_ratio
+        self.non_json_ratio = non_json_ratio
+        self.preview_images = preview_images
+
+    def _fraction(self, item_id: int) -> float:
+        """把ID映射到 [0, 1) 区间"""
+        digest = hashlib.blake2b(
+            f"{self.seed}:{item_id}".encode(), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big") / 2**64
+
+    def outcome(self, item_id: int) -> str:
+        """ID对应的结果类型"""
+        x = self._fraction(item_id)
+        for kind, ratio in (
+            (VALID, self.valid_ratio),
+            (NO_PREVIEW, self.no_preview_ratio),
+            (NON_JSON, self.non_json_ratio),
+        ):
+            if x < ratio:
+                return kind
+            x -= ratio
+        return INVALID
+
+    def detail(self, item_id: int) -> Dict[str, Any]:
+        """有效作品的详情数据，结构与线上API一致"""
+        tag = hashlib.blake2b(str(item_id).encode(), digest_size=4).hexdigest()
+        assets: Dict[str, Any] = {
+            "thumbnailImage": {
+                "fileName": f"thumb_{tag}.webp",
+                "url": f"{item_id}/thumb_{tag}.webp",
+                "fallbackUrl": None,
+            },
+            "previewImages": [
+                {
+                    "fileName": f"preview_{tag}_{i}.png",
+                    "url": f"{item_id}/images/preview_{tag}_{i}.png",
+                }
+                for i in range(self.preview_images)
+            ],
+        }
+        if self.outcome(item_id) == VALID:
+            assets["previewLive2DZip"] = {
+                "fileName": f"{tag}.lee",
+                "url": f"{item_id}/{tag}.lee",
+                "fallbackUrl": None,
+            }
+        return {"itemId": item_id, "assetsInfo": assets, "itemContentDetails": {}}
+
+
+class StandinServer:
+    """替身服务器
+
+    用法:
+        server = StandinServer(SyntheticCatalog())
+        base_url = await server.start()
+        ...
+        await server.stop()
+    """
+
+    def __init__(
+        self,
+        catalog: SyntheticCatalog,
+        max_concurrency: Optional[int] = None,
+        latency: float = 0.0,
+        storage: Optional[Callable[[int, str], Optional[Path]]] = None,
+    ):
+        """初始化服务器
+
+        Args:
+            catalog: 合成ID空间
+            max_concurrency: 详情API在途请求超过该值时返回429，为空时不限流
+            latency: 每个请求的固定延迟（秒）
+            storage: 存储路径解析函数 (item_id, 相对路径) -> 本地文件，
+                返回None时响应404；为空时不提供存储路径
+        """
+        self.catalog = catalog
+        self.max_concurrency = max_concurrency
+        self.latency = latency
+        self.storage = storage
+        self.stats: Counter = Counter()  # 按响应类型统计请求数
+        self._in_flight = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def create_app(self) -> web.Application:
+        """创建aiohttp应用"""
+        app = web.Application()
+        app.router.add_get("/api/items/{item_id}/detail", self._detail)
+        if self.storage is not None:
+            app.router.add_get("/storage/{item_id}/{path:.+}", self._storage)
+        return app
+
+    async def _detail(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        if self.max_concurrency and self._in_flight >= self.max_concurrency:
+            self.stats["throttled"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+
+        self._in_flight += 1
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+
+            try:
+                item_id = int(request.match_info["item_id"])
+            except ValueError:
+                return web.Response(status=404)
+
+            kind = self.catalog.outcome(item_id)
+            self.stats[kind] += 1
+            if kind == INVALID:
+                return web.json_response({"message": "Not Found"}, status=404)
+            if kind == NON_JSON:
+                return web.Response(
+                    text="<html><body>maintenance</body></html>",
+                    content_type="text/html",
+                )
+            return self._json_with_etag(request, self.catalog.detail(item_id))
+        finally:
+            self._in_flight -= 1
+
+    async def _storage(self, request: web.Request) -> web.StreamResponse:
+        self.stats["storage"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            item_id = int(request.match_info["item_id"])
+        except ValueError:
+            return web.Response(status=404)
+
+        path = self.storage(item_id, request.match_info["path"])
+        if path is None or not path.is_file():
+            self.stats["storage_missing"] += 1
+            return web.Response(status=404)
+        return web.FileResponse(
+            path, headers={"Content-Type": "application/octet-stream"}
+        )
+
+    def _json_with_etag(self, request: web.Request, data: Any) -> web.Response:
+        """返回带ETag的JSON响应，If-None-Match匹配时返回304"""
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            self.stats["not_modified"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            body=body, content_type="application/json", headers={"ETag": etag}
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """启动服务器
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示随机端口
+
+        Returns:
+            str: 服务器基础URL
+        """
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        """停止服务器"""
+        if self._runner:
+            await self._runner.cleanup()
+
+
+async def main(argv=None):
+    """独立运行替身服务器"""
+    parser = argparse.ArgumentParser(description="Nizima本地替身服务器")
+    parser.add_argument("--port", type=int, default=8800, help="监听端口")
+    parser.add_argument("--seed", type=int, default=0, help="ID空间随机种子")
+    parser.add_argument("--valid-ratio", type=float, default=0.2, help="有效作品比例")
+    parser.add_argument(
+        "--max-concurrency", type=int, default=None, help="超过该在途请求数时返回429"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="每个请求的延迟（秒）"
+    )
+    parser.add_argument(
+        "--fixtures", help="提供存储路径，使用该目录中 benchmark 生成的夹具"
+    )
+    parser.add_argument(
+        "--base-id", type=int, default=900000, help="夹具轮换的起始作品ID"
+    )
+    args = parser.parse_args(argv)
+
+    storage = None
+    if args.fixtures:
+        import sys
+
+        sys.path.insert(0, str(Path(__file__).parent.parent))
+        from benchmark.fixtures import FixtureStorage
+
+        storage = FixtureStorage(Path(args.fixtures), args.base_id)
+
+    server = StandinServer(
+        SyntheticCatalog(args.seed, args.valid_ratio),
+        args.max_concurrency,
+        args.latency,
+        storage,
+    )
+    base_url = await server.start(port=args.port)
+    print(f"🧪 替身服务器已启动: {base_url}")
+    print(f"💡 NIZIMA_API_BASE={base_url} uv run python fetch_nizima.py crawl ...")
+    if storage is not None:
+        print(f"💡 NIZIMA_STORAGE_BASE={base_url}/storage")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,6 +8,7 @@ from .base import Task
 from .download import DownloadTask
 from .decrypt import DecryptTask
 from .extract import ExtractTask
+from .members import FetchMembersTask
 from .process import ProcessImagesTask, RenameDirectoryTask
 from .save import SaveVersionTask, SaveDetailJsonTask
 
@@ -16,6 +17,7 @@ __all__ = [
     'DownloadTask',
     'DecryptTask', 
     'ExtractTask',
+    'FetchMembersTask',
     'ProcessImagesTask',
     'RenameDirectoryTask',
     'SaveVersionTask',
@@ -4,10 +4,9 @@
 定义了所有任务的抽象接口和通用行为
 """
 
-import asyncio
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 
 class Task(ABC):
@@ -20,6 +19,9 @@ class Task(ABC):
     - 执行逻辑 (execute)
     """
     
+    # 资源类别：network / cpu / disk，用于追踪和性能分析
+    resource_class = "disk"
+    
     def __init__(self, task_id: str, deps_on: List[str] = None):
         """初始化任务
         
@@ -29,6 +31,15 @@ class Task(ABC):
         """
         self.task_id = task_id
         self.deps_on = deps_on or []
+        # 只需等待其结束（成功或失败）、不使用其结果的任务ID
+        self.waits_for: List[str] = []
+        # 依赖任务的产出（core.artifacts.Artifact），执行前由TaskScheduler提供
+        self.inputs: Dict[str, Any] = {}
+        # 本任务的产出，execute中设置；为空时由TaskScheduler按返回值生成
+        self.output: Optional[Any] = None
+        # 执行期间占用的内存预算（字节），由TaskScheduler设置；None表示不受预算控制
+        self.memory_reserved: Optional[int] = None
+        self.item_id: Optional[str] = None  # 由TaskGraph.add_task设置
         self._completed = False
         self._result = None
         self._error = None
@@ -90,6 +101,49 @@ class Task(ABC):
         self._completed = False
         self._error = error
         
+    def recover_result(self) -> Any:
+        """从已存在的输出恢复执行结果（is_completed() 为真、跳过执行时调用）
+        
+        Returns:
+            Any: 与 execute() 相同形式的结果，默认None
+        """
+        return None
+        
+    def memory_cost(self, expected: int) -> int:
+        """执行期间预计占用的内存（字节），用于申请内存预算（见 core.budget）
+        
+        默认为0：流式处理文件的任务只占用固定大小的缓冲区
+        
+        Args:
+            expected: 任务处理的预期字节数
+            
+        Returns:
+            int: 字节数
+        """
+        return 0
+        
+    def set_missing(self, missing: List[str]):
+        """任务开始前由调度器调用，传入图中已失败或被跳过的任务
+        
+        默认忽略；记录完成状态的任务（SaveVersionTask）覆盖此方法
+        
+        Args:
+            missing: 失败或被跳过的任务ID列表
+        """
+        
+    def input_artifact(self, task_id: Optional[str] = None) -> Optional[Any]:
+        """获取依赖任务的产出
+        
+        Args:
+            task_id: 依赖任务ID，为空时取第一个依赖
+            
+        Returns:
+            Optional[Artifact]: 产出，依赖没有产出（如从已有输出跳过）时返回None
+        """
+        if task_id is None:
+            task_id = self.deps_on[0] if self.deps_on else None
+        return self.inputs.get(task_id)
+        
     def __str__(self) -> str:
         """字符串表示"""
         status = "✅" if self._completed else "⏳"
@@ -99,24 +153,3 @@ class Task(ABC):
     def __repr__(self) -> str:
         """详细字符串表示"""
         return f"Task(id={self.task_id}, deps={self.deps_on}, completed={self._completed})"
-
-
-# 全局中断标志
-_shutdown_requested = False
-
-
-def request_shutdown():
-    """请求关闭所有任务"""
-    global _shutdown_requested
-    _shutdown_requested = True
-
-
-def is_shutdown_requested() -> bool:
-    """检查是否请求关闭"""
-    return _shutdown_requested
-
-
-def reset_shutdown_flag():
-    """重置关闭标志"""
-    global _shutdown_requested
-    _shutdown_requested = False
@@ -4,11 +4,14 @@
 负责解密下载的加密文件
 """
 
+import logging
 from pathlib import Path
 from typing import Any
 
 from .base import Task
 
+log = logging.getLogger("nizima.tasks")
+
 
 class DecryptTask(Task):
     """解密任务
@@ -16,8 +19,13 @@ class DecryptTask(Task):
     使用XOR算法解密下载的文件
     """
     
+    resource_class = "cpu"
+    
     XOR_KEY = "AkqeZ-f,7fgx*7WU$6mWZ_98x-nWtdw4Jjky"
     
+    # ZIP文件的魔数
+    ZIP_MAGIC = (b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08")
+    
     def __init__(
         self,
         task_id: str,
@@ -46,26 +54,35 @@ class DecryptTask(Task):
         )
         
     async def execute(self) -> Path:
-        """执行解密"""
-        print(f"🔓 解密文件: {self.input_file.name}")
+        """执行解密
+        
+        下载任务的产出在内存中时直接解密，不再读回下载的文件；
+        解密结果写入文件（供增量执行和最终输出），同时作为产出交给解压任务
+        """
+        from core.artifacts import Artifact
+        
+        log.debug("🔓 解密文件: %s", self.input_file.name)
         
-        # 检查输入文件是否已经是ZIP格式
-        if self._is_zip_file(self.input_file):
-            print("✅ 文件已是ZIP格式，无需解密")
-            # 直接复制文件
-            import shutil
-            self.output_file.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(self.input_file, self.output_file)
-            self.mark_completed(self.output_file)
-            return self.output_file
-            
         # 确保输出目录存在
         self.output_file.parent.mkdir(parents=True, exist_ok=True)
         
         try:
             # 读取加密文件
-            with open(self.input_file, "rb") as f:
-                encrypted_data = f.read()
+            source = self.input_artifact()
+            if source is not None and source.in_memory:
+                encrypted_data = source.data
+            else:
+                with open(self.input_file, "rb") as f:
+                    encrypted_data = f.read()
+                    
+            # 检查输入文件是否已经是ZIP格式
+            if bytes(encrypted_data[:4]) in self.ZIP_MAGIC:
+                log.debug("✅ 文件已是ZIP格式，无需解密")
+                with open(self.output_file, "wb") as f:
+                    f.write(encrypted_data)
+                self.output = Artifact(self.output_file, encrypted_data)
+                self.mark_completed(self.output_file)
+                return self.output_file
                 
             # XOR解密
             key_bytes = [ord(c) for c in self.XOR_KEY]
@@ -74,33 +91,41 @@ class DecryptTask(Task):
             for i, byte in enumerate(encrypted_data):
                 decrypted.append(byte ^ key_bytes[i % len(key_bytes)])
                 
-            # 保存解密后的文件
-            with open(self.output_file, "wb") as f:
-                f.write(decrypted)
-                
             # 验证是否为有效的ZIP文件
-            if self._is_zip_file(self.output_file):
-                print("✅ 解密成功，确认为ZIP文件")
-                self.mark_completed(self.output_file)
-                return self.output_file
-            else:
+            if bytes(decrypted[:4]) not in self.ZIP_MAGIC:
                 error_msg = "解密后不是有效的ZIP文件"
-                print(f"❌ {error_msg}")
+                log.debug("❌ %s", error_msg)
                 self.mark_failed(error_msg)
                 raise Exception(error_msg)
                 
+            # 保存解密后的文件
+            with open(self.output_file, "wb") as f:
+                f.write(decrypted)
+                
+            log.debug("✅ 解密成功，确认为ZIP文件")
+            self.output = Artifact(self.output_file, decrypted)
+            self.mark_completed(self.output_file)
+            return self.output_file
+                
         except Exception as e:
             error_msg = f"解密失败: {e}"
-            print(f"❌ {error_msg}")
+            log.debug("❌ %s", error_msg)
             self.mark_failed(error_msg)
             raise Exception(error_msg)
             
+    def memory_cost(self, expected: int) -> int:
+        """整个文件读入内存，解密结果另占一份"""
+        return 2 * expected
+            
+    def recover_result(self) -> Path:
+        """已解密的文件"""
+        return self.output_file
+            
     def _is_zip_file(self, file_path: Path) -> bool:
         """检测文件是否为ZIP格式"""
         try:
             with open(file_path, "rb") as f:
                 header = f.read(4)
-                # ZIP文件的魔数
-                return header in [b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08"]
+                return header in self.ZIP_MAGIC
         except Exception:
             return False
@@ -1,16 +1,108 @@
 """
 下载任务实现
 
-负责从网络下载文件到本地
+负责从网络下载文件到本地。传输过程中检测停滞并断点续传；
+写入过程中计算SHA-256，完成后检查字节数（Content-Length、详情中的 fileSize）、
+服务器给出的MD5以及ZIP归档的结束记录，损坏的下载在后续任务执行前重新下载
 """
 
 import asyncio
+import base64
+import hashlib
+import logging
+import os
+import time
 from pathlib import Path
 from typing import Any, Optional
+from urllib.parse import urlparse
 
 import aiohttp
 
-from .base import is_shutdown_requested, Task
+from .base import Task
+
+log = logging.getLogger("nizima.tasks")
+
+# 流式下载的分块大小
+CHUNK_SIZE = 64 * 1024
+
+# 预期不超过该大小的文件同时保留在内存中，直接交给后续任务（见 core.artifacts）
+BUFFER_LIMIT = 32 * 1024 * 1024
+
+# 停滞检测：发出请求到收到第一个数据块、两个数据块之间的最长等待时间（秒）
+FIRST_BYTE_TIMEOUT = 30.0
+IDLE_TIMEOUT = 30.0
+
+# 停滞检测：每个时间窗口（秒）内的平均速度不得低于最低吞吐量（字节/秒）
+THROUGHPUT_WINDOW = 30.0
+MIN_THROUGHPUT = 4 * 1024
+
+# 有进展的传输中断后续传的次数上限（不计入 max_retries）
+MAX_RESUMES = 20
+
+# 详情中的 fileSize 以MB为单位且经过取整，实际大小低于它的该比例时视为截断
+SIZE_TOLERANCE = 0.1
+
+# 续传时把 .part 文件已有的部分读入哈希的分块大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class StallError(asyncio.TimeoutError):
+    """传输停滞：限定时间内没有收到数据，或速度低于最低吞吐量"""
+
+    def __init__(self, reason: str, message: str):
+        """初始化
+
+        Args:
+            reason: 停滞类型（first_byte / idle / throughput）
+            message: 错误信息
+        """
+        super().__init__(message)
+        self.reason = reason
+
+
+class IntegrityError(Exception):
+    """下载的内容不完整或已损坏"""
+
+    def __init__(self, check: str, message: str):
+        """初始化
+
+        Args:
+            check: 未通过的检查（length / size / md5 / archive）
+            message: 错误信息
+        """
+        super().__init__(message)
+        self.check = check
+
+
+class _ResumeRejected(Exception):
+    """服务器不接受续传请求的范围（416 或 Content-Range 不一致）"""
+
+
+def _content_range_start(response: aiohttp.ClientResponse) -> Optional[int]:
+    """解析 206 响应 Content-Range 头（bytes start-end/total）的起始偏移"""
+    value = response.headers.get("Content-Range", "")
+    unit, _, spec = value.partition(" ")
+    if unit != "bytes":
+        return None
+    try:
+        return int(spec.split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def _advertised_md5(response: aiohttp.ClientResponse, offset: int) -> Optional[bytes]:
+    """服务器给出的整个文件的MD5（x-goog-hash，或非续传响应的 Content-MD5）"""
+    for part in response.headers.get("x-goog-hash", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "md5":
+            break
+    else:
+        value = "" if offset else response.headers.get("Content-MD5", "")
+    try:
+        digest = base64.b64decode(value, validate=True)
+    except ValueError:
+        return None
+    return digest if len(digest) == 16 else None
 
 
 class DownloadTask(Task):
@@ -19,6 +111,14 @@ class DownloadTask(Task):
     从指定URL下载文件到本地路径
     """
 
+    resource_class = "network"
+
+    # 停滞检测参数，None 表示不限制（可在实例上覆盖）
+    first_byte_timeout: Optional[float] = FIRST_BYTE_TIMEOUT
+    idle_timeout: Optional[float] = IDLE_TIMEOUT
+    throughput_window: float = THROUGHPUT_WINDOW
+    min_throughput: int = MIN_THROUGHPUT
+
     def __init__(
         self,
         task_id: str,
@@ -28,6 +128,9 @@ class DownloadTask(Task):
         max_retries: int = 3,
         file_name: Optional[str] = None,
         is_export: bool = False,
+        session: Optional[aiohttp.ClientSession] = None,
+        expected_size: Optional[int] = None,
+        archive: bool = False,
     ):
         """初始化下载任务
 
@@ -39,6 +142,10 @@ class DownloadTask(Task):
             max_retries: 最大重试次数
             file_name: 文件名（用于export下载）
             is_export: 是否为export下载（需要POST请求）
+            session: 共享HTTP会话，为空时任务自行创建
+            expected_size: 预期文件大小（字节，可能是详情中取整的 fileSize），
+                响应没有Content-Length时用于显示进度，实际大小明显偏小时视为截断
+            archive: 是否为ZIP归档（可能经过XOR加密），下载后检查中央目录结束记录
         """
         super().__init__(task_id, deps_on)
         self.url = url
@@ -46,11 +153,29 @@ class DownloadTask(Task):
         self.max_retries = max_retries
         self.file_name = file_name
         self.is_export = is_export
+        self.session = session
+        self.expected_size = expected_size
+        self.archive = archive
+        self.sha256: Optional[str] = None  # 下载完成的文件的SHA-256
+        self.attempts = 0  # 本次执行的尝试次数
+        self.bytes_downloaded = 0  # 成功下载的字节数
+        self._attempt_bytes = 0  # 本次尝试收到的字节数
+        self._phase = "first_byte"  # 停滞计时的阶段
 
     def is_completed(self) -> bool:
         """检查文件是否已下载"""
         return self.target_path.exists()
 
+    def memory_cost(self, expected: int) -> int:
+        """预期不超过 BUFFER_LIMIT 的文件保留在内存中，否则只占用分块缓冲区"""
+        if expected and expected <= BUFFER_LIMIT:
+            return expected
+        return CHUNK_SIZE
+
+    def recover_result(self) -> Path:
+        """已下载的文件"""
+        return self.target_path
+
     def _format_file_size(self, size_bytes: int) -> str:
         """格式化文件大小显示"""
         if size_bytes < 1024:
@@ -63,83 +188,365 @@ class DownloadTask(Task):
             return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
 
     async def execute(self) -> Path:
-        """执行下载"""
-        # 检查是否请求关闭
-        if is_shutdown_requested():
-            raise Exception("用户请求中断下载")
+        """执行下载
 
+        取消时在当前 await 处停止，已写入的 .part 文件保留，下次执行时续传
+        """
         # 确保目标目录存在
         self.target_path.parent.mkdir(parents=True, exist_ok=True)
 
-        print(f"⬇️ 下载: {self.url}")
+        log.debug("⬇️ 下载: %s", self.url)
+
+        if self.session is not None:
+            return await self._download_with_retries(self.session)
+
+        from core.session import create_session
+
+        async with create_session() as session:
+            return await self._download_with_retries(session)
+
+    async def _download_with_retries(self, session: aiohttp.ClientSession) -> Path:
+        """使用给定会话下载
+
+        失败时指数退避重试；本次尝试已经收到数据（传输停滞或中途断开）时
+        不计入重试次数，立即在新连接上从 .part 文件的偏移处续传，最多 MAX_RESUMES 次
+        """
+        from core.journal import classify_error
+        from core.metrics import metrics
 
         last_error = None
+        failures = 0
+        resumes = 0
+        self.attempts = 0
 
-        async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=300),
-            connector=aiohttp.TCPConnector(limit=20),
-        ) as session:
+        while True:
+            self.attempts += 1
+            self._attempt_bytes = 0
+            request_url = self.url
+            try:
+                if self.is_export:
+                    # export文件需要特殊的POST请求
+                    form_data = aiohttp.FormData()
+                    form_data.add_field("fileName", self.file_name or "export.zip")
 
-            for attempt in range(self.max_retries + 1):
-                try:
-                    if self.is_export:
-                        # export文件需要特殊的POST请求
-                        form_data = aiohttp.FormData()
-                        form_data.add_field("fileName", self.file_name or "export.zip")
-
-                        async with session.post(self.url, data=form_data) as response:
-                            # 检查是否返回了登录页面
-                            content_type = response.headers.get("content-type", "")
-                            if "text/html" in content_type:
-                                raise Exception(
-                                    "Export下载需要用户登录认证。请在浏览器中登录Nizima账户后再尝试，或者仅使用Preview模式。"
-                                )
-
-                            response.raise_for_status()
-                            result = await response.json()
-
-                            if not result.get("isSucceeded") or not result.get(
-                                "downloadUrl"
-                            ):
-                                raise Exception(f"下载API返回失败: {result}")
-
-                            # 使用返回的downloadUrl下载文件
-                            async with session.get(
-                                result["downloadUrl"]
-                            ) as file_response:
-                                file_response.raise_for_status()
-                                content = await file_response.read()
-                    else:
-                        # 普通GET请求
-                        async with session.get(self.url) as response:
-                            response.raise_for_status()
-                            content = await response.read()
+                    async with session.post(self.url, data=form_data) as response:
+                        # 检查是否返回了登录页面
+                        content_type = response.headers.get("content-type", "")
+                        if "text/html" in content_type:
+                            raise Exception(
+                                "Export下载需要用户登录认证。请在浏览器中登录Nizima账户后再尝试，或者仅使用Preview模式。"
+                            )
+
+                        response.raise_for_status()
+                        result = await response.json()
+
+                        if not result.get("isSucceeded") or not result.get(
+                            "downloadUrl"
+                        ):
+                            raise Exception(f"下载API返回失败: {result}")
+
+                    # 使用返回的downloadUrl下载文件
+                    request_url = result["downloadUrl"]
+
+                size = await self._transfer(session, request_url)
 
-                    # 写入文件
-                    with open(self.target_path, "wb") as f:
-                        f.write(content)
+                host = urlparse(request_url).hostname or ""
+                metrics.download_bytes.inc(size, host=host)
+                self.bytes_downloaded = size
 
-                    print(
-                        f"✅ 下载完成: {self.target_path.name} ({self._format_file_size(len(content))})"
+                log.debug(
+                    "✅ 下载完成: %s (%s)",
+                    self.target_path.name,
+                    self._format_file_size(size),
+                )
+
+                self.mark_completed(self.target_path)
+                return self.target_path
+
+            except Exception as e:
+                last_error = e
+                if isinstance(e, StallError):
+                    metrics.stalls.inc(reason=e.reason)
+                elif isinstance(e, aiohttp.ConnectionTimeoutError):
+                    metrics.stalls.inc(reason="connect")
+
+                if (
+                    self._attempt_bytes
+                    and resumes < MAX_RESUMES
+                    and self.part_path.exists()
+                ):
+                    # 有进展的传输不受重试次数限制，在新连接上立即续传
+                    resumes += 1
+                    metrics.retries.inc(cause=classify_error(e))
+                    log.info(
+                        "⚠️ 下载中断 (已接收 %s): %s，从断点续传",
+                        self._format_file_size(self.part_path.stat().st_size),
+                        e,
                     )
+                elif failures < self.max_retries:
+                    metrics.retries.inc(cause=classify_error(e))
+                    # 指数退避：3秒、6秒、12秒
+                    delay = 3 * (2**failures)
+                    failures += 1
+                    log.info(
+                        "⚠️ 下载失败 (尝试 %d/%d): %s，%d秒后重试",
+                        failures,
+                        self.max_retries + 1,
+                        e,
+                        delay,
+                    )
+                    await asyncio.sleep(delay)
+                else:
+                    log.debug("❌ 下载最终失败 %s: %s", self.url, e)
+                    break
 
-                    self.mark_completed(self.target_path)
-                    return self.target_path
+        # 如果到这里说明所有重试都失败了
+        self.mark_failed(str(last_error))
+        raise Exception(f"下载失败: {last_error}") from last_error
 
-                except Exception as e:
-                    last_error = e
+    async def _transfer(self, session: aiohttp.ClientSession, url: str) -> int:
+        """GET 文件内容，已有 .part 文件时用 Range 请求续传
+
+        取得连接到收到第一个数据块受 first_byte_timeout 限制（等待连接池名额不计时），
+        之后每个数据块重新计时 idle_timeout；超时抛出 StallError
+
+        Args:
+            session: HTTP会话
+            url: 文件URL
+
+        Returns:
+            int: 文件大小
+        """
+        from core.metrics import metrics
+        from core.session import CONNECTION_TRACE, TRANSFER_TIMEOUT
 
-                    if attempt < self.max_retries:
-                        # 指数退避：3秒、6秒、12秒
-                        delay = 3 * (2**attempt)
-                        print(
-                            f"⚠️ 下载失败 (尝试 {attempt + 1}/{self.max_retries + 1}): {e}"
+        offset = self.part_path.stat().st_size if self.part_path.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        self._phase = "first_byte"
+        host = urlparse(url).hostname or ""
+        loop = asyncio.get_running_loop()
+        connected = time.perf_counter()
+        try:
+            async with asyncio.timeout(None) as deadline:
+
+                def start_first_byte_timer():
+                    nonlocal connected
+                    connected = time.perf_counter()
+                    deadline.reschedule(loop.time() + self.first_byte_timeout)
+
+                if CONNECTION_TRACE not in session.trace_configs:
+                    # 会话没有连接通知，只能从发出请求时开始计时
+                    start_first_byte_timer()
+                async with session.get(
+                    url,
+                    headers=headers,
+                    timeout=TRANSFER_TIMEOUT,
+                    trace_request_ctx=start_first_byte_timer,
+                ) as response:
+                    headers_at = time.perf_counter()
+                    metrics.request_duration.observe(headers_at - connected, host=host)
+                    if offset and response.status == 416:
+                        # .part 文件不比服务器上的文件短
+                        raise _ResumeRejected()
+                    response.raise_for_status()
+                    if offset and response.status == 206:
+                        if _content_range_start(response) != offset:
+                            raise _ResumeRejected()
+                        metrics.resumes.inc()
+                        log.debug(
+                            "↪️ 续传: %s 从 %s 开始",
+                            self.target_path.name,
+                            self._format_file_size(offset),
                         )
-                        print(f"🔄 {delay}秒后重试...")
-                        await asyncio.sleep(delay)
                     else:
-                        print(f"❌ 下载最终失败 {self.url}: {e}")
+                        offset = 0  # 服务器不支持 Range，从头下载
+                    size = await self._stream_to_file(response, offset, deadline)
+                    metrics.transfer_duration.observe(
+                        time.perf_counter() - headers_at, host=host
+                    )
+                    return size
+        except _ResumeRejected:
+            log.debug(
+                "↪️ 服务器拒绝从 %d 字节处续传，重新下载: %s",
+                offset,
+                self.target_path.name,
+            )
+            self.part_path.unlink(missing_ok=True)
+            return await self._transfer(session, url)
+        except TimeoutError as e:
+            if deadline.expired():
+                timeout = (
+                    self.first_byte_timeout
+                    if self._phase == "first_byte"
+                    else self.idle_timeout
+                )
+                what = "首字节" if self._phase == "first_byte" else "数据"
+                raise StallError(self._phase, f"{timeout:g}秒内没有收到{what}") from e
+            raise
 
-        # 如果到这里说明所有重试都失败了
-        self.mark_failed(str(last_error))
-        raise Exception(f"下载失败: {last_error}")
+    async def _stream_to_file(
+        self,
+        response: aiohttp.ClientResponse,
+        offset: int = 0,
+        deadline: Optional[asyncio.Timeout] = None,
+    ) -> int:
+        """分块写入 .part 文件，完成后重命名为目标文件
+
+        每个数据块广播一次 download_progress 事件，供进度显示统计字节数。
+        从头下载、预期大小已知且不超过 BUFFER_LIMIT（以及申请到的内存预算）时
+        同时保留内容，作为产出交给后续任务。
+
+        停滞检测：每个数据块把 deadline 推迟到 idle_timeout 之后；
+        每个 throughput_window 内的平均速度低于 min_throughput 时抛出 StallError
+
+        Args:
+            response: 已检查状态码的响应
+            offset: 续传的起始偏移，0表示从头写入
+            deadline: 停滞计时器
+
+        Returns:
+            int: 文件大小（含续传前已有的部分）
+        """
+        from core.artifacts import Artifact
+        from core.events import bus
+
+        # 压缩传输时 Content-Length 是压缩后的大小，无法与写入的字节数比较
+        length = response.content_length
+        if response.headers.get("Content-Encoding", "identity") != "identity":
+            length = None
+        expected = offset + length if length is not None else self.expected_size
+        bus.emit(
+            "download_start",
+            item_id=self.item_id,
+            task_id=self.task_id,
+            url=str(response.url),
+            expected=expected,
+            offset=offset,
+        )
+
+        loop = asyncio.get_running_loop()
+        part_path = self.part_path
+        received = offset
+        limit = BUFFER_LIMIT
+        if self.memory_reserved is not None:
+            limit = min(limit, self.memory_reserved)
+        buffer = bytearray() if not offset and expected and expected <= limit else None
+        window_start = window_received = None
+        md5 = _advertised_md5(response, offset)
+        hashers = [hashlib.sha256()] + ([hashlib.md5()] if md5 else [])
+        if offset:
+            # 在线程中读入已有部分，不阻塞其他传输；读本地文件的时间不计入停滞
+            if deadline is not None:
+                deadline.reschedule(None)
+            await asyncio.to_thread(self._hash_prefix, hashers, offset)
+            if deadline is not None:
+                deadline.reschedule(loop.time() + self.first_byte_timeout)
+        with open(part_path, "ab" if offset else "wb") as f:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                f.write(chunk)
+                for hasher in hashers:
+                    hasher.update(chunk)
+                received += len(chunk)
+                self._attempt_bytes += len(chunk)
+                if buffer is not None:
+                    if received > limit:
+                        buffer = None  # 实际大小超出预期，只保留文件
+                    else:
+                        buffer += chunk
+                bus.emit(
+                    "download_progress",
+                    item_id=self.item_id,
+                    task_id=self.task_id,
+                    received=received,
+                    delta=len(chunk),
+                )
+
+                now = loop.time()
+                if window_start is None:
+                    self._phase = "idle"
+                    window_start, window_received = now, received
+                elif now - window_start >= self.throughput_window:
+                    speed = (received - window_received) / (now - window_start)
+                    if speed < self.min_throughput:
+                        raise StallError(
+                            "throughput",
+                            f"下载速度 {self._format_file_size(int(speed))}/s "
+                            f"低于 {self._format_file_size(self.min_throughput)}/s",
+                        )
+                    window_start, window_received = now, received
+                if deadline is not None:
+                    deadline.reschedule(
+                        now + self.idle_timeout if self.idle_timeout else None
+                    )
+
+        try:
+            self._verify(received, length and offset + length, md5, hashers)
+        except IntegrityError:
+            part_path.unlink(missing_ok=True)  # 损坏的部分不能续传
+            raise
+
+        os.replace(part_path, self.target_path)
+        self.sha256 = hashers[0].hexdigest()
+        self.output = Artifact(self.target_path, buffer, sha256=self.sha256)
+        return received
+
+    def _hash_prefix(self, hashers: list, size: int):
+        """续传时把 .part 文件已有的部分读入哈希"""
+        with open(self.part_path, "rb") as f:
+            while size > 0:
+                block = f.read(min(HASH_CHUNK_SIZE, size))
+                if not block:
+                    break
+                size -= len(block)
+                for hasher in hashers:
+                    hasher.update(block)
+
+    def _verify(
+        self,
+        received: int,
+        length: Optional[int],
+        md5: Optional[bytes],
+        hashers: list,
+    ):
+        """检查写入 .part 文件的内容
+
+        Args:
+            received: 文件大小
+            length: Content-Length 给出的文件大小
+            md5: 服务器给出的MD5
+            hashers: [sha256, md5]，md5 仅在服务器给出时计算
+
+        Raises:
+            IntegrityError: 检查未通过
+        """
+        from core.archive import ArchiveError, check_archive
+        from core.metrics import metrics
+
+        try:
+            if length is not None and received != length:
+                raise IntegrityError(
+                    "length", f"收到 {received} 字节，Content-Length 为 {length}"
+                )
+            if self.expected_size and received < self.expected_size * (
+                1 - SIZE_TOLERANCE
+            ):
+                raise IntegrityError(
+                    "size",
+                    f"文件大小 {self._format_file_size(received)} "
+                    f"明显小于预期的 {self._format_file_size(self.expected_size)}",
+                )
+            if md5 and hashers[1].digest() != md5:
+                raise IntegrityError("md5", "MD5与服务器给出的不一致")
+            if self.archive:
+                try:
+                    check_archive(self.part_path)
+                except ArchiveError as e:
+                    raise IntegrityError("archive", f"归档不完整: {e}") from e
+        except IntegrityError as e:
+            metrics.integrity_failures.inc(check=e.check)
+            raise
+
+    @property
+    def part_path(self) -> Path:
+        """下载过程中使用的临时文件路径"""
+        return self.target_path.with_name(self.target_path.name + ".part")
@@ -4,12 +4,18 @@
 负责解压ZIP文件到指定目录
 """
 
+import logging
 import zipfile
 from pathlib import Path
 from typing import Any
 
 from .base import Task
 
+log = logging.getLogger("nizima.tasks")
+
+# 选择性下载（FetchMembersTask）在输出目录中写入的清单，存在时说明只解压了部分成员
+SELECTIVE_MANIFEST = ".selective.json"
+
 
 class ExtractTask(Task):
     """解压任务
@@ -17,6 +23,8 @@ class ExtractTask(Task):
     解压ZIP文件到指定目录
     """
     
+    resource_class = "cpu"
+    
     ZIP_PASSWORD = "LrND6UfK(j-NmN7tTb+2S&6J56rEdfHJ3+pA"
     
     def __init__(
@@ -43,6 +51,10 @@ class ExtractTask(Task):
         if not self.output_dir.exists():
             return False
             
+        # 选择性下载只有部分成员，需要完整解压
+        if (self.output_dir / SELECTIVE_MANIFEST).exists():
+            return False
+            
         # 检查是否包含关键文件（如.moc3文件）
         moc3_files = list(self.output_dir.rglob("*.moc3"))
         return len(moc3_files) > 0
@@ -53,31 +65,38 @@ class ExtractTask(Task):
         Returns:
             dict: 包含解压信息的字典，如 {"output_dir": Path, "model_name": str}
         """
-        print(f"📦 解压ZIP文件: {self.input_file.name}")
+        log.debug("📦 解压ZIP文件: %s", self.input_file.name)
         
         # 确保输出目录存在
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
+        # 解密任务的产出在内存中时直接解压，不再读回文件
+        source = self.input_artifact()
+        archive = source.open() if source is not None and source.in_memory else self.input_file
+        
         try:
-            with zipfile.ZipFile(self.input_file, "r") as zip_ref:
+            with zipfile.ZipFile(archive, "r") as zip_ref:
                 file_count = len(zip_ref.namelist())
-                print(f"📊 ZIP文件包含 {file_count} 个文件")
+                log.debug("📊 ZIP文件包含 %d 个文件", file_count)
                 
                 # 先尝试使用密码解压
                 try:
                     zip_ref.extractall(self.output_dir, pwd=self.ZIP_PASSWORD.encode())
-                    print("✅ 密码解压成功")
+                    log.debug("✅ 密码解压成功")
                 except Exception:
                     # 如果密码解压失败，尝试无密码解压
                     try:
                         zip_ref.extractall(self.output_dir)
-                        print("✅ 无密码解压成功")
+                        log.debug("✅ 无密码解压成功")
                     except Exception as e:
                         error_msg = f"解压失败: {e}"
-                        print(f"❌ {error_msg}")
+                        log.debug("❌ %s", error_msg)
                         self.mark_failed(error_msg)
                         raise Exception(error_msg)
                         
+            # 已解压全部成员，选择性下载的清单作废
+            (self.output_dir / SELECTIVE_MANIFEST).unlink(missing_ok=True)
+            
             # 查找模型名称
             model_name = self._find_model_name()
             
@@ -86,9 +105,9 @@ class ExtractTask(Task):
                 "model_name": model_name
             }
             
-            print(f"✅ 解压完成: {self.output_dir}")
+            log.debug("✅ 解压完成: %s", self.output_dir)
             if model_name:
-                print(f"🎭 找到Live2D模型: {model_name}")
+                log.debug("🎭 找到Live2D模型: %s", model_name)
                 
             self.mark_completed(result)
             return result
@@ -96,10 +115,18 @@ class ExtractTask(Task):
         except Exception as e:
             if not isinstance(e, Exception) or "解压失败" not in str(e):
                 error_msg = f"解压失败: {e}"
-                print(f"❌ {error_msg}")
+                log.debug("❌ %s", error_msg)
                 self.mark_failed(error_msg)
             raise
             
+    def memory_cost(self, expected: int) -> int:
+        """内存中的归档，以及逐个解压的成员（不超过归档大小）"""
+        return expected
+            
+    def recover_result(self) -> dict:
+        """从已解压的目录恢复模型名称"""
+        return {"output_dir": self.output_dir, "model_name": self._find_model_name()}
+            
     def _find_model_name(self) -> str:
         """查找模型名称"""
         try:
@@ -109,8 +136,8 @@ class ExtractTask(Task):
                 model_name = moc3_files[0].stem
                 return model_name
             else:
-                print("⚠️ 未找到.moc3文件")
+                log.warning("⚠️ 未找到.moc3文件")
                 return "unknown_model"
         except Exception as e:
-            print(f"⚠️ 查找模型名称失败: {e}")
+            log.warning("⚠️ 查找模型名称失败: %s", e)
             return "unknown_model"
@@ -0,0 +1,141 @@
+"""
+选择性下载任务实现
+
+只下载预览模型归档中选中的成员，代替 下载 -> 解密 -> 解压 三个任务
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import aiohttp
+
+from .base import Task
+from .extract import ExtractTask, SELECTIVE_MANIFEST
+
+log = logging.getLogger("nizima.tasks")
+
+
+class FetchMembersTask(Task):
+    """选择性下载任务
+
+    用 Range 请求读取远程归档的中央目录，只下载、解密并解压选中的成员；
+    输出目录与 ExtractTask 相同，并写入清单文件，之后完整下载时由 ExtractTask 覆盖
+    """
+
+    resource_class = "network"
+
+    def __init__(
+        self,
+        task_id: str,
+        url: str,
+        output_dir: Path,
+        patterns: List[str],
+        deps_on: list = None,
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
+        """初始化选择性下载任务
+
+        Args:
+            task_id: 任务ID
+            url: 归档URL
+            output_dir: 输出目录（与对应的 ExtractTask 相同）
+            patterns: 成员选择器（通配符或 role:角色[序号]，见 core.archive）
+            deps_on: 依赖的任务ID列表
+            session: 共享HTTP会话，为空时任务自行创建
+        """
+        super().__init__(task_id, deps_on)
+        self.url = url
+        self.output_dir = Path(output_dir)
+        self.patterns = list(patterns)
+        self.session = session
+        self.bytes_downloaded = 0  # 下载的字节数（中央目录和选中成员）
+
+    @property
+    def manifest_path(self) -> Path:
+        """清单文件路径"""
+        return self.output_dir / SELECTIVE_MANIFEST
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_completed(self) -> bool:
+        """清单中的选择器与本次相同，且记录的文件都已存在"""
+        manifest = self._read_manifest()
+        return (
+            manifest is not None
+            and manifest.get("patterns") == self.patterns
+            and all((self.output_dir / name).is_file() for name in manifest["members"])
+        )
+
+    async def execute(self) -> dict:
+        """执行选择性下载
+
+        Returns:
+            dict: 与 ExtractTask 相同，如 {"output_dir": Path, "model_name": str}
+        """
+        if self.session is not None:
+            return await self._fetch(self.session)
+
+        from core.session import create_session
+
+        async with create_session() as session:
+            return await self._fetch(session)
+
+    async def _fetch(self, session: aiohttp.ClientSession) -> dict:
+        from core.archive import ArchiveError, RemoteArchive
+        from core.artifacts import Artifact
+
+        log.debug("🔎 选择性下载: %s (%s)", self.url, ", ".join(self.patterns))
+        pwd = ExtractTask.ZIP_PASSWORD.encode()
+        try:
+            archive = await RemoteArchive(self.url, session).open()
+            members = await archive.select(self.patterns, pwd)
+            if not members:
+                raise ArchiveError(f"没有匹配 {', '.join(self.patterns)} 的成员")
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            await archive.extract(members, self.output_dir, pwd)
+        except Exception as e:
+            error_msg = f"选择性下载失败: {e}"
+            log.debug("❌ %s", error_msg)
+            self.mark_failed(error_msg)
+            raise Exception(error_msg) from e
+
+        model_name = archive.model_name
+        manifest = {
+            "url": self.url,
+            "patterns": self.patterns,
+            "model_name": model_name,
+            "archive_size": archive.size,
+            "bytes_fetched": archive.bytes_fetched,
+            "members": [info.filename for info in members],
+        }
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        self.bytes_downloaded = archive.bytes_fetched
+        log.debug(
+            "✅ 选择性下载完成: %d / %d 个成员，%d 次请求下载 %d / %d 字节",
+            len(members),
+            len(archive.members),
+            archive.requests,
+            archive.bytes_fetched,
+            archive.size,
+        )
+        result = {"output_dir": self.output_dir, "model_name": model_name}
+        self.output = Artifact(self.output_dir, model_name=model_name)
+        self.mark_completed(result)
+        return result
+
+    def recover_result(self) -> dict:
+        """从清单恢复模型名称"""
+        manifest = self._read_manifest() or {}
+        return {
+            "output_dir": self.output_dir,
+            "model_name": manifest.get("model_name", "unknown_model"),
+        }
@@ -4,12 +4,15 @@
 负责处理图片文件和重命名目录等操作
 """
 
+import logging
 import shutil
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 from .base import Task
 
+log = logging.getLogger("nizima.tasks")
+
 
 class ProcessImagesTask(Task):
     """图片处理任务
@@ -38,25 +41,33 @@ class ProcessImagesTask(Task):
 
     async def execute(self) -> Path:
         """执行图片处理"""
-        print(f"🖼️ 处理图片: {self.input_file.name}")
+        log.debug("🖼️ 处理图片: %s", self.input_file.name)
 
         try:
             # 确保输出目录存在
             self.output_file.parent.mkdir(parents=True, exist_ok=True)
 
-            # 复制文件到目标位置
-            shutil.copy2(self.input_file, self.output_file)
+            # 下载的内容在内存中时直接写出，否则复制文件到目标位置
+            source = self.input_artifact()
+            if source is not None and source.in_memory:
+                source.write_to(self.output_file)
+            else:
+                shutil.copy2(self.input_file, self.output_file)
 
-            print(f"✅ 图片处理完成: {self.output_file.name}")
+            log.debug("✅ 图片处理完成: %s", self.output_file.name)
             self.mark_completed(self.output_file)
             return self.output_file
 
         except Exception as e:
             error_msg = f"处理图片失败: {e}"
-            print(f"❌ {error_msg}")
+            log.debug("❌ %s", error_msg)
             self.mark_failed(error_msg)
             raise Exception(error_msg)
 
+    def recover_result(self) -> Path:
+        """已处理的图片"""
+        return self.output_file
+
 
 class RenameDirectoryTask(Task):
     """重命名目录任务
@@ -101,11 +112,13 @@ class RenameDirectoryTask(Task):
         Returns:
             Path: 最终的目标目录路径
         """
-        print(f"📁 准备重命名目录...")
+        from core.artifacts import Artifact
+
+        log.debug("📁 准备重命名目录...")
 
         try:
-            # 从依赖任务获取模型名称
-            model_name = getattr(self, "model_name", "unknown_model")
+            # 从依赖任务的产出获取模型名称
+            model_name = self._model_name()
 
             # 创建新的目录名：{id}_{model_name}
             if model_name and model_name != "unknown_model":
@@ -125,21 +138,32 @@ class RenameDirectoryTask(Task):
             # 移动临时目录到最终位置
             shutil.move(str(self.temp_dir), str(final_dir))
 
-            print(f"✅ 目录已移动: {self.temp_dir.name} -> {final_dir.name}")
+            log.debug("✅ 目录已移动: %s -> %s", self.temp_dir.name, final_dir.name)
 
             self._final_dir = final_dir
+            self.model_name = model_name
+            self.output = Artifact(final_dir, final_dir=True, model_name=model_name)
             self.mark_completed(final_dir)
             return final_dir
 
         except Exception as e:
             error_msg = f"重命名目录失败: {e}"
-            print(f"❌ {error_msg}")
+            log.debug("❌ %s", error_msg)
             self.mark_failed(error_msg)
             raise Exception(error_msg)
 
-    def set_model_name(self, model_name: str):
-        """设置模型名称（由TaskScheduler调用）"""
-        self.model_name = model_name
+    def _model_name(self) -> Optional[str]:
+        """模型名称：优先取指定任务的产出，其次取其余依赖任务的产出"""
+        sources = [self.model_name_source_task_id] + [
+            dep_id
+            for dep_id in self.deps_on
+            if dep_id != self.model_name_source_task_id
+        ]
+        for dep_id in sources:
+            artifact = self.inputs.get(dep_id)
+            if artifact is not None and artifact.meta.get("model_name"):
+                return artifact.meta["model_name"]
+        return getattr(self, "model_name", None)
 
     @property
     def final_dir(self) -> Path:
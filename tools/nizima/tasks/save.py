@@ -5,12 +5,15 @@
 """
 
 import json
+import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from .base import Task
 
+log = logging.getLogger("nizima.tasks")
+
 
 class SaveDetailJsonTask(Task):
     """保存详细信息任务
@@ -43,7 +46,7 @@ class SaveDetailJsonTask(Task):
         
     async def execute(self) -> Path:
         """执行保存详细信息"""
-        print(f"💾 保存详细信息: {self.output_path.name}")
+        log.debug("💾 保存详细信息: %s", self.output_path.name)
         
         try:
             # 确保输出目录存在
@@ -53,13 +56,15 @@ class SaveDetailJsonTask(Task):
             with open(self.output_path, "w", encoding="utf-8") as f:
                 json.dump(self.data, f, ensure_ascii=False, indent=2)
                 
-            print(f"✅ 详细信息已保存: {self.output_path}")
+            log.debug("✅ 详细信息已保存: %s", self.output_path)
+            # 落盘后释放详情数据，避免批量下载时常驻内存
+            self.data = None
             self.mark_completed(self.output_path)
             return self.output_path
             
         except Exception as e:
             error_msg = f"保存详细信息失败: {e}"
-            print(f"❌ {error_msg}")
+            log.debug("❌ %s", error_msg)
             self.mark_failed(error_msg)
             raise Exception(error_msg)
 
@@ -94,23 +99,23 @@ class SaveVersionTask(Task):
         self.item_id = item_id
         self.script_version = script_version
         self.model_name = model_name
+        self.missing: List[str] = []  # 失败或被跳过的任务
+        self.deferred: List[str] = []  # 有意不执行的任务（选择性下载），总是记为缺少
         
     def is_completed(self) -> bool:
-        """检查version.json是否已存在且版本匹配"""
-        if not self.output_path.exists():
-            return False
-            
-        try:
-            with open(self.output_path, "r", encoding="utf-8") as f:
-                version_data = json.load(f)
-            current_version = version_data.get("version")
-            return current_version == self.script_version
-        except Exception:
-            return False
+        """版本信息总是在最后重新写入，记录本次的完成状态"""
+        return False
             
     async def execute(self) -> Path:
         """执行保存版本信息"""
-        print(f"💾 保存版本信息: {self.output_path.name}")
+        # 重命名任务的产出：暂存目录已被移动，版本信息写入最终目录
+        for artifact in self.inputs.values():
+            if artifact.meta.get("final_dir"):
+                self.output_path = artifact.path / "version.json"
+            if artifact.meta.get("model_name"):
+                self.model_name = artifact.meta["model_name"]
+                
+        log.debug("💾 保存版本信息: %s", self.output_path.name)
         
         try:
             # 确保输出目录存在
@@ -121,8 +126,13 @@ class SaveVersionTask(Task):
                 "version": self.script_version,
                 "updated_at": datetime.now().isoformat(),
                 "item_id": self.item_id,
+                "status": "partial" if self.missing else "complete",
             }
             
+            if self.missing:
+                # 部分完成：重新运行时只补全这些任务
+                version_data["missing"] = self.missing
+                
             if self.model_name:
                 version_data["model_name"] = self.model_name
                 
@@ -130,16 +140,16 @@ class SaveVersionTask(Task):
             with open(self.output_path, "w", encoding="utf-8") as f:
                 json.dump(version_data, f, ensure_ascii=False, indent=2)
                 
-            print(f"✅ 版本信息已保存: {self.output_path} ({self.script_version})")
+            log.debug("✅ 版本信息已保存: %s (%s)", self.output_path, self.script_version)
             self.mark_completed(self.output_path)
             return self.output_path
             
         except Exception as e:
             error_msg = f"保存版本信息失败: {e}"
-            print(f"❌ {error_msg}")
+            log.debug("❌ %s", error_msg)
             self.mark_failed(error_msg)
             raise Exception(error_msg)
             
-    def set_model_name(self, model_name: str):
-        """设置模型名称（由TaskScheduler调用）"""
-        self.model_name = model_name
+    def set_missing(self, missing: List[str]):
+        """设置失败或被跳过的任务（由TaskScheduler调用）"""
+        self.missing = missing + [t for t in self.deferred if t not in missing]
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+测试远程归档读取和选择性下载的脚本
+
+用 benchmark 夹具（示例模型 Mark 的加密预览归档）启动本地替身服务器，
+验证 Range 请求读取的中央目录与本地解密后的归档一致，且只下载了文件的一小部分；
+选择性下载按通配符和 model3.json 引用选中成员、写入清单，
+之后完整的 下载 -> 解密 -> 解压 覆盖同一目录并删除清单
+"""
+
+import asyncio
+import io
+import json
+import posixpath
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+import config
+from benchmark.fixtures import build_fixtures, FixtureStorage
+from core.archive import coalesce, COALESCE_GAP, RemoteArchive, xor_at
+from core.session import create_session
+from inspect_archive import inspect_target, preview_url
+from standin import StandinServer, SyntheticCatalog
+from tasks import DecryptTask, DownloadTask, ExtractTask, FetchMembersTask
+from tasks.extract import SELECTIVE_MANIFEST
+
+ITEM_ID = "900000"
+
+
+def local_archive(fixtures_dir: Path, storage: FixtureStorage) -> zipfile.ZipFile:
+    """夹具归档解密后的本地副本，作为对照"""
+    data = (fixtures_dir / storage.variant(int(ITEM_ID))["archive"]).read_bytes()
+    archive = zipfile.ZipFile(io.BytesIO(xor_at(data, 0)))
+    archive.setpassword(ExtractTask.ZIP_PASSWORD.encode())
+    return archive
+
+
+def expected_selection(expected: zipfile.ZipFile) -> list:
+    """*.model3.json 和它引用的第一张纹理（按本地归档计算）"""
+    model3 = next(n for n in expected.namelist() if n.endswith(".model3.json"))
+    texture = json.loads(expected.read(model3))["FileReferences"]["Textures"][0]
+    return sorted([model3, posixpath.join(posixpath.dirname(model3), texture)])
+
+
+async def check_selective(
+    session, url: str, expected: zipfile.ZipFile, workdir: Path
+) -> list:
+    """选择性下载，再用完整的解压任务覆盖同一目录"""
+    results = []
+    archive = await RemoteArchive(url, session).open()
+    pwd = ExtractTask.ZIP_PASSWORD.encode()
+    selected = await archive.select(["*.model3.json", "role:Textures[0]"], pwd)
+    results.append(
+        (
+            "按通配符和引用角色选择",
+            sorted(i.filename for i in selected) == expected_selection(expected),
+        )
+    )
+
+    output_dir = workdir / "preview"
+    patterns = ["*.model3.json", "*.cdi3.json"]
+    fetch_task = FetchMembersTask(
+        "fetch_members", url, output_dir, patterns, session=session
+    )
+    results.append(("下载前未完成", not fetch_task.is_completed()))
+    result = await fetch_task.execute()
+    manifest = json.loads((output_dir / SELECTIVE_MANIFEST).read_text("utf-8"))
+    wanted = sorted(
+        n for n in expected.namelist() if n.endswith((".model3.json", ".cdi3.json"))
+    )
+    print(
+        f"📋 选择性下载: {len(manifest['members'])} 个成员，"
+        f"下载 {manifest['bytes_fetched']} / {manifest['archive_size']} 字节"
+    )
+    results.append(("清单记录选择器", manifest["patterns"] == patterns))
+    results.append(("清单记录成员", sorted(manifest["members"]) == wanted))
+    results.append(
+        (
+            "选中成员内容正确",
+            all((output_dir / n).read_bytes() == expected.read(n) for n in wanted),
+        )
+    )
+    results.append(
+        (
+            "没有解压其他成员",
+            sorted(
+                p.relative_to(output_dir).as_posix()
+                for p in output_dir.rglob("*")
+                if p.is_file() and p.name != SELECTIVE_MANIFEST
+            )
+            == wanted,
+        )
+    )
+    results.append(
+        ("只下载了一部分", manifest["bytes_fetched"] < manifest["archive_size"])
+    )
+    results.append(("模型名称", result["model_name"] == "Mark"))
+    results.append(("重新运行时跳过", fetch_task.is_completed()))
+    results.append(
+        (
+            "选择器变化时重新下载",
+            not FetchMembersTask(
+                "fetch_members", url, output_dir, ["*.moc3"], session=session
+            ).is_completed(),
+        )
+    )
+
+    # 完整的 下载 -> 解密 -> 解压 覆盖选择性下载的目录
+    download_task = DownloadTask(
+        "download", url, workdir / "preview.lee", session=session
+    )
+    decrypt_task = DecryptTask(
+        "decrypt", workdir / "preview.lee", workdir / "preview.zip"
+    )
+    extract_task = ExtractTask("extract", workdir / "preview.zip", output_dir)
+    results.append(("有清单时解压任务未完成", not extract_task.is_completed()))
+    for task in (download_task, decrypt_task, extract_task):
+        await task.execute()
+    results.append(
+        ("完整解压后删除清单", not (output_dir / SELECTIVE_MANIFEST).exists())
+    )
+    results.append(
+        (
+            "完整解压后所有成员就位",
+            all(
+                (output_dir / i.filename).read_bytes() == expected.read(i)
+                for i in expected.infolist()
+                if not i.is_dir()
+            ),
+        )
+    )
+    results.append(("完整解压后选择性任务未完成", not fetch_task.is_completed()))
+    return results
+
+
+async def main():
+    """主测试函数"""
+    print("🚀 开始测试远程归档读取")
+    print("=" * 80)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures_dir = Path(tmp) / "fixtures"
+        build_fixtures(fixtures_dir, ["Mark"])
+        storage = FixtureStorage(fixtures_dir, int(ITEM_ID))
+        expected = local_archive(fixtures_dir, storage)
+
+        server = StandinServer(
+            SyntheticCatalog(valid_ratio=1.0, no_preview_ratio=0, non_json_ratio=0),
+            storage=storage,
+        )
+        config.API_BASE = await server.start()
+        config.STORAGE_BASE = f"{config.API_BASE}/storage"
+        print(f"🧪 替身服务器: {config.API_BASE}")
+
+        try:
+            async with create_session() as session:
+                url = await preview_url(ITEM_ID, session)
+                archive = await RemoteArchive(url, session).open()
+                print(
+                    f"📋 {len(archive.members)} 个成员，{archive.requests} 次请求，"
+                    f"下载 {archive.bytes_fetched} / {archive.size} 字节"
+                )
+                results.append(("识别为XOR加密", archive.encrypted))
+                results.append(("模型名称", archive.model_name == "Mark"))
+                results.append(
+                    (
+                        "成员列表与本地归档一致",
+                        [i.filename for i in archive.members] == expected.namelist(),
+                    )
+                )
+                results.append(
+                    (
+                        "偏移与本地归档一致",
+                        [i.header_offset for i in archive.members]
+                        == [i.header_offset for i in expected.infolist()],
+                    )
+                )
+                results.append(("只下载了一部分", archive.bytes_fetched < archive.size))
+
+                report = await inspect_target(ITEM_ID, session)
+                results.append(("inspect 输出成员", "error" not in report))
+                missing = f"{config.STORAGE_BASE}/{ITEM_ID}/missing.bin"
+                report = await inspect_target(missing, session)
+                results.append(("不存在的归档报告错误", "error" in report))
+
+                results += await check_selective(session, url, expected, Path(tmp))
+        finally:
+            await server.stop()
+
+    # 范围合并：重叠或间隔不超过 gap 的合并，其余保持独立
+    results.append(
+        (
+            "合并重叠和相邻范围",
+            coalesce([(100, 200), (0, 50), (150, 300), (300, 310)], gap=0)
+            == [(0, 50), (100, 310)],
+        )
+    )
+    results.append(
+        (
+            "间隔不超过 COALESCE_GAP 时合并",
+            coalesce([(0, 10), (10 + COALESCE_GAP, 20 + COALESCE_GAP)])
+            == [(0, 20 + COALESCE_GAP)],
+        )
+    )
+    results.append(
+        (
+            "间隔超过 COALESCE_GAP 时分开",
+            len(coalesce([(0, 10), (11 + COALESCE_GAP, 20 + COALESCE_GAP)])) == 2,
+        )
+    )
+
+    print(f"\n{'='*80}")
+    print("📊 测试结果汇总")
+    print(f"{'='*80}")
+    for name, ok in results:
+        print(f"  {'✅' if ok else '❌'} {name}")
+
+    if all(ok for _, ok in results):
+        print("🎉 所有测试都通过了！")
+    else:
+        print("⚠️ 部分测试失败，需要进一步调试。")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
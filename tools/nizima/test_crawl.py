@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+测试ID爬取的脚本
+
+启动本地替身详情API（合成ID空间 + 429限流），
+验证爬虫找到的有效ID与合成ID空间一致，且第二次扫描完全命中缓存
+"""
+
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+import config
+from core.ratelimit import AdaptiveLimiter
+from core.session import create_session
+from crawl import Crawler, parse_ranges, ProbeCache
+from standin import StandinServer, SyntheticCatalog
+
+ID_RANGE = "100000-104999"
+
+
+async def sweep(cache_path: Path) -> tuple:
+    """执行一次扫描，返回 (新发现的ID集合, 爬虫统计)"""
+    cache = ProbeCache(cache_path)
+    cache.load()
+    limiter = AdaptiveLimiter(initial=8, maximum=64)
+    async with create_session(64, 64) as session:
+        crawler = Crawler(session, cache, limiter)
+        found = {item_id async for item_id in crawler.sweep(parse_ranges([ID_RANGE]))}
+    cache.close()
+    return found, crawler.stats
+
+
+async def main():
+    """主测试函数"""
+    print("🚀 开始测试ID爬取")
+    print("=" * 80)
+
+    catalog = SyntheticCatalog(seed=42)
+    server = StandinServer(catalog, max_concurrency=32, latency=0.005)
+    config.API_BASE = await server.start()
+    print(f"🧪 替身服务器: {config.API_BASE}")
+
+    expected = {
+        item_id
+        for item_id in parse_ranges([ID_RANGE])
+        if catalog.outcome(int(item_id)) == "valid"
+    }
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = Path(tmp) / "crawl_cache.jsonl"
+
+            found, stats = await sweep(cache_path)
+            print(f"📋 第一次扫描: 发现 {len(found)} 个作品, 统计 {dict(stats)}")
+            print(f"📋 服务器统计: {dict(server.stats)}")
+            results.append(("发现的ID与合成ID空间一致", found == expected))
+            results.append(("触发过429限流", server.stats["throttled"] > 0))
+            results.append(("没有放弃的ID", stats["gave_up"] == 0))
+
+            requests_before = server.stats["requests"]
+            found, stats = await sweep(cache_path)
+            print(f"📋 第二次扫描: 发现 {len(found)} 个作品, 统计 {dict(stats)}")
+            results.append(("第二次扫描没有新作品", not found))
+            results.append(
+                ("第二次扫描没有请求", server.stats["requests"] == requests_before)
+            )
+    finally:
+        await server.stop()
+
+    print(f"\n{'='*80}")
+    print("📊 测试结果汇总")
+    print(f"{'='*80}")
+    for name, ok in results:
+        print(f"  {'✅' if ok else '❌'} {name}")
+
+    if all(ok for _, ok in results):
+        print("🎉 所有测试都通过了！")
+    else:
+        print("⚠️ 部分测试失败，需要进一步调试。")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
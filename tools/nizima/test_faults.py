@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+测试下载重试的脚本
+
+在故障注入替身服务器上逐个运行场景（standin/scenarios/*.json），
+分别驱动 v4 的 DownloadTask 和已归档 v3 的 DownloadManager._download_file，
+检查成功率、尾延迟（p99）和浪费的字节数是否在场景的预期范围内：
+
+    python test_faults.py                          # 全部场景，v4
+    python test_faults.py mid_body_reset --target v3
+    python test_faults.py --target both --json fault_report.json
+
+重试退避使用代码中的真实间隔（3/6/12秒），有重试的场景需要十几秒。
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from benchmark.stats import percentile
+from core.session import create_session
+from standin.faults import download_plan, FaultServer, load_scenario, SCENARIOS_DIR
+
+
+async def run_v4(
+    plan: List[Dict], workdir: Path, concurrency: int, scenario: Dict[str, Any]
+) -> List[Dict]:
+    """用 v4 的 DownloadTask 执行下载，场景的 client 覆盖停滞检测参数"""
+    from tasks import DownloadTask
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with create_session() as session:
+
+        async def one(entry: Dict) -> Dict:
+            task = DownloadTask(
+                task_id=entry["name"],
+                url=entry["url"],
+                target_path=workdir / entry["name"],
+                file_name="export.zip",
+                is_export=entry["is_export"],
+                session=session,
+                archive=scenario["payload"] == "archive",
+            )
+            for name, value in scenario["client"].items():
+                setattr(task, name, value)
+            async with semaphore:
+                start = time.monotonic()
+                try:
+                    await task.execute()
+                    success, error = True, None
+                except Exception as e:
+                    success, error = False, str(e)
+                return {
+                    "name": entry["name"],
+                    "success": success,
+                    "seconds": time.monotonic() - start,
+                    "attempts": task.attempts,
+                    "error": error,
+                }
+
+        return await asyncio.gather(*(one(entry) for entry in plan))
+
+
+async def run_v3(
+    plan: List[Dict], workdir: Path, concurrency: int, scenario: Dict[str, Any]
+) -> List[Dict]:
+    """用已归档 v3 的 DownloadManager._download_file 执行下载（不支持 client）"""
+    import fetch_nizima_v3_archived as v3
+
+    async with v3.DownloadManager(max_concurrent=concurrency) as manager:
+
+        async def one(entry: Dict) -> Dict:
+            task = v3.DownloadTask(
+                task_type=(
+                    v3.TaskType.EXPORT_FILE
+                    if entry["is_export"]
+                    else v3.TaskType.PREVIEW_FILE
+                ),
+                url=entry["url"],
+                target_path=workdir / entry["name"],
+                temp_path=workdir / entry["name"],
+                file_name="export.zip",
+            )
+            async with manager.semaphore:
+                start = time.monotonic()
+                result = await manager._download_file(task)
+                return {
+                    "name": entry["name"],
+                    "success": result.success,
+                    "seconds": time.monotonic() - start,
+                    "attempts": None,
+                    "error": result.error,
+                }
+
+        # v3 逐行打印下载过程，只保留汇总结果
+        with contextlib.redirect_stdout(io.StringIO()):
+            return await asyncio.gather(*(one(entry) for entry in plan))
+
+
+RUNNERS = {"v4": run_v4, "v3": run_v3}
+
+
+async def run_scenario(scenario: Dict[str, Any], target: str) -> Dict[str, Any]:
+    """在一个场景下运行下载并汇总
+
+    Args:
+        scenario: 场景配置
+        target: "v4" 或 "v3"
+
+    Returns:
+        Dict[str, Any]: 成功率、延迟分位数、浪费字节数和检查结果
+    """
+    server = FaultServer(scenario)
+    base_url = await server.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            downloads = await RUNNERS[target](
+                download_plan(scenario, base_url),
+                Path(tmp),
+                scenario["concurrency"],
+                scenario,
+            )
+    finally:
+        await server.stop()
+
+    seconds = [d["seconds"] for d in downloads]
+    useful = sum(server.completed.values())
+    report = {
+        "scenario": scenario["name"],
+        "target": target,
+        "success": sum(d["success"] for d in downloads) / len(downloads),
+        "p50_s": round(percentile(seconds, 0.5), 3),
+        "p99_s": round(percentile(seconds, 0.99), 3),
+        "max_s": round(max(seconds), 3),
+        "bytes_sent": server.bytes_sent,
+        "wasted_bytes": server.wasted_bytes(),
+        "wasted_ratio": round(server.wasted_bytes() / useful, 3) if useful else 0.0,
+        "retry_after_violations": server.retry_after_violations,
+        "server": dict(server.stats),
+        "errors": sorted({d["error"] for d in downloads if d["error"]}),
+    }
+
+    expect = scenario["expect"]
+    checks = []
+    if "min_success" in expect:
+        checks.append(("成功率", report["success"] >= expect["min_success"]))
+    if "max_p99_s" in expect:
+        checks.append(("p99延迟", report["p99_s"] <= expect["max_p99_s"]))
+    if "max_wasted_ratio" in expect:
+        checks.append(
+            ("浪费字节", report["wasted_ratio"] <= expect["max_wasted_ratio"])
+        )
+    if "max_retry_after_violations" in expect:
+        checks.append(
+            (
+                "遵守Retry-After",
+                report["retry_after_violations"]
+                <= expect["max_retry_after_violations"],
+            )
+        )
+    report["checks"] = {name: ok for name, ok in checks}
+    return report
+
+
+async def main():
+    """主测试函数"""
+    parser = argparse.ArgumentParser(description="下载重试故障注入测试")
+    parser.add_argument(
+        "scenarios", nargs="*", help="场景名或场景文件（默认 standin/scenarios 下全部）"
+    )
+    parser.add_argument(
+        "--target", choices=["v4", "v3", "both"], default="v4", help="被测下载实现"
+    )
+    parser.add_argument("--json", help="把全部结果写入该JSON文件")
+    args = parser.parse_args()
+
+    paths = [
+        Path(name) if Path(name).exists() else SCENARIOS_DIR / f"{name}.json"
+        for name in args.scenarios
+    ] or sorted(SCENARIOS_DIR.glob("*.json"))
+    targets = ["v4", "v3"] if args.target == "both" else [args.target]
+
+    print("🚀 开始故障注入测试")
+    print("=" * 80)
+
+    reports = []
+    for path in paths:
+        scenario = load_scenario(path)
+        for target in targets:
+            print(
+                f"🧪 {scenario['name']} [{target}]: {scenario.get('description', '')}"
+            )
+            report = await run_scenario(scenario, target)
+            reports.append(report)
+            print(
+                f"  成功 {report['success']:.0%}, p50 {report['p50_s']:.2f}s, "
+                f"p99 {report['p99_s']:.2f}s, 浪费 {report['wasted_bytes']:,} 字节 "
+                f"({report['wasted_ratio']:.0%}), "
+                f"Retry-After违规 {report['retry_after_violations']}"
+            )
+            for error in report["errors"]:
+                print(f"  ⚠️ {error[:120]}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{'='*80}")
+    print("📊 测试结果汇总")
+    print(f"{'='*80}")
+    failed = False
+    for report in reports:
+        for name, ok in report["checks"].items():
+            failed |= not ok
+            print(
+                f"  {'✅' if ok else '❌'} {report['scenario']} [{report['target']}] {name}"
+            )
+
+    if not failed:
+        print("🎉 所有测试都通过了！")
+    else:
+        print("⚠️ 部分测试失败，需要进一步调试。")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试失败日志的脚本
+
+验证各类详情错误的分类和重试冷却时间：只有作品不存在是长期冷却，
+离线缓存未命中和非JSON响应在短冷却后即可通过 --retry-failed 重试
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from core.journal import classify_error, ERROR_COOLDOWNS, FailureJournal
+from utils import DetailError
+
+# DetailError.kind -> 预期的冷却时间（秒）
+EXPECTED_COOLDOWNS = {
+    "invalid": 7 * 24 * 3600,
+    "non_json": 5 * 60,
+    "no_preview": 5 * 60,
+    "offline": 5 * 60,
+}
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始测试失败日志")
+    print("=" * 80)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = FailureJournal(Path(tmp) / "fail_journal.jsonl")
+        for i, (kind, cooldown) in enumerate(EXPECTED_COOLDOWNS.items()):
+            error = DetailError(kind, f"测试 {kind}")
+            # 任务把底层异常包装后抛出
+            try:
+                raise Exception(f"获取详情失败: {error}") from error
+            except Exception as wrapped:
+                error_class = classify_error(wrapped)
+            results.append(
+                (f"{kind} 的冷却时间", ERROR_COOLDOWNS[error_class] == cooldown)
+            )
+
+            item_id = str(100000 + i)
+            journal.append(
+                {
+                    "event": "failed",
+                    "item_id": item_id,
+                    "task_id": f"fetch_detail_{item_id}",
+                    "error_class": error_class,
+                }
+            )
+            written = journal.pending_failures()[item_id]
+            ts = next(iter(written.values()))["ts"]
+            _, waiting = journal.retry_candidates(ts + cooldown - 1)
+            ready, _ = journal.retry_candidates(ts + cooldown + 1)
+            results.append((f"{kind} 冷却期内不重试", item_id in waiting))
+            results.append((f"{kind} 冷却期后重试", item_id in ready))
+        journal.close()
+
+    print(f"\n{'='*80}")
+    print("📊 测试结果汇总")
+    print(f"{'='*80}")
+    for name, ok in results:
+        print(f"  {'✅' if ok else '❌'} {name}")
+
+    if all(ok for _, ok in results):
+        print("🎉 所有测试都通过了！")
+    else:
+        print("⚠️ 部分测试失败，需要进一步调试。")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,124 +1,183 @@
 """
 工具函数
 
-包含版本检查、信号处理等通用功能
+包含版本检查等通用功能
 """
 
-import json
-import signal
+import logging
 import sys
 from pathlib import Path
 from typing import Optional
 
 # 添加当前目录到路径
 sys.path.insert(0, str(Path(__file__).parent))
-from tasks.base import request_shutdown
+import config
+from core.library import LibraryIndex
 
+log = logging.getLogger("nizima.utils")
 
 # 脚本版本控制
 SCRIPT_VERSION = "v4"
 
 
-def setup_signal_handlers():
-    """设置信号处理器"""
-
-    def signal_handler(signum, frame):
-        """信号处理器：优雅处理中断"""
-        request_shutdown()
-        print("\n🛑 收到中断信号，正在安全停止...")
-        print("⏳ 等待当前操作完成，请稍候...")
-
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-
-
-def check_version(item_id: str, output_dir: str) -> bool:
+def check_version(
+    item_id: str, output_dir: str, library: Optional[LibraryIndex] = None
+) -> bool:
     """检查作品版本是否为最新
 
     Args:
         item_id: 作品ID
         output_dir: 输出目录
+        library: 作品库索引，为空时临时扫描输出目录
 
     Returns:
         bool: 是否为最新版本
     """
-
-    def _check_version_file(version_file: Path, dir_name: str = None) -> bool:
-        """检查单个版本文件"""
-        try:
-            with open(version_file, "r", encoding="utf-8") as f:
-                version_data = json.load(f)
-            current_version = version_data.get("version")
-
-            if current_version == SCRIPT_VERSION:
-                print(f"✅ 作品 {item_id} 已是最新版本 ({SCRIPT_VERSION})，跳过下载")
-                if dir_name:
-                    print(f"📁 找到目录: {dir_name}")
-                return True
-            else:
-                print(
-                    f"🔄 作品 {item_id} 版本不匹配 (本地: {current_version}, 当前: {SCRIPT_VERSION})，需要更新"
-                )
-                if dir_name:
-                    print(f"📁 找到目录: {dir_name}")
-                return False
-        except Exception:
-            return False
-
     try:
-        output_path = Path(output_dir)
+        library = library or LibraryIndex(Path(output_dir))
+        item_dir = library.find(item_id)
+        if item_dir is None:
+            return False
 
-        # 首先查找原始格式的目录 {item_id}/
-        version_file = output_path / item_id / "version.json"
-        if version_file.exists():
-            return _check_version_file(version_file)
+        version_data = library.read_version(item_id)
+        if version_data is None:
+            return False
 
-        # 如果原始格式不存在，查找重命名格式的目录 {item_id}_*/
-        for dir_path in output_path.iterdir():
-            if dir_path.is_dir() and dir_path.name.startswith(f"{item_id}_"):
-                version_file = dir_path / "version.json"
-                if version_file.exists():
-                    return _check_version_file(version_file, dir_path.name)
+        dir_name = item_dir.name if item_dir.name != item_id else None
+        current_version = version_data.get("version")
+
+        if (
+            current_version == SCRIPT_VERSION
+            and version_data.get("status") == "partial"
+        ):
+            log.info(
+                "🧩 作品 %s 上次部分完成，补全缺少的 %d 个任务",
+                item_id,
+                len(version_data.get("missing", [])),
+            )
+            return False
 
-        # 都没找到
+        if current_version == SCRIPT_VERSION:
+            log.info("✅ 作品 %s 已是最新版本 (%s)，跳过下载", item_id, SCRIPT_VERSION)
+            if dir_name:
+                log.debug("📁 找到目录: %s", dir_name)
+            return True
+
+        log.info(
+            "🔄 作品 %s 版本不匹配 (本地: %s, 当前: %s)，需要更新",
+            item_id,
+            current_version,
+            SCRIPT_VERSION,
+        )
+        if dir_name:
+            log.debug("📁 找到目录: %s", dir_name)
         return False
 
     except Exception as e:
-        print(f"⚠️ 检查版本失败: {e}")
+        log.warning("⚠️ 检查版本失败: %s", e)
         return False
 
 
-async def get_assets_info(item_id: str) -> tuple:
-    """获取资源信息
+class DetailError(ValueError):
+    """作品详情无效
+
+    kind 取值：
+    - invalid: 作品不存在（404或缺少assetsInfo）
+    - non_json: API返回了非JSON响应
+    - no_preview: 作品没有预览模型（inspect 子命令）
+    - offline: 离线模式下没有缓存的详情
+    """
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+
+
+def detail_url(item_id: str) -> str:
+    """作品详情API地址"""
+    return f"{config.API_BASE}/api/items/{item_id}/detail"
+
+
+async def read_detail_response(
+    item_id: str, response: "aiohttp.ClientResponse"
+) -> dict:
+    """校验并解析作品详情API的响应
 
     Args:
         item_id: 作品ID
+        response: 详情API响应
 
     Returns:
-        tuple: (AssetsInfo, detail_data)
+        dict: 详情数据
+
+    Raises:
+        DetailError: 作品ID无效
+        aiohttp.ClientResponseError: 其他HTTP错误（如429、5xx）
     """
-    import aiohttp
-    from models import AssetsInfo
+    if response.status == 404:
+        raise DetailError("invalid", f"无效的作品ID '{item_id}': 作品不存在")
+    response.raise_for_status()
 
-    api_url = f"https://nizima.com/api/items/{item_id}/detail"
+    # 检查响应类型
+    content_type = response.headers.get("content-type", "")
+    if "application/json" not in content_type:
+        raise DetailError(
+            "non_json",
+            f"无效的作品ID '{item_id}': API返回了非JSON响应 (content-type: {content_type})",
+        )
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(api_url) as response:
-            response.raise_for_status()
+    data = await response.json()
 
-            # 检查响应类型
-            content_type = response.headers.get("content-type", "")
-            if "application/json" not in content_type:
-                raise ValueError(
-                    f"无效的作品ID '{item_id}': API返回了非JSON响应 (content-type: {content_type})"
-                )
+    # 检查是否有assetsInfo
+    if "assetsInfo" not in data:
+        raise DetailError(
+            "invalid", f"无效的作品ID '{item_id}': 响应中缺少assetsInfo字段"
+        )
+
+    return data
+
+
+async def fetch_detail(item_id: str, session: "aiohttp.ClientSession") -> dict:
+    """请求作品详情API
+
+    Args:
+        item_id: 作品ID
+        session: HTTP会话
+
+    Returns:
+        dict: 详情数据
+    """
+    async with session.get(detail_url(item_id)) as response:
+        return await read_detail_response(item_id, response)
+
+
+async def get_assets_info(
+    item_id: str,
+    session: Optional["aiohttp.ClientSession"] = None,
+    detail_cache: Optional["DetailCache"] = None,
+) -> tuple:
+    """获取资源信息
+
+    Args:
+        item_id: 作品ID
+        session: 共享HTTP会话，为空时临时创建
+        detail_cache: 详情缓存，为空时总是请求API
+
+    Returns:
+        tuple: (AssetsInfo, detail_data)
+    """
+    from models import AssetsInfo
 
-            data = await response.json()
+    if session is None:
+        from core.session import create_session
 
-            # 检查是否有assetsInfo
-            if "assetsInfo" not in data:
-                raise ValueError(f"无效的作品ID '{item_id}': 响应中缺少assetsInfo字段")
+        async with create_session() as own_session:
+            return await get_assets_info(item_id, own_session, detail_cache)
 
-            print(f"📋 获取到资源信息: {item_id}")
+    if detail_cache is not None:
+        data = await detail_cache.get(item_id, session)
+    else:
+        data = await fetch_detail(item_id, session)
+    log.debug("📋 获取到资源信息: %s", item_id)
 
-            return AssetsInfo.from_api_response(data), data
+    return AssetsInfo.from_api_response(data), data